@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Date
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Date, Index, event, inspect, text, tuple_
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker, mapped_column
 import datetime
 from typing import TypedDict, Optional, Any, Type
@@ -14,7 +14,36 @@ DATABASE_URL = f'sqlite:///instance/{DATABASE_FILE}'
 if not os.path.exists("instance"):
     os.makedirs("instance")
 
+# PRAGMAs every connection starts with. WAL lets the game, the website and the verifier read while one of them writes,
+# with it synchronous=NORMAL still survives application crashes, only a power loss can undo the last commits.
+SQLITE_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000, # ms to wait for a lock before failing with "database is locked"
+    "cache_size": -32768, # negative is in KiB, 32 MiB of page cache per connection
+    "mmap_size": 268435456, # bytes of the file read through mmap instead of read()
+    "temp_store": "MEMORY", # sorts and temporary indexes
+}
+
+def configure_sqlite(engine, profile:Optional[dict[str, Any]]=None):
+    """Run the PRAGMAs of a profile on every new connection of an engine, open connections are replaced.
+    Statement caching is left on: sqlite3 keeps prepared statements per connection and SQLAlchemy caches the compiled SQL.
+
+    Args:
+        engine (Engine): a SQLite engine
+        profile (Optional[dict[str, Any]], optional): PRAGMA names and values. Defaults to SQLITE_PROFILE.
+    """
+    profile = SQLITE_PROFILE if profile is None else profile
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in profile.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+    event.listen(engine, "connect", on_connect)
+    engine.dispose()
+
 engine = create_engine(DATABASE_URL)
+configure_sqlite(engine)
 Base = declarative_base()
 Session = sessionmaker(bind=engine)
 
@@ -37,6 +66,8 @@ class GameSession(TypedDict):
     score: int
     level_reached: int
     invalid: bool
+    verified: bool
+    client_id: Optional[str]
     user: Optional['User']
 
 
@@ -102,6 +133,8 @@ class GameSessionModel(Base):
     score = mapped_column(Integer, default=0)
     level_reached = mapped_column(Integer, default=1)
     invalid = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    verified = mapped_column(Integer, nullable=False, default=0, server_default="0", info={"existing_rows": 1}) # games saved before replays were kept have none to verify
+    client_id = mapped_column(String(32), nullable=True, unique=True, index=True) # submission.Submission.client_id, makes syncing a game twice a no-op
 
     user = relationship('UserModel', back_populates='game_sessions')
 
@@ -109,9 +142,203 @@ class GameSessionModel(Base):
         return f"<GameSession(id={self.id}, user_id={self.user_id}, started_at='{self.started_at}', score={self.score}, level_reached={self.level_reached}), invalid={self.invalid}>"
 
 
+# Best game first, ties go to the earlier one. Ordering by this reads the indexes below in order instead of sorting.
+RANKING = (GameSessionModel.level_reached.desc(), GameSessionModel.score.desc(), GameSessionModel.id)
+
+# The leaderboard (valid games), the games of one user and all games (admin views), all ranked
+Index("ix_game_sessions_ranking", GameSessionModel.invalid, GameSessionModel.level_reached.desc(), GameSessionModel.score.desc())
+Index("ix_game_sessions_user_ranking", GameSessionModel.user_id, GameSessionModel.level_reached.desc(), GameSessionModel.score.desc())
+Index("ix_game_sessions_ranking_all", GameSessionModel.level_reached.desc(), GameSessionModel.score.desc())
+# The few submitted games waiting for verification (verification.Verifier.invalidate_missing)
+Index("ix_game_sessions_awaiting_replay", GameSessionModel.id, sqlite_where=(GameSessionModel.verified == 0) & GameSessionModel.client_id.is_not(None))
+
+
+
+class LeaderboardChangeModel(Base):
+    """Every change of a game session's place on the leaderboard, written by the triggers below.
+    Processes follow it to keep their ranking.Leaderboard up to date without rereading the game sessions."""
+    __tablename__ = 'leaderboard_changes'
+
+    seq = mapped_column(Integer, primary_key=True, autoincrement=True)
+    session_id = mapped_column(Integer, nullable=False)
+    level_reached = mapped_column(Integer, nullable=True)
+    score = mapped_column(Integer, nullable=True)
+    listed = mapped_column(Integer, nullable=False) # 1 if the session is on the leaderboard (valid) after the change
+
+    __table_args__ = {"sqlite_autoincrement": True} # seq is never reused, followers remember the last one they read
+
+
+# Newest changes kept in leaderboard_changes, a ranking.Leaderboard further behind than this reloads the whole ranking
+LEADERBOARD_CHANGES_KEPT = 10000
+
+# Triggers see every write, including bulk inserts and other processes
+LEADERBOARD_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS game_sessions_leaderboard_insert AFTER INSERT ON game_sessions
+    BEGIN
+        INSERT INTO leaderboard_changes (session_id, level_reached, score, listed) VALUES (NEW.id, NEW.level_reached, NEW.score, NEW.invalid = 0);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS game_sessions_leaderboard_update AFTER UPDATE OF invalid, level_reached, score ON game_sessions
+    BEGIN
+        INSERT INTO leaderboard_changes (session_id, level_reached, score, listed) VALUES (NEW.id, NEW.level_reached, NEW.score, NEW.invalid = 0);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS game_sessions_leaderboard_delete AFTER DELETE ON game_sessions
+    BEGIN
+        INSERT INTO leaderboard_changes (session_id, level_reached, score, listed) VALUES (OLD.id, NULL, NULL, 0);
+    END""",
+    # Compaction: the log would grow with every write forever. Deleting below the newest changes is a seek on the primary key.
+    f"""CREATE TRIGGER IF NOT EXISTS leaderboard_changes_compact AFTER INSERT ON leaderboard_changes
+    BEGIN
+        DELETE FROM leaderboard_changes WHERE seq <= NEW.seq - {LEADERBOARD_CHANGES_KEPT};
+    END""",
+]
+
+def create_leaderboard_triggers(connection):
+    """Create the triggers filling leaderboard_changes if they are missing. Runs with every create_all(), so existing databases get them too.
+
+    Args:
+        connection (Connection): the database connection
+    """
+    for trigger in LEADERBOARD_TRIGGERS:
+        connection.execute(text(trigger))
+
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: create_leaderboard_triggers(connection))
+
+
+
+def sessions_with_users(session):
+    """Query game sessions with their users loaded by the same SELECT, reading game.user does not query again
+
+    Args:
+        session (Session): the database session
+
+    Returns:
+        Query: the game sessions
+    """
+    return session.query(GameSessionModel).options(joinedload(GameSessionModel.user))
+
+def ranked_sessions(session, user_id:Optional[int]=None, include_invalid:bool=False):
+    """Query game sessions best first (RANKING) with their users loaded by the same SELECT
+
+    Args:
+        session (Session): the database session
+        user_id (Optional[int], optional): only the games of this user. Defaults to all users.
+        include_invalid (bool, optional): also the invalidated games. Defaults to False.
+
+    Returns:
+        Query: the game sessions
+    """
+    query = sessions_with_users(session)
+    if user_id is not None:
+        query = query.filter(GameSessionModel.user_id == user_id)
+    if not include_invalid:
+        query = query.filter(GameSessionModel.invalid == 0)
+    return query.order_by(*RANKING)
+
+def ranked_page(query, after:Optional[tuple[int, int, int]], limit:int) -> list[Any]:
+    """One page of a ranked_sessions() query, continuing after a game (keyset pagination).
+    Unlike OFFSET it seeks in the ranking index, so every page takes the same time however deep it is.
+
+    Args:
+        query (Query): a ranked_sessions() query
+        after (Optional[tuple[int, int, int]]): (level_reached, score, id) of the last game of the previous page, None for the first page
+        limit (int): most games
+
+    Returns:
+        list[GameSessionModel]: the games
+    """
+    if after is None:
+        return query.limit(limit).all()
+    level, score, last_id = after
+    # The rest of the games tied with the last one, then the worse ones. As two queries both are index seeks,
+    # a single OR of the conditions makes SQLite scan the index from the start.
+    games = query.filter(GameSessionModel.level_reached == level, GameSessionModel.score == score, GameSessionModel.id > last_id).limit(limit).all()
+    if len(games) < limit:
+        games += query.filter(tuple_(GameSessionModel.level_reached, GameSessionModel.score) < (level, score)).limit(limit - len(games)).all()
+    return games
+
+def users_page(session, after:Optional[int], limit:int) -> list[Any]:
+    """One page of users by id, continuing after a user (keyset pagination)
+
+    Args:
+        session (Session): the database session
+        after (Optional[int]): id of the last user of the previous page, None for the first page
+        limit (int): most users
+
+    Returns:
+        list[UserModel]: the users
+    """
+    query = session.query(UserModel)
+    if after is not None:
+        query = query.filter(UserModel.id > after)
+    return query.order_by(UserModel.id).limit(limit).all()
+
+def leaderboard_rows(session, offset:int=0, limit:Optional[int]=None, ids:Optional[list[int]]=None) -> list[Any]:
+    """Valid game sessions best first as plain rows, without building ORM objects
+
+    Args:
+        session (Session): the database session
+        offset (int, optional): rows to skip. Defaults to 0.
+        limit (Optional[int], optional): most rows. Defaults to all.
+        ids (Optional[list[int]], optional): only these game sessions, e.g. a window of ranking.leaderboard. Defaults to all.
+
+    Returns:
+        list[Row]: (id, username, level_reached, score, started_at) rows
+    """
+    # An outer join keeps game_sessions the driving table, so the ranking index is read in order
+    query = (
+        session.query(GameSessionModel.id, UserModel.username, GameSessionModel.level_reached, GameSessionModel.score, GameSessionModel.started_at)
+        .outerjoin(GameSessionModel.user)
+        .filter(GameSessionModel.invalid == 0)
+    )
+    if ids is not None:
+        query = query.filter(GameSessionModel.id.in_(ids))
+    query = query.order_by(*RANKING).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+
+
+def add_missing_columns(bind=engine):
+    """Add columns of the models that are missing in existing tables, create_all() only creates whole tables.
+    New columns need to be nullable or have a server default. Rows that already exist get the server default,
+    or the column's info["existing_rows"] value where they need a different one.
+
+    Args:
+        bind (Engine, optional): the database. Defaults to engine.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" NOT NULL DEFAULT '{column.server_default.arg}'" if not column.nullable else f" DEFAULT '{column.server_default.arg}'"
+                connection.execute(text(ddl))
+                if "existing_rows" in column.info:
+                    connection.execute(table.update().values({column.name: column.info["existing_rows"]}))
+
+
+def create_missing_indexes(bind=engine):
+    """Create indexes of the models that are missing in existing tables, create_all() only creates them with whole tables.
+
+    Args:
+        bind (Engine, optional): the database. Defaults to engine.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
 
 
 Base.metadata.create_all(bind=Session().get_bind())
+add_missing_columns()
+create_missing_indexes()
 
 with Session() as session:
     try:
@@ -1,12 +1,17 @@
 import pygame
 import sys
 from enum import Enum
-import random
 import datetime
-from sqlalchemy.exc import NoResultFound
+import typing
+import functools
 
 import settings
 import objects
+import rules
+import replay
+import strategy
+import submission
+import ranking
 
 import db_handling
 from db_handling import UserModel as User
@@ -30,9 +35,7 @@ def play_sound(sound:str):
         sound (str): name of the .mp3 file to play
     """    
     try:
-        sfx = pygame.mixer.Sound(f"assets/sfx/{sound}.mp3")
-        sfx.set_volume(settings.load_settings()['volume-sfx'])
-        sfx.play()
+        objects.sounds.play(sound)
         return True
     except FileNotFoundError:
         log.warning(f"FILE {sound}.mp3 NOT FOUND")
@@ -53,7 +56,7 @@ def play_music(music:str, loops:int=-1, fade_ms:int=0):
     try:
         if music:
             pygame.mixer.music.load(f"assets/music/{music}.mp3")
-            pygame.mixer.music.set_volume(settings.load_settings()['volume-music'])
+            pygame.mixer.music.set_volume(settings.store.get('volume-music'))
             pygame.mixer.music.play(loops=loops, fade_ms=fade_ms)
             return True
     except FileNotFoundError:
@@ -63,16 +66,20 @@ def play_music(music:str, loops:int=-1, fade_ms:int=0):
         log.warning(e)
         return "failure"
 
-def change_volume(group:str, volume:float):
+def change_volume(group:str, volume:float, persist:bool=True):
     """Change the current volume and save it to user_settings.json
 
     Args:
         group (str): volume group, must be one of the following: sfx, music
         volume (float): the volume, must be between 0.0 and 1.0
+        persist (bool, optional): also save the volume, False only applies it (e.g. while a slider is dragged). Defaults to True.
     """    
     if group == "music":
         pygame.mixer.music.set_volume(volume)
-    settings.save_setting(f"volume-{group}", volume)
+    elif group == "sfx":
+        objects.sounds.set_volume(volume)
+    if persist:
+        settings.save_setting(f"volume-{group}", volume)
 
 
 
@@ -109,7 +116,7 @@ class IntroScreen:
         self.texts = {
             'title': objects.Text(
                 text=settings.GAME_TITLE,
-                font=pygame.font.Font(None, 74),
+                font=objects.get_font(74),
                 x=settings.SCREEN_WIDTH // 2,
                 y=settings.SCREEN_HEIGHT // 2,
             ),
@@ -136,18 +143,40 @@ class IntroScreen:
         
         if self.display_time >= self.max_display_time:
             self.set_state(GameState.MAIN_MENU)
+
+    def next_wakeup_ms(self):
+        """Time until this screen needs another frame without any input
+
+        Returns:
+            typing.Optional[int]: milliseconds, 0 when animating, None when it can wait for input indefinitely
+        """
+        # The fade and display time are counted in frames
+        return 0
     
-    def draw(self, screen:pygame.Surface):
+    def widgets(self):
+        """All drawable elements in draw order"""
+        return list(self.texts.values())
+
+    def draw(self, screen:pygame.Surface, dirty:bool=False):
         """Draw frame on screen
 
         Args:
             screen (pygame.Surface): The selected surface
-        """
-        screen.fill(settings.BLACK)
+            dirty (bool, optional): only repaint what changed since the last frame. Defaults to False.
 
+        Returns:
+            list[pygame.Rect]: the repainted areas
+        """
         for text in self.texts.values():
             text.set_alpha(self.alpha)
-            text.draw(screen)
+
+        if dirty:
+            return objects.redraw_dirty(screen, self.widgets(), settings.BLACK)
+
+        screen.fill(settings.BLACK)
+        for widget in self.widgets():
+            widget.draw(screen)
+        return [screen.get_rect()]
 
 
 
@@ -226,7 +255,7 @@ class MainMenuScreen():
         self.texts = {
             'title': objects.Text(
                 text=settings.GAME_TITLE,
-                font=pygame.font.Font(None, 74),
+                font=objects.get_font(74),
                 x=settings.SCREEN_WIDTH // 2,
                 y=100
             ),
@@ -252,8 +281,8 @@ class MainMenuScreen():
         Returns:
             str: username of logged in user otherwise Anonymous
         """
-        if settings.load_settings()["logged_in"]:
-            return settings.load_settings()["username"]
+        if settings.store.get("logged_in"):
+            return settings.store.get("username")
         else:
             return "Anonymous"
 
@@ -278,26 +307,45 @@ class MainMenuScreen():
             elif self.buttons['quit'].is_clicked(mouse_pos, event):
                 self.timer_manager.delay(250, lambda: self.set_state(GameState.QUIT))
     
-    def draw(self, screen, mouse_pos):
+    def widgets(self):
+        """All drawable elements in draw order"""
+        return [*self.buttons.values(), *self.texts.values()]
+
+    def draw(self, screen, mouse_pos, dirty:bool=False):
         """Draw frame on screen
 
         Args:
             screen (pygame.Surface): The selected surface
+            mouse_pos (unk): current mouse position
+            dirty (bool, optional): only repaint what changed since the last frame. Defaults to False.
+
+        Returns:
+            list[pygame.Rect]: the repainted areas
         """
-        screen.fill(settings.BLACK)
-        
         for button in self.buttons.values():
             button.check_hover(mouse_pos)
-            button.draw(screen)
 
-        for text in self.texts.values():
-            text.draw(screen)
+        if dirty:
+            return objects.redraw_dirty(screen, self.widgets(), settings.BLACK)
+
+        screen.fill(settings.BLACK)
+        for widget in self.widgets():
+            widget.draw(screen)
+        return [screen.get_rect()]
 
     def update(self):
         """Update logic
         """
         self.timer_manager.update_all()
 
+    def next_wakeup_ms(self):
+        """Time until this screen needs another frame without any input
+
+        Returns:
+            typing.Optional[int]: milliseconds, 0 when animating, None when it can wait for input indefinitely
+        """
+        return self.timer_manager.next_due_ms()
+
     
 
 
@@ -363,7 +411,7 @@ class SettingsScreen:
         self.texts = {
             'title': objects.Text(
                 text="SETTINGS",
-                font=pygame.font.Font(None, 74),
+                font=objects.get_font(74),
                 x=settings.SCREEN_WIDTH // 2,
                 y=100
             ),
@@ -371,7 +419,7 @@ class SettingsScreen:
                 text="",
                 x=settings.SCREEN_WIDTH//2,
                 y=settings.SCREEN_HEIGHT//2,
-                font=pygame.font.Font(None, 36),
+                font=objects.get_font(36),
                 bg_color=(0,0,0, 196),
                 padding=settings.SCREEN_WIDTH,
                 visible=False
@@ -392,7 +440,9 @@ class SettingsScreen:
                 max_val=100,
                 initial_val=initial_settings['volume-music']*100,
                 label="Music Volume",
-                suffix=" %"
+                suffix=" %",
+                on_change=lambda value: change_volume(group="music", volume=value/100, persist=False),
+                on_commit=lambda value: change_volume(group="music", volume=value/100)
             ),
             "volume_sfx_slider": objects.Slider(
                 x=settings.SCREEN_WIDTH // 2 - 150,
@@ -403,7 +453,9 @@ class SettingsScreen:
                 max_val=100,
                 initial_val=initial_settings['volume-sfx']*100,
                 label="Sound Effects Volume",
-                suffix=" %"
+                suffix=" %",
+                on_change=lambda value: change_volume(group="sfx", volume=value/100, persist=False),
+                on_commit=lambda value: change_volume(group="sfx", volume=value/100)
             )
         }
         log.info("SETTINGS SCREEN created")
@@ -412,7 +464,7 @@ class SettingsScreen:
     def check_login_status(self):
         """Checks login status and sets the in-game texts to user related data
         """
-        if settings.load_settings()["logged_in"]:
+        if settings.store.get("logged_in"):
             self.buttons['logout'].set_visibility(True, True)
             self.buttons['login'].set_visibility(False, False)
             self.username_input.set_visibility(False)
@@ -436,27 +488,25 @@ class SettingsScreen:
             slider.handle_event(event, mouse_pos)
 
         if self.buttons['back'].is_clicked(mouse_pos, event):
+            for slider in self.sliders.values():
+                slider.commit()
             self.set_state(GameState.MAIN_MENU)
-        
-        if self.sliders['volume_music_slider'].dragging:
-            change_volume(group="music", volume=self.sliders['volume_music_slider'].get_value()/100)
-        elif self.sliders['volume_sfx_slider'].dragging:
-            change_volume(group="sfx", volume=self.sliders['volume_sfx_slider'].get_value()/100)
 
         username = self.username_input.handle_event(event)
         password = self.password_input.handle_event(event)
         if username == "submit" or password == "submit" or self.buttons['login'].is_clicked(mouse_pos, event):
             user = db_handling.Session().query(db_handling.UserModel).filter_by(username=self.username_input.get_text()).first()
             if user and user.check_password(self.password_input.get_text()):
-                settings.save_setting("username", self.username_input.get_text())
-                settings.save_setting("password", self.password_input.get_text())
-                settings.save_setting("logged_in", True)
+                settings.store.update({
+                    "username": self.username_input.get_text(),
+                    "password": self.password_input.get_text(),
+                    "logged_in": True
+                })
+                settings.store.flush()
                 play_sound("success-sfx")
                 self.username_input.clear()
                 self.password_input.clear()
-                self.timer_manager.delay(0, lambda: self.texts['announcement'].set_visibility(True))
-                self.timer_manager.delay(0, lambda: self.texts['announcement'].set_text("Successfully logged in, please restart the game"))
-                self.timer_manager.delay(2500, lambda: self.texts['announcement'].set_visibility(False))
+                self._announce("Successfully logged in, please restart the game")
                 self.check_login_status()
                 log.info("USER LOGGED IN")
             else:
@@ -465,39 +515,60 @@ class SettingsScreen:
                 # Maybe a message
 
         if self.buttons['logout'].is_clicked(mouse_pos, event):
-            settings.save_setting("username", "Anonymous")
-            settings.save_setting("password", "")
-            settings.save_setting("logged_in", False)
+            settings.store.update({
+                "username": "Anonymous",
+                "password": "",
+                "logged_in": False
+            })
+            settings.store.flush()
             play_sound("success-sfx")
-            self.timer_manager.delay(0, lambda: self.texts['announcement'].set_visibility(True))
-            self.timer_manager.delay(0, lambda: self.texts['announcement'].set_text("Successfully logged out, please restart the game"))
-            self.timer_manager.delay(2500, lambda: self.texts['announcement'].set_visibility(False))
+            self._announce("Successfully logged out, please restart the game")
             self.check_login_status()
             log.info("USER LOGGED OUT")
+
+    def _announce(self, text:str):
+        """Show an announcement for a while
+
+        Args:
+            text (str): announcement content
+        """
+        announcement = self.texts['announcement']
+        self.timer_manager.delay_batch([
+            (0, lambda: announcement.set_visibility(True)),
+            (0, lambda: announcement.set_text(text)),
+            (2500, lambda: announcement.set_visibility(False)),
+        ])
             
             
     
-    def draw(self, screen, mouse_pos):
+    def widgets(self):
+        """All drawable elements in draw order"""
+        return [*self.sliders.values(), *self.buttons.values(), *self.texts.values(), self.username_input, self.password_input]
+
+    def draw(self, screen, mouse_pos, dirty:bool=False):
         """Draw frame on screen
 
         Args:
             screen (pygame.Surface): The selected surface
+            mouse_pos (unk): current mouse position
+            dirty (bool, optional): only repaint what changed since the last frame. Defaults to False.
+
+        Returns:
+            list[pygame.Rect]: the repainted areas
         """
-        screen.fill(settings.BLACK)
-        
         for slider in self.sliders.values():
             slider.check_hover(mouse_pos)
-            slider.draw(screen)
 
         for button in self.buttons.values():
             button.check_hover(mouse_pos)
-            button.draw(screen)
-        
-        for text in self.texts.values():
-            text.draw(screen)
 
-        self.username_input.draw(screen)
-        self.password_input.draw(screen)
+        if dirty:
+            return objects.redraw_dirty(screen, self.widgets(), settings.BLACK)
+
+        screen.fill(settings.BLACK)
+        for widget in self.widgets():
+            widget.draw(screen)
+        return [screen.get_rect()]
 
     def update(self):
         """Update logic
@@ -505,6 +576,22 @@ class SettingsScreen:
         self.timer_manager.update_all()
         self.username_input.update()
         self.password_input.update()
+        for slider in self.sliders.values():
+            slider.update()
+
+    def next_wakeup_ms(self):
+        """Time until this screen needs another frame without any input
+
+        Returns:
+            typing.Optional[int]: milliseconds, 0 when animating, None when it can wait for input indefinitely
+        """
+        return objects.earliest_due(
+            self.timer_manager.next_due_ms(),
+            self.username_input.next_due_ms(),
+            self.password_input.next_due_ms(),
+            *[slider.next_due_ms() for slider in self.sliders.values()]
+        )
+
 
 
 
@@ -515,78 +602,74 @@ class SettingsScreen:
 
 
 
+SUBMISSION_STATUS_TEXTS = {
+    submission.SubmissionStatus.PENDING: "Saving score...",
+    submission.SubmissionStatus.SAVED: "Score saved",
+    submission.SubmissionStatus.REJECTED: "Score not saved, unknown user",
+}
+
+
+def _state_property(name:str):
+    """Expose a field of the rules engine state as a PlayScreen attribute"""
+    return property(
+        lambda self: getattr(self.engine.state, name),
+        lambda self, value: setattr(self.engine.state, name, value),
+        doc=f"rules.EngineState.{name} of the running game"
+    )
+
 
 class PlayScreen:
     """PLAY STATE"""
-    def __init__(self, set_state):
+    clue = _state_property("clue")
+    actual = _state_property("actual")
+    last_debt = _state_property("last_debt")
+    current_debt = _state_property("current_debt")
+    temporary_storage = _state_property("temporary_storage")
+    permanent_storage = _state_property("permanent_storage")
+    level = _state_property("level")
+    score = _state_property("score")
+    strikes = _state_property("strikes")
+    time_remaining = _state_property("time_remaining")
+    effectors = _state_property("effectors")
+
+    def __init__(self, set_state, clock:typing.Optional[objects.Clock]=None, seed:typing.Optional[int]=None, submissions:typing.Optional[submission.SubmissionQueue]=None, leaderboard:typing.Optional[ranking.Leaderboard]=None):
         """Initialization
 
         Args:
             set_state (func): set_state function used to switch between screens
+            clock (typing.Optional[objects.Clock], optional): time source of the game timers, a VirtualClock allows fast-forwarding. Defaults to pygame ticks.
+            seed (typing.Optional[int], optional): seed of the game's random numbers. Defaults to None (random).
+            submissions (typing.Optional[submission.SubmissionQueue], optional): where the finished game is saved. Defaults to submission.submissions.
+            leaderboard (typing.Optional[ranking.Leaderboard], optional): ranks the finished game. Defaults to ranking.leaderboard.
         """ 
         # THE ESSENTIALS
         self.set_state = set_state
-        self.timer_manager = objects.TimerManager()
+        self.submissions = submissions if submissions is not None else submission.submissions
+        self.leaderboard = leaderboard if leaderboard is not None else ranking.leaderboard
+        self.clock = clock or objects.default_clock
+        self.timer_manager = objects.TimerManager(self.clock)
         
-
-
-        self.clue = None
-        self.actual = None
-        self.last_debt = 10
-        self.current_debt = 10
-
-        self.temporary_storage = 0
-        self.permanent_storage = 0
-
-        self.level = 1
-        self.score = 0
-        self.strikes = 0
-        self.multiplier = lambda: (self.permanent_storage // 5) + 1
-        
-        self.effectors = {
-                "insta_pay": {
-                    "name": "Insta Pay",
-                    "description": "Instantly pays the debt, no waiting.",
-                    "level": 0
-                },
-                "insta_transfer": {
-                    "name": "Insta Transfer",
-                    "description": "Instantly transfers the points, no waiting.",
-                    "level": 0
-                },
-                "another_chance": {
-                    "name": "I Don't Think So",
-                    "description": "A small chance to turn a loss into a win.",
-                    "level": 0
-                },
-                "no_locks": {
-                    "name": "I'm Free!",
-                    "description": "Allows to do transfer while rolling.",
-                    "level": 0
-                }
-            }
-        self.salvage_chance = lambda: self.effectors['another_chance'].get('level', 0)/(self.effectors['another_chance'].get('level', 0)+5)
-        
-        
-        
-
-        
-
-
+        # The rules and the whole game state, the screen only presents it.
+        # Everything done to it goes through the recorder, the replay is submitted with the score.
+        self.engine = rules.GameEngine(seed)
+        self.recorder = replay.ReplayRecorder(self.engine, self.timer_manager.now)
 
         self.started_at = datetime.datetime.now()
 
         self.timer_manager.add_timer("win_flash", 2000, self._reset)
         self.timer_manager.add_timer("lose_flash", 2000, self._reset)
+        # What keeps buttons disabled, see _enable_buttons(). verification.verify() expects this pacing.
+        self._round_in_progress = False # rolled, until the result of the guess has been shown
+        self._transferring = False
+        self._paying = False
 
-        self.announcement_flash = objects.TimerSequence()
+        self.announcement_flash = objects.TimerSequence(self.clock)
         for i in range(4):
             self.announcement_flash.add_step(250, lambda: self.texts['announcement'].set_alpha(0))
             self.announcement_flash.add_step(250, lambda: self.texts['announcement'].set_alpha(255))
             i += 1
         self.announcement_flash.add_step(500, lambda: self.texts['announcement'].set_visibility(False))
 
-        self.time_remaining = 200
         self.advance_timer = True
         self.timer_manager.add_timer("timer", 1000, self._timer)
         self.timer_manager.start_timer("timer")
@@ -602,7 +685,7 @@ class PlayScreen:
                 text="DEBT",
                 x=settings.SCREEN_WIDTH//2,
                 y=settings.SCREEN_HEIGHT//2,
-                font=pygame.font.Font(None, 76),
+                font=objects.get_font(76),
                 bg_color=(0,0,0, 196),
                 padding=settings.SCREEN_WIDTH,
                 visible=False
@@ -611,14 +694,14 @@ class PlayScreen:
                 text=str(self.current_debt),
                 x=settings.SCREEN_WIDTH//2,
                 y=100,
-                font=pygame.font.Font(None, 36),
+                font=objects.get_font(36),
                 prefix="DEBT: "
             ),
             'temporary_storage': objects.Text(
                 text=str(self.temporary_storage),
                 x=10,
                 y=10,
-                font=pygame.font.Font(None, 36),
+                font=objects.get_font(36),
                 align="topleft",
                 prefix="TEMPORARY: "
             ),
@@ -626,7 +709,7 @@ class PlayScreen:
                 text=str(self.permanent_storage),
                 x=10,
                 y=40,
-                font=pygame.font.Font(None, 36),
+                font=objects.get_font(36),
                 align="topleft",
                 prefix="STORED: "
             ),
@@ -634,7 +717,7 @@ class PlayScreen:
                 text=str(self.multiplier()),
                 x=10,
                 y=70,
-                font=pygame.font.Font(None, 36),
+                font=objects.get_font(36),
                 align="topleft",
                 prefix="MULTIPLIER: "
             ),
@@ -642,14 +725,14 @@ class PlayScreen:
                 text="Begin",
                 x=settings.SCREEN_WIDTH//2,
                 y=250,
-                font=pygame.font.Font(None, 24)
+                font=objects.get_font(24)
             ),
             'timer': objects.Text(
                 text=str(self.time_remaining),
                 prefix="Remaining time: ",
                 x=settings.SCREEN_WIDTH,
                 y=0,
-                font=pygame.font.Font(None, 24),
+                font=objects.get_font(24),
                 align="topright"
             ),
             'strikes': objects.Text(
@@ -657,7 +740,7 @@ class PlayScreen:
                 prefix="Strikes: ",
                 x=settings.SCREEN_WIDTH,
                 y=24,
-                font=pygame.font.Font(None, 24),
+                font=objects.get_font(24),
                 align="topright",
                 suffix="/5"
             ),
@@ -665,10 +748,29 @@ class PlayScreen:
                 text="",
                 x=settings.SCREEN_WIDTH // 2,
                 y=settings.SCREEN_HEIGHT//2+50,
-                font=pygame.font.Font(None, 24),
+                font=objects.get_font(24),
                 align="center"
+            ),
+            'hint': objects.Text(
+                text="",
+                x=settings.SCREEN_WIDTH//2,
+                y=290,
+                font=objects.get_font(24),
+                color=settings.GRAY,
+                visible=settings.SHOW_HINTS
+            ),
+            'submission': objects.Text(
+                text="",
+                x=settings.SCREEN_WIDTH//2,
+                y=settings.SCREEN_HEIGHT//2+270,
+                font=objects.get_font(24),
+                color=settings.GRAY,
+                visible=False
             )
         }
+        self._submission_status:typing.Optional[submission.SubmissionStatus] = None
+        self._result:dict = {}
+        self._rank:typing.Optional[str] = None
 
         self.buttons = {
             'start': objects.Button(
@@ -677,7 +779,7 @@ class PlayScreen:
                 width=100, 
                 height=100, 
                 text="Start", 
-                font=pygame.font.Font(None, 24),
+                font=objects.get_font(24),
                 color=(255,255,255), 
                 hover_color=(0,0,0), 
                 bg_color=(0,0,0), 
@@ -689,7 +791,7 @@ class PlayScreen:
                 width=50, 
                 height=50, 
                 text="Greater", 
-                font=pygame.font.Font(None, 16),
+                font=objects.get_font(16),
                 color=(255,255,255), 
                 hover_color=(0,0,0), 
                 bg_color=(0,0,0), 
@@ -701,7 +803,7 @@ class PlayScreen:
                 width=50, 
                 height=50, 
                 text="Lower", 
-                font=pygame.font.Font(None, 16),
+                font=objects.get_font(16),
                 color=(255,255,255), 
                 hover_color=(0,0,0), 
                 bg_color=(0,0,0), 
@@ -713,7 +815,7 @@ class PlayScreen:
                 width=100, 
                 height=50, 
                 text="Transfer", 
-                font=pygame.font.Font(None, 16),
+                font=objects.get_font(16),
                 color=(255,255,255), 
                 hover_color=(0,0,0), 
                 bg_color=(0,0,0), 
@@ -725,7 +827,7 @@ class PlayScreen:
                 width=100, 
                 height=50, 
                 text="Pay", 
-                font=pygame.font.Font(None, 16),
+                font=objects.get_font(16),
                 color=(255,255,255), 
                 hover_color=(0,0,0), 
                 bg_color=(0,0,0), 
@@ -755,42 +857,85 @@ class PlayScreen:
             elif self.buttons['pay_off'].is_clicked(mouse_pos, event):
                 self._pay()
     
-    def draw(self, screen, mouse_pos):
+    def widgets(self):
+        """All drawable elements in draw order"""
+        # The announcement and skill description are drawn again to stay on top of the buttons
+        return [*self.texts.values(), *self.buttons.values(), self.texts['announcement'], self.texts['skill_descriptor'], self.table]
+
+    def draw(self, screen, mouse_pos, dirty:bool=False):
         """Draw frame on screen
 
         Args:
             screen (pygame.Surface): The selected surface
-        """
-        screen.fill(settings.BLACK)
-
-        for text in self.texts.values():
-            text.draw(screen)
+            mouse_pos (unk): current mouse position
+            dirty (bool, optional): only repaint what changed since the last frame. Defaults to False.
 
+        Returns:
+            list[pygame.Rect]: the repainted areas
+        """
         for button in self.buttons.values():
             button.check_hover(mouse_pos)
-            button.draw(screen)
 
-        self.texts['announcement'].draw(screen)
-        self.texts['skill_descriptor'].draw(screen)
-        self.table.draw(screen)
+        if dirty:
+            return objects.redraw_dirty(screen, self.widgets(), settings.BLACK)
+
+        screen.fill(settings.BLACK)
+        for widget in self.widgets():
+            widget.draw(screen)
+        return [screen.get_rect()]
 
     def update(self):
         """Update logic
         """
         self.timer_manager.update_all()
         self.announcement_flash.update()
+        # Set by the writer thread, shown from here on the main one
+        status = self._submission_status
+        if status is not None:
+            self.texts['submission'].set_text(SUBMISSION_STATUS_TEXTS[status])
+        # The global rank is looked up on a background thread too
+        if self._rank is not None and self._result["Rank"] != self._rank:
+            self._result = {**self._result, "Rank": self._rank}
+            self.table.set_data([self._result])
+
+    def _set_submission_status(self, status:submission.SubmissionStatus):
+        self._submission_status = status
+
+    def _set_rank(self, rank:int, ranked:int):
+        self._rank = f"{rank}/{ranked}"
+
+    def next_wakeup_ms(self):
+        """Time until this screen needs another frame without any input
+
+        Returns:
+            typing.Optional[int]: milliseconds, 0 when animating, None when it can wait for input indefinitely
+        """
+        return objects.earliest_due(self.timer_manager.next_due_ms(), self.announcement_flash.next_due_ms())
+
+    def fast_forward(self, duration_ms:int):
+        """Play out the given time instantly, needs the screen to run on a VirtualClock
+
+        Args:
+            duration_ms (int): milliseconds of game time to skip
+        """
+        objects.fast_forward(self.clock, duration_ms, self.update, self.next_wakeup_ms)
 
 
     # GAME FUNCTIONS
+    def multiplier(self):
+        return self.engine.multiplier()
+
+    def salvage_chance(self):
+        return self.engine.salvage_chance()
+
     def _generate_numbers(self):
         """Generate two randomized numbers `self.actual` and `self.clue` an show `self.clue` on screen
         """
-        self.actual = random.randint(1,20)
-        self.clue = random.randint(1,20)
-        while self.actual == self.clue:
-            self.clue = random.randint(1,20)
+        self.recorder.perform(replay.Action.ROLL)
+        self._round_in_progress = True
         self.texts['clue'].set_text(str(self.clue))
         self.texts['clue'].set_visibility(True)
+        self._update_hint()
 
         self.buttons['transfer'].set_enabled(False)
         self.buttons['pay_off'].set_enabled(False)
@@ -801,79 +946,76 @@ class PlayScreen:
         """Guess that `self.actual` is greater than `self.clue` and call `self._lose()` or `self._win()` depending on the reality
         """
         log.debug("GUESSED GREATER")
-        if self.clue is not None and self.actual is not None:
-            if self.clue < self.actual:
-                self._win()
-                play_sound("success-sfx")
-            else:
-                self._lose()
-                play_sound("failure-sfx")
+        self._show_outcome(self.recorder.perform(replay.Action.GUESS_GREATER))
 
 
     def _guess_lower(self):
         """Guess that `self.actual` is lower than `self.clue` and call `self._lose()` or `self._win()` depending on the reality
         """
         log.debug("GUESSED LOWER")
-        if self.clue is not None and self.actual is not None:
-            if self.clue > self.actual:
-                self._win()
-                play_sound("success-sfx")
-            else:
-                self._lose()
-                play_sound("failure-sfx")
+        self._show_outcome(self.recorder.perform(replay.Action.GUESS_LOWER))
 
-    def _win(self, chance_override:bool=False):
-        """Win a round, add temporary points, lower strikes
+    def _show_outcome(self, outcome:typing.Optional[rules.Outcome]):
+        """Present the result of a guess
 
         Args:
-            chance_override (bool, optional): If True (because of 'I don't think so' skill), paints the text yellow. Defaults to False.
+            outcome (typing.Optional[rules.Outcome]): result from the engine, None if there was nothing to guess
         """
-        self.texts['clue'].set_color((255,255,0) if chance_override else (0,255,0))
-        self.timer_manager.start_timer("win_flash")
-        self.temporary_storage += self.multiplier()
-        self.score += self.multiplier()
-        self.actual = None
+        if outcome is None:
+            return
+        if outcome is rules.Outcome.LOSS:
+            log.info("INCORRECT GUESS")
+            self.texts['clue'].set_color((255,0,0))
+            self.timer_manager.start_timer("lose_flash")
+        else:
+            if outcome is rules.Outcome.SALVAGED:
+                log.info("INCORRECT GUESS")
+                log.info("USED SKILL - OVERRIDE LOSS TO WIN")
+            else:
+                log.info("CORRECT GUESS")
+            # Yellow when the 'I don't think so' skill saved the round
+            self.texts['clue'].set_color((255,255,0) if outcome is rules.Outcome.SALVAGED else (0,255,0))
+            self.timer_manager.start_timer("win_flash")
         self.texts['temporary_storage'].set_text(str(self.temporary_storage))
-        self.strikes = max(0, self.strikes-1)
         self.texts['strikes'].set_text(str(self.strikes))
-        log.info("CORRECT GUESS")
+        self._update_hint()
 
-    def _lose(self):
-        """Lose a round, remove all temporary points, increase strike. In case the user acquired the 'I don't think so' skill, roll the dice to turn a loss into a win.
-        """
-        log.info("INCORRECT GUESS")
-        if self.effectors['another_chance'].get('level', 0) > 0:
-            if random.random() < self.salvage_chance():
-                log.info("USED SKILL - OVERRIDE LOSS TO WIN")
-                self._win(True)
-            else:
-                self.texts['clue'].set_color((255,0,0))
-                self.timer_manager.start_timer("lose_flash")
-                self.temporary_storage = 0
-                self.actual = None
-                self.texts['temporary_storage'].set_text(str(self.temporary_storage))
-                self.strikes += 1
-                self.texts['strikes'].set_text(str(self.strikes))
-        else:    
-            self.texts['clue'].set_color((255,0,0))
-            self.timer_manager.start_timer("lose_flash")
-            self.temporary_storage = 0
-            self.actual = None
-            self.texts['temporary_storage'].set_text(str(self.temporary_storage))
-            self.strikes += 1
-            self.texts['strikes'].set_text(str(self.strikes))
+        if self.engine.is_over:
+            self._end_round(self.engine.state.game_over_reason)
+        play_sound("failure-sfx" if outcome is rules.Outcome.LOSS else "success-sfx")
 
-        if self.strikes == 5:
-            self._end_round("TOO MANY STRIKES")
+    def _update_hint(self):
+        """Show the optimal guess for the clue, or whether to transfer, when hints are enabled
+        """
+        if not settings.SHOW_HINTS:
+            return
+        hint = strategy.hint(self.engine.state)
+        if hint.guess_greater is not None:
+            self.texts['hint'].set_text(f"{'GREATER' if hint.guess_greater else 'LOWER'} ({hint.win_chance:.0%})")
+        elif self.temporary_storage:
+            self.texts['hint'].set_text(f"{'TRANSFER' if hint.bank else 'KEEP ROLLING'} (strike out risk {hint.bust_chance:.0%})")
+        else:
+            self.texts['hint'].set_text("")
 
     def _reset(self):
         """Reset displays and buttons for another round
         """
         self.texts['clue'].set_color((255, 255, 255))
         self.texts['clue'].set_text("ROLL")
-        self.buttons['start'].set_enabled(True)
-        self.buttons['transfer'].set_enabled(True)
-        self.buttons['pay_off'].set_enabled(True)
+        self._round_in_progress = False
+        self._enable_buttons()
+
+    def _enable_buttons(self):
+        """Enable the buttons, except the ones still locked: rolling and moving points wait for the round in progress,
+        transferring and paying for their steps in progress
+        """
+        if self.engine.is_over:
+            return
+        self.buttons['start'].set_enabled(not self._round_in_progress)
+        self.buttons['greater'].set_enabled(True)
+        self.buttons['lower'].set_enabled(True)
+        self.buttons['transfer'].set_enabled(not (self._round_in_progress or self._transferring))
+        self.buttons['pay_off'].set_enabled(not (self._round_in_progress or self._paying))
 
 
 
@@ -888,21 +1030,20 @@ class PlayScreen:
         self.buttons['transfer'].set_enabled(False)
         if self.temporary_storage != 0:
             if self.effectors['insta_transfer']['level'] >= 1:
-                while self.temporary_storage > 0:
-                    self.permanent_storage += 1
-                    self.temporary_storage -= 1
-                    self.texts['permanent_storage'].set_text(str(self.permanent_storage))
-                    self.texts['temporary_storage'].set_text(str(self.temporary_storage))
-                [button.set_enabled(True) for button in self.buttons.values()]
+                self.recorder.perform(replay.Action.TRANSFER_ALL)
+                self.texts['permanent_storage'].set_text(str(self.permanent_storage))
+                self.texts['temporary_storage'].set_text(str(self.temporary_storage))
+                self._enable_buttons()
             else:
+                self._transferring = True
                 self.timer_manager.add_timer("transfer_timer", 1000, self._transfer)
                 self.timer_manager.start_timer("transfer_timer")
-                self.permanent_storage += 1
-                self.temporary_storage -= 1
+                self.recorder.perform(replay.Action.TRANSFER_STEP)
                 self.texts['permanent_storage'].set_text(str(self.permanent_storage))
                 self.texts['temporary_storage'].set_text(str(self.temporary_storage))           
         else:
-            [button.set_enabled(True) for button in self.buttons.values()]
+            self._transferring = False
+            self._enable_buttons()
         self.texts['multiplier'].set_text(str(self.multiplier()))
 
     def _pay(self):
@@ -917,24 +1058,24 @@ class PlayScreen:
         if self.current_debt != 0 and self.permanent_storage != 0:
 
             if self.effectors['insta_pay']['level'] >= 1:
-                while self.current_debt > 0 and self.permanent_storage > 0:
-                    self.current_debt -= 1
-                    self.permanent_storage -= 1
-                    self.texts['debt'].set_text(str(self.current_debt))
-                    self.texts['permanent_storage'].set_text(str(self.permanent_storage))
+                self.recorder.perform(replay.Action.PAY_ALL)
+                self.texts['debt'].set_text(str(self.current_debt))
+                self.texts['permanent_storage'].set_text(str(self.permanent_storage))
                 self._pay()
             else:
-                self.current_debt -= 1
-                self.permanent_storage -= 1
+                self._paying = True
+                self.recorder.perform(replay.Action.PAY_STEP)
                 self.timer_manager.add_timer("pay_timer", 1000, self._pay)
                 self.timer_manager.start_timer("pay_timer")
                 self.texts['debt'].set_text(str(self.current_debt))
                 self.texts['permanent_storage'].set_text(str(self.permanent_storage))
         elif self.current_debt == 0:
-            [button.set_enabled(True) for button in self.buttons.values()]
+            self._paying = False
+            self._enable_buttons()
             self._advance_level()
         else:
-            [button.set_enabled(True) for button in self.buttons.values()]
+            self._paying = False
+            self._enable_buttons()
         self.texts['multiplier'].set_text(str(self.multiplier()))
 
         
@@ -949,29 +1090,29 @@ class PlayScreen:
         
         self.texts['announcement'].set_visibility(True)
         self.texts['announcement'].set_text("DEBT RAISED")
-        self.current_debt = int(self.last_debt * 1.5)
-        log.debug(f"NEW DEBT: {self.current_debt}")
-        self.last_debt = self.current_debt
-        self.texts['debt'].set_text(str(self.current_debt))
-        self.timer_manager.delay(2000, lambda: self.texts['announcement'].set_text(str(self.current_debt)))
-        self.timer_manager.delay(2000, lambda: self.announcement_flash.start())
-        self.time_remaining +=  100
-        self.level += 1
 
         # A chance to get a skill/effector
-        picked_skill = self.effectors[list(self.effectors.keys())[random.randrange(0, len(self.effectors.values()))]]
-        picked_skill['level'] += 1
+        picked_skill = self.recorder.perform(replay.Action.LEVEL_UP)
+        log.debug(f"NEW DEBT: {self.current_debt}")
+        self.texts['debt'].set_text(str(self.current_debt))
         log.debug(f"ACQUIRED SKILL: {picked_skill}")
-        self.timer_manager.delay(5000, lambda: self.texts['announcement'].set_visibility(True))
-        self.timer_manager.delay(5000, lambda: self.texts['announcement'].set_text("NEW SKILL"))
 
-        self.timer_manager.delay(6000, lambda: self.texts['announcement'].set_text(f"{picked_skill['name']} [LVL: {picked_skill['level']}]"))
-        self.timer_manager.delay(6500, lambda: self.texts['skill_descriptor'].set_text(picked_skill['description']))
+        announcement = self.texts['announcement']
+        skill_descriptor = self.texts['skill_descriptor']
+        self.timer_manager.delay_batch([
+            (2000, lambda: announcement.set_text(str(self.current_debt))),
+            (2000, self.announcement_flash.start),
 
-        self.timer_manager.delay(9500, lambda: self.texts['announcement'].set_visibility(False))
-        self.timer_manager.delay(9500, lambda: self.texts['skill_descriptor'].set_visibility(False))
-        
-        self.timer_manager.delay(9500, lambda: self._resume_time())
+            (5000, lambda: announcement.set_visibility(True)),
+            (5000, lambda: announcement.set_text("NEW SKILL")),
+
+            (6000, lambda: announcement.set_text(f"{picked_skill['name']} [LVL: {picked_skill['level']}]")),
+            (6500, lambda: skill_descriptor.set_text(picked_skill['description'])),
+
+            (9500, lambda: announcement.set_visibility(False)),
+            (9500, lambda: skill_descriptor.set_visibility(False)),
+            (9500, self._resume_time),
+        ])
         log.debug("CONTINUING")
 
 
@@ -986,42 +1127,43 @@ class PlayScreen:
 
         Args:
             reason (str): reason why the game was ended
-
-        Raises:
-            NoResultFound: in case no user ORM is found
         """
+        self.engine.end(reason)
         play_music("endgame", loops=0)
         for button in self.buttons.values():
             button.set_enabled(False)
-        self.timer_manager.delay(0, lambda: self.texts['announcement'].set_text(""))
-        self.timer_manager.delay(0, lambda: self.texts['announcement'].set_visibility(True))
-        self.timer_manager.delay(2000, lambda: self.texts['announcement'].set_text("GAME"))
-        self.timer_manager.delay(4000, lambda: self.texts['announcement'].set_text("GAME OVER"))
-
-        for i in range(len(reason)):
-            self.timer_manager.delay(6000+((3000//len(reason))*i), lambda i=i: self.texts['announcement'].set_text(reason[:i+1]))
-
-        self.table.set_data([{
-                    "User": settings.load_settings()['username'],
+        announcement = self.texts['announcement']
+        self.timer_manager.delay_batch([
+            (0, functools.partial(announcement.set_text, "")),
+            (0, functools.partial(announcement.set_visibility, True)),
+            (2000, functools.partial(announcement.set_text, "GAME")),
+            (4000, functools.partial(announcement.set_text, "GAME OVER")),
+            # Type out the reason
+            *[(6000+((3000//len(reason))*i), functools.partial(announcement.set_text, reason[:i+1])) for i in range(len(reason))],
+            (10000, functools.partial(self.table.set_visibility, True)),
+            (15000, self._stop_playing),
+        ])
+
+        self._result = {
+                    "Rank": "...",
+                    "User": settings.store.get('username'),
                     "Level": self.level,
                     "Score": self.score,
                     "Date": self.started_at
-                }])
-        try:
-            session = db_handling.Session()
-            user = session.query(db_handling.UserModel).filter_by(username=settings.load_settings()["username"]).first()
-            if not user:
-                raise NoResultFound
-            game_session = db_handling.GameSessionModel(user_id=user.id, started_at=self.started_at, score=self.score, level_reached=self.level)
-            session.add(game_session)
-            session.commit()
-        except (NoResultFound, Exception) as e:
-            log.warning(f"{e}")
-        finally:
-            session.close()
+                }
+        self.table.set_data([self._result])
+        self._rank = None
+        self.leaderboard.rank_of_async(self.level, self.score, self._set_rank)
+        # Saved on the writer thread, a slow or locked database must not stall the game over animation
+        self.texts['submission'].set_visibility(True)
+        self.submissions.submit(submission.Submission(
+            username=settings.store.get("username"),
+            started_at=self.started_at,
+            score=self.score,
+            level=self.level,
+            replay=self.recorder.replay.pack()
+        ), self._set_submission_status)
         
-        self.timer_manager.delay(10000, lambda: self.table.set_visibility(True))
-        self.timer_manager.delay(15000, lambda: self._stop_playing())
         log.info("ENDED ROUND")
         log.debug(f"ENDED ROUND - REASON: {reason}")
         
@@ -1029,14 +1171,15 @@ class PlayScreen:
     def _timer(self):
         """The game timer loop
         """
-        if self.time_remaining <= 0:
-            self._end_round("TIME RAN OUT")
-        elif self.advance_timer:
-            self.time_remaining -= 1
+        if self.engine.is_over:
+            return
+        # Running out of time ends the game even while the timer is stopped
+        if self.advance_timer or self.time_remaining <= 0:
+            if not self.recorder.perform(replay.Action.TICK):
+                self._end_round(self.engine.state.game_over_reason)
+                return
             self.texts['timer'].set_text(str(self.time_remaining))
-            self.timer_manager.delay(1000, self._timer)
-        else:
-            self.timer_manager.delay(1000, self._timer)
+        self.timer_manager.delay(1000, self._timer)
 
     def _stop_time(self):
         """Pause the timer
@@ -1063,6 +1206,31 @@ class PlayScreen:
 #
 #   LEADERBOARDS STATE
 #
+class LeaderboardSource:
+    """Valid game sessions, best first, fetched from the database one window at a time (objects.TableDataSource).
+    The ranking comes from ranking.leaderboard, the database only fills in the rows of the window."""
+    def count(self):
+        ranking.leaderboard.refresh()
+        return len(ranking.leaderboard)
+
+    def fetch(self, offset:int, limit:int):
+        ids = ranking.leaderboard.ids(offset, offset + limit)
+        with db_handling.Session() as session:
+            found = {row.id: row for row in db_handling.leaderboard_rows(session, ids=ids)}
+        # Sessions deleted or invalidated since the last refresh are missing, the window comes out shorter
+        rows = [found[session_id] for session_id in ids if session_id in found]
+        return [
+            {
+                "Rank": i,
+                "User": row.username,
+                "Level": row.level_reached,
+                "Score": row.score,
+                "Date": row.started_at,
+            }
+            for i, row in enumerate(rows, start=offset + 1)
+        ]
+
+
 class LeaderboardScreen:
     """Handles the leaderboard screen"""
     def __init__(self, set_state):
@@ -1078,25 +1246,12 @@ class LeaderboardScreen:
 
         self.back_button = objects.Button(50, settings.SCREEN_HEIGHT - 80, 150, 50, "BACK", color=(255,255,255), hover_color=(0,0,0))
         self.table = objects.LeaderboardTable(x=settings.SCREEN_WIDTH//2, y=settings.SCREEN_HEIGHT//2, width=int(settings.SCREEN_WIDTH*0.8), height=400, columns=["Rank", "User", "Level", "Score", "Date"], center_x=True, center_y=True)
-        unsorted_data = db_handling.Session().query(db_handling.GameSessionModel).filter_by(invalid=0).all()
-        sorted_data = sorted(unsorted_data, key=lambda x: (-x.level_reached, -x.score))
-        leaderboard_data = [
-            {
-                "Rank": i,
-                "User": row.user.username,
-                "Level": row.level_reached,
-                "Score": row.score,
-                "Date": row.started_at,
-            }
-            for i, row in enumerate(sorted_data, start=1)
-        ]
-
-        self.table.set_data(leaderboard_data)
+        self.table.set_data(LeaderboardSource())
 
         self.texts = {
             'title': objects.Text(
                 text="LEADERBOARD",
-                font=pygame.font.Font(None, 74),
+                font=objects.get_font(74),
                 x=settings.SCREEN_WIDTH // 2,
                 y=100,
                 color=(255,255,255),
@@ -1110,6 +1265,14 @@ class LeaderboardScreen:
         """
         pass
 
+    def next_wakeup_ms(self):
+        """Time until this screen needs another frame without any input
+
+        Returns:
+            typing.Optional[int]: milliseconds, 0 when animating, None when it can wait for input indefinitely
+        """
+        return None
+
     
     def handle_event(self, event, mouse_pos):
         """Handle any mouse/keyboard event, used for buttons or any other interactive elements
@@ -1122,23 +1285,31 @@ class LeaderboardScreen:
         if self.back_button.is_clicked(mouse_pos, event):
             self.set_state(GameState.MAIN_MENU)
     
-    def draw(self, screen, mouse_pos):
+    def widgets(self):
+        """All drawable elements in draw order"""
+        return [self.table, self.back_button, *self.texts.values()]
+
+    def draw(self, screen, mouse_pos, dirty:bool=False):
         """Draw frame on screen
 
         Args:
             screen (pygame.Surface): The selected surface
+            mouse_pos (unk): current mouse position
+            dirty (bool, optional): only repaint what changed since the last frame. Defaults to False.
+
+        Returns:
+            list[pygame.Rect]: the repainted areas
         """
-        screen.fill(settings.BLACK)
-                
         self.table.check_hover(mouse_pos)
-        self.table.draw(screen)
-        
-        # Back button
         self.back_button.check_hover(mouse_pos)
-        self.back_button.draw(screen)
 
-        for text in self.texts.values():
-            text.draw(screen)
+        if dirty:
+            return objects.redraw_dirty(screen, self.widgets(), settings.BLACK)
+
+        screen.fill(settings.BLACK)
+        for widget in self.widgets():
+            widget.draw(screen)
+        return [screen.get_rect()]
 
 
 
@@ -1162,13 +1333,24 @@ class LeaderboardScreen:
 #
 class Game:
     """Main game class that manages all screens and game loop"""
-    def __init__(self):
+    def __init__(self, dirty_rects:bool=settings.DIRTY_RECTS, idle_throttle:bool=settings.IDLE_THROTTLE):
+        """Initialization
+
+        Args:
+            dirty_rects (bool, optional): repaint only the changed areas and update them with pygame.display.update(rects) instead of flipping the whole screen. Defaults to settings.DIRTY_RECTS.
+            idle_throttle (bool, optional): sleep until input arrives or a timer is due while nothing is animating. Defaults to settings.IDLE_THROTTLE.
+        """
         self.screen = pygame.display.set_mode((settings.SCREEN_WIDTH, settings.SCREEN_HEIGHT))
         pygame.display.set_caption(settings.GAME_TITLE)
         self.clock = pygame.time.Clock()
         self.running = True
 
+        self.dirty_rects = dirty_rects
+        self.idle_throttle = idle_throttle
+        self._drawn_screen = None # screen shown by the last full redraw, anything else needs one
+
         play_music(music="main_menu", fade_ms=1000)
+        objects.sounds.preload(background=True)
         
         # Initialize screens
         self.intro = IntroScreen(set_state=self._set_state)
@@ -1191,13 +1373,21 @@ class Game:
 
         
     
-    def handle_events(self):
+    def handle_events(self, events:typing.Optional[list]=None):
+        """Handle all queued events
+
+        Args:
+            events (typing.Optional[list], optional): events already taken from the queue, handled first. Defaults to None.
+        """
         mouse_pos = pygame.mouse.get_pos()
         
-        for event in pygame.event.get():
+        for event in (events or []) + pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
                 return
+
+            if event.type in [pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE]:
+                self._drawn_screen = None
             
             
             if self.state == GameState.INTRO and event.type in [pygame.KEYDOWN,pygame.MOUSEBUTTONDOWN]:
@@ -1239,35 +1429,79 @@ class Game:
                 self.running = False
             
     
+    def _current_screen(self):
+        match self.state:
+            case GameState.INTRO:
+                return self.intro
+            case GameState.MAIN_MENU:
+                return self.main_menu
+            case GameState.PLAY:
+                return self.play
+            case GameState.SETTINGS:
+                return self.settings
+            case GameState.LEADERBOARD:
+                return self.leaderboard
+        return None
+
     def draw(self):
         mouse_pos = pygame.mouse.get_pos()
+        current = self._current_screen()
+        # A newly shown screen is always drawn in full
+        dirty = self.dirty_rects and current is self._drawn_screen
 
         match self.state:
             case GameState.INTRO:
-                self.intro.draw(self.screen)
+                rects = self.intro.draw(self.screen, dirty=dirty)
             case GameState.MAIN_MENU:
-                self.main_menu.draw(self.screen, mouse_pos)
+                rects = self.main_menu.draw(self.screen, mouse_pos, dirty=dirty)
             case GameState.PLAY:
-                self.play.draw(self.screen, mouse_pos)
+                rects = self.play.draw(self.screen, mouse_pos, dirty=dirty)
             case GameState.SETTINGS:
-                self.settings.draw(self.screen, mouse_pos)
+                rects = self.settings.draw(self.screen, mouse_pos, dirty=dirty)
             case GameState.LEADERBOARD:
-                self.leaderboard.draw(self.screen, mouse_pos)
+                rects = self.leaderboard.draw(self.screen, mouse_pos, dirty=dirty)
             case GameState.QUIT | _:
                 self.running = False
+                return
         
-        pygame.display.flip()
+        if dirty:
+            if rects:
+                pygame.display.update(rects)
+        else:
+            pygame.display.flip()
+        self._drawn_screen = current
     
+    def _wait_while_idle(self):
+        """Block until input arrives or the current screen needs a frame, if it is idle
+
+        Returns:
+            list: the event that ended the wait, if any
+        """
+        screen = self._current_screen()
+        if screen is None:
+            return []
+        wakeup_ms = screen.next_wakeup_ms()
+        if wakeup_ms is not None and wakeup_ms <= 1000 // settings.FPS:
+            return []
+
+        timeout = settings.IDLE_MAX_WAIT_MS if wakeup_ms is None else min(wakeup_ms, settings.IDLE_MAX_WAIT_MS)
+        event = pygame.event.wait(timeout)
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event]
+
     def run(self):
         while self.running:
-            self.handle_events()
+            events = self._wait_while_idle() if self.idle_throttle else None
+            self.handle_events(events)
             self.update()
             self.draw()
             self.clock.tick(settings.FPS)
         log.info("ENDING GAME")
+        settings.store.flush()
         pygame.quit()
         sys.exit()
 
 if __name__ == "__main__":
-    game = Game()
+    game = Game(dirty_rects=settings.DIRTY_RECTS or "--dirty-rects" in sys.argv)
     game.run()
\ No newline at end of file
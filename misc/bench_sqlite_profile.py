@@ -0,0 +1,97 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import multiprocessing
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import db_handling
+
+PAGE_SIZE = 50 # rows of a leaderboard page
+
+
+def make_engine(path: str, profiled: bool):
+    engine = create_engine(f"sqlite:///{path}")
+    if profiled:
+        db_handling.configure_sqlite(engine)
+    return engine
+
+
+def writer(path: str, profiled: bool, duration: float, results):
+    """Saves one game per transaction, like the game client without the journal"""
+    Session = sessionmaker(bind=make_engine(path, profiled))
+    done = errors = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        try:
+            with Session() as session:
+                session.execute(insert(db_handling.GameSessionModel), [{"user_id": 1, "score": random.randint(0, 5000), "level_reached": random.randint(1, 9)}])
+                session.commit()
+            done += 1
+        except OperationalError:
+            errors += 1
+    results.put(("write", done, errors))
+
+
+def reader(path: str, profiled: bool, duration: float, results):
+    """Renders leaderboard pages and profiles, like the website"""
+    Session = sessionmaker(bind=make_engine(path, profiled))
+    done = errors = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        try:
+            with Session() as session:
+                db_handling.leaderboard_rows(session, limit=PAGE_SIZE)
+                db_handling.ranked_sessions(session, user_id=random.randint(1, 50), include_invalid=True).limit(PAGE_SIZE).all()
+            done += 1
+        except OperationalError:
+            errors += 1
+    results.put(("read", done, errors))
+
+
+def run(profiled: bool, sessions: int, readers: int, duration: float) -> dict:
+    """Fill a fresh database and run one writer and some readers against it at the same time
+
+    Returns:
+        dict: operations per second and failed operations of the writes and the reads
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = make_engine(path, profiled)
+        db_handling.Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(insert(db_handling.UserModel), [{"username": f"player{i}", "email": f"player{i}@example.com", "password_hash": ""} for i in range(50)])
+            connection.execute(insert(db_handling.GameSessionModel), [{"user_id": random.randint(1, 50), "score": random.randint(0, 5000), "level_reached": random.randint(1, 9)} for _ in range(sessions)])
+        engine.dispose()
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=writer, args=(path, profiled, duration, results))]
+        workers += [multiprocessing.Process(target=reader, args=(path, profiled, duration, results)) for _ in range(readers)]
+        for worker in workers:
+            worker.start()
+        totals = {"write": [0, 0], "read": [0, 0]}
+        for _ in workers:
+            kind, done, errors = results.get()
+            totals[kind][0] += done
+            totals[kind][1] += errors
+        for worker in workers:
+            worker.join()
+    return {kind: (done / duration, errors) for kind, (done, errors) in totals.items()}
+
+
+if __name__ == "__main__":
+    # python misc/bench_sqlite_profile.py [SESSIONS] [READERS] [SECONDS]
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    print(f"{sessions} game sessions, 1 writer, {readers} readers, {duration:.0f}s")
+    for profiled in (False, True):
+        result = run(profiled, sessions, readers, duration)
+        name = "db_handling.SQLITE_PROFILE" if profiled else "defaults"
+        print(f"{name:>28}: {result['write'][0]:8.1f} writes/s ({result['write'][1]} failed)  {result['read'][0]:8.1f} reads/s ({result['read'][1]} failed)")
@@ -2,11 +2,264 @@ import pygame
 import settings
 import typing
 import random
+import collections
+import os
+import threading
+import heapq
+import itertools
 
 pygame.font.init()
 pygame.mixer.init()
 
-class Button:
+
+
+class FontRegistry:
+    """Shared fonts, each (face, size) is loaded once on first request"""
+    def __init__(self):
+        self._fonts:dict[tuple, pygame.font.Font] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, size:int, face:typing.Optional[str]=None) -> pygame.font.Font:
+        """Get a font, loading it if it was not requested before
+
+        Args:
+            size (int): font size
+            face (typing.Optional[str], optional): path to a font file, None for the pygame default font. Defaults to None.
+
+        Returns:
+            pygame.font.Font: the shared font object
+        """
+        key = (face, size)
+        font = self._fonts.get(key)
+        if font is None:
+            self.misses += 1
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.Font(face, size)
+            self._fonts[key] = font
+        else:
+            self.hits += 1
+        return font
+
+    def stats(self):
+        """Registry statistics
+
+        Returns:
+            dict: hits, misses and the loaded (face, size) pairs
+        """
+        return {"hits": self.hits, "misses": self.misses, "loaded": list(self._fonts.keys())}
+
+    def clear(self):
+        """Forget all loaded fonts and reset the counters"""
+        self._fonts.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+fonts = FontRegistry()
+
+
+def get_font(size:int, face:typing.Optional[str]=None) -> pygame.font.Font:
+    """Get a shared font from the registry, see FontRegistry.get"""
+    return fonts.get(size, face)
+
+
+
+class SoundBank:
+    """Sound effects decoded once and played through a pool of reserved mixer channels"""
+    def __init__(self, directory:str="assets/sfx", channels:int=8, extension:str="mp3"):
+        """
+        Args:
+            directory (str, optional): where the sound files are. Defaults to "assets/sfx".
+            channels (int, optional): how many mixer channels to reserve for sound effects. Defaults to 8.
+            extension (str, optional): sound file extension. Defaults to "mp3".
+        """
+        self.directory = directory
+        self.extension = extension
+        self.channel_count = channels
+        self.sounds:dict[str, pygame.mixer.Sound] = {}
+        self.volume:typing.Optional[float] = None # read from the user settings on first play
+        self._channels:list = [] # least recently started first
+        self._lock = threading.Lock()
+        self._loader:typing.Optional[threading.Thread] = None
+
+    def preload(self, background:bool=False):
+        """Decode every sound in the directory
+
+        Args:
+            background (bool, optional): decode in a background thread and return immediately. Defaults to False.
+        """
+        if background:
+            self._loader = threading.Thread(target=self._load_all, name="sound-bank-preload", daemon=True)
+            self._loader.start()
+        else:
+            self._load_all()
+
+    def _load_all(self):
+        for filename in sorted(os.listdir(self.directory)):
+            name, extension = os.path.splitext(filename)
+            if extension == f".{self.extension}":
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Error: {e}")
+
+    def get(self, name:str) -> pygame.mixer.Sound:
+        """Get a decoded sound, decoding it now if it was not preloaded
+
+        Args:
+            name (str): file name without the extension
+
+        Raises:
+            FileNotFoundError: no such sound file
+        """
+        sound = self.sounds.get(name)
+        if sound is None:
+            with self._lock:
+                sound = self.sounds.get(name)
+                if sound is None:
+                    path = os.path.join(self.directory, f"{name}.{self.extension}")
+                    if not os.path.isfile(path):
+                        raise FileNotFoundError(path)
+                    sound = pygame.mixer.Sound(path)
+                    self.sounds[name] = sound
+        return sound
+
+    def set_volume(self, volume:float):
+        """Set the sound effect volume (0.0 - 1.0) for all following plays"""
+        self.volume = volume
+
+    def _get_channel(self) -> pygame.mixer.Channel:
+        """Get a free reserved channel, or the least recently started one if all are busy"""
+        if not self._channels:
+            pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), self.channel_count))
+            pygame.mixer.set_reserved(self.channel_count)
+            self._channels = [pygame.mixer.Channel(i) for i in range(self.channel_count)]
+        index = next((i for i, channel in enumerate(self._channels) if not channel.get_busy()), 0)
+        # The returned channel is started next, it becomes the most recently started one
+        channel = self._channels.pop(index)
+        self._channels.append(channel)
+        return channel
+
+    def play(self, name:str) -> pygame.mixer.Channel:
+        """Play a sound at the current volume
+
+        Args:
+            name (str): file name without the extension
+
+        Returns:
+            pygame.mixer.Channel: the channel playing the sound
+        """
+        sound = self.get(name)
+        if self.volume is None:
+            self.volume = settings.store.get('volume-sfx')
+        channel = self._get_channel()
+        channel.set_volume(self.volume)
+        channel.play(sound)
+        return channel
+
+
+sounds = SoundBank()
+
+
+
+def earliest_due(*due_ms:typing.Optional[int]) -> typing.Optional[int]:
+    """Combine next_due_ms() results
+
+    Returns:
+        typing.Optional[int]: the smallest of the given times, None if all of them are None
+    """
+    due = [ms for ms in due_ms if ms is not None]
+    return min(due) if due else None
+
+
+
+class DirtyTracker:
+    """Lets a widget report the screen areas it changed since it was last drawn (used by the dirty-rect render mode)"""
+    _drawn_state = None
+    _drawn_bounds = None
+
+    def _render_state(self):
+        """Everything that affects how the widget looks"""
+        raise NotImplementedError
+
+    def get_bounds(self) -> typing.Optional[pygame.Rect]:
+        """Area the widget paints in its current state, None if it paints nothing"""
+        raise NotImplementedError
+
+    def _mark_drawn(self):
+        """Remember the state that is now on screen, called at the end of draw()"""
+        self._drawn_state = self._render_state()
+        self._drawn_bounds = self.get_bounds() if getattr(self, 'visible', True) else None
+
+    def is_dirty(self):
+        """Check if the widget changed since it was last drawn"""
+        return self._render_state() != self._drawn_state
+
+    def dirty_rects(self) -> list[pygame.Rect]:
+        """Get the areas that need repainting: where the widget was and where it is now"""
+        if not self.is_dirty():
+            return []
+        rects = []
+        if self._drawn_bounds:
+            rects.append(self._drawn_bounds)
+        bounds = self.get_bounds() if getattr(self, 'visible', True) else None
+        if bounds:
+            rects.append(bounds)
+        return rects
+
+
+def redraw_dirty(screen:pygame.Surface, widgets:list, bg_color:tuple=(0,0,0)) -> list[pygame.Rect]:
+    """Repaint only the areas the widgets changed since they were last drawn
+
+    Args:
+        screen (pygame.Surface): the surface to draw on
+        widgets (list): widgets in draw order (back to front), may contain the same widget more than once
+        bg_color (tuple, optional): color used to clear the repainted areas. Defaults to (0,0,0).
+
+    Returns:
+        list[pygame.Rect]: the repainted areas, to be passed to pygame.display.update
+    """
+    screen_rect = screen.get_rect()
+    unique_widgets = list({id(widget): widget for widget in widgets}.values())
+
+    # Merge overlapping areas so nothing gets painted twice
+    merged = []
+    for widget in unique_widgets:
+        for rect in widget.dirty_rects():
+            rect = rect.clip(screen_rect)
+            if not rect.width or not rect.height:
+                continue
+            i = 0
+            while i < len(merged):
+                if merged[i].colliderect(rect):
+                    rect.union_ip(merged.pop(i))
+                    i = 0
+                else:
+                    i += 1
+            merged.append(rect)
+
+    original_clip = screen.get_clip()
+    for rect in merged:
+        screen.set_clip(rect)
+        screen.fill(bg_color, rect)
+        for widget in widgets:
+            bounds = widget.get_bounds() if getattr(widget, 'visible', True) else None
+            if bounds and bounds.colliderect(rect):
+                widget.draw(screen)
+    screen.set_clip(original_clip)
+
+    # Widgets outside of the repainted areas are unchanged or hidden
+    for widget in unique_widgets:
+        widget._mark_drawn()
+    return merged
+
+
+
+
+
+class Button(DirtyTracker):
     """Universal Button"""
     def __init__(self, 
                 x:int, 
@@ -14,7 +267,7 @@ class Button:
                 width:int, 
                 height:int, 
                 text:str, 
-                font:pygame.font.Font=pygame.font.Font(None, 24), 
+                font:typing.Optional[pygame.font.Font]=None, 
                 color:tuple=(255,255,255), hover_color:tuple=(0,0,0), 
                 bg_color:tuple=(0,0,0), bg_hover_color:tuple=(255,255,255), 
                 border_width:int=1, 
@@ -22,7 +275,9 @@ class Button:
                 enabled:bool=True, 
                 visible:bool=True,
                 sfx:str="click-sfx",
-                silenced:bool=False
+                silenced:bool=False,
+                disabled_color:typing.Optional[tuple]=None,
+                disabled_bg_color:typing.Optional[tuple]=None
                 ):
         """Universal button
 
@@ -32,7 +287,7 @@ class Button:
             width (int): X size / width
             height (int): Y size / height
             text (str): text content
-            font (pygame.font.Font, optional): font. Defaults to pygame.font.Font(None, 24).
+            font (pygame.font.Font, optional): font. Defaults to None (get_font(24)).
             color (tuple, optional): text color. Defaults to (255,255,255).
             hover_color (tuple, optional): text hover color. Defaults to (0,0,0).
             bg_color (tuple, optional): background color. Defaults to (0,0,0).
@@ -43,6 +298,8 @@ class Button:
             visible (bool, optional): visibility. Defaults to True.
             sfx (str, optional): what sfx to play upon click. Defaults to "click-sfx".
             silenced (bool, optional): do not play any sfx upon click. Defaults to False.
+            disabled_color (typing.Optional[tuple], optional): text color while disabled. Defaults to None (same as color).
+            disabled_bg_color (typing.Optional[tuple], optional): background color while disabled. Defaults to None (same as bg_color).
         """
         
         self.rect = pygame.Rect(x, y, width, height)
@@ -51,11 +308,13 @@ class Button:
         # Text
         self.color = color
         self.hover_color = hover_color
-        self.font = font
+        self.disabled_color = disabled_color
+        self.font = font or get_font(24)
 
         # Background
         self.bg_color = bg_color
         self.bg_hover_color = bg_hover_color
+        self.disabled_bg_color = disabled_bg_color
 
         # Shape
         self.border_width = border_width
@@ -68,19 +327,80 @@ class Button:
 
         self.sfx = sfx
         self.silenced = silenced
+
+        # Pre-rendered state sprites {"normal", "hover", "disabled"}, rebuilt when _sprite_key() changes
+        self._sprites = None
+        self._sprites_key = None
+
+    def _sprite_key(self):
+        """Everything the baked sprites depend on"""
+        return (self.text, self.rect.size, self.font,
+                self.color, self.hover_color, self.disabled_color,
+                self.bg_color, self.bg_hover_color, self.disabled_bg_color,
+                self.border_width, self.border_radius)
+
+    def _bake(self, bg_color:tuple, color:tuple):
+        """Render one button appearance into a surface
+
+        Returns:
+            tuple[pygame.Surface, tuple]: the sprite and its offset from the button's top-left corner
+        """
+        text_surface = self.font.render(self.text, True, color)
+        local_rect = pygame.Rect(0, 0, *self.rect.size)
+        text_rect = text_surface.get_rect(center=local_rect.center)
+        # Text wider than the button still overflows it, like drawing it directly would
+        bounds = local_rect.union(text_rect)
+
+        sprite = pygame.Surface(bounds.size, pygame.SRCALPHA)
+        local_rect.move_ip(-bounds.x, -bounds.y)
+        text_rect.move_ip(-bounds.x, -bounds.y)
+        pygame.draw.rect(sprite, bg_color, local_rect, border_radius=self.border_radius)
+        pygame.draw.rect(sprite, settings.WHITE, local_rect, width=self.border_width, border_radius=self.border_radius)
+        sprite.blit(text_surface, text_rect)
+        return sprite, (bounds.x, bounds.y)
+
+    def _get_sprites(self):
+        key = self._sprite_key()
+        if self._sprites is None or key != self._sprites_key:
+            self._sprites = {
+                "normal": self._bake(self.bg_color, self.color),
+                "hover": self._bake(self.bg_hover_color, self.hover_color),
+                "disabled": self._bake(
+                    self.disabled_bg_color if self.disabled_bg_color is not None else self.bg_color,
+                    self.disabled_color if self.disabled_color is not None else self.color
+                ),
+            }
+            self._sprites_key = key
+        return self._sprites
+
+    def get_state(self):
+        """Get the current appearance
+
+        Returns:
+            str: "normal", "hover" or "disabled"
+        """
+        if not self.enabled:
+            return "disabled"
+        return "hover" if self.is_hovered else "normal"
         
+    def _render_state(self):
+        return (self.visible, self.get_state(), self._sprite_key(), self.rect.topleft)
+
+    def get_bounds(self):
+        sprite, (dx, dy) = self._get_sprites()[self.get_state()]
+        return sprite.get_rect(topleft=(self.rect.x + dx, self.rect.y + dy))
+
     def draw(self, screen):
+        self._mark_drawn()
         if not self.visible:
             return
-        bg_color = self.bg_hover_color if self.is_hovered and self.enabled else self.bg_color
-        pygame.draw.rect(screen, bg_color, self.rect, border_radius=self.border_radius)
-        pygame.draw.rect(screen, settings.WHITE, self.rect, width=self.border_width, border_radius=self.border_radius)
-        
-        color = self.hover_color if self.is_hovered and self.enabled else self.color
-        text_surface = self.font.render(self.text, True, color)
-        text_rect = text_surface.get_rect(center=self.rect.center)
-        screen.blit(text_surface, text_rect)
+        sprite, (dx, dy) = self._get_sprites()[self.get_state()]
+        return screen.blit(sprite, (self.rect.x + dx, self.rect.y + dy))
     
+    def set_text(self, text:str):
+        """Update the text content"""
+        self.text = text
+
     def check_hover(self, pos):
         self.is_hovered = self.rect.collidepoint(pos)
         return self.is_hovered
@@ -97,9 +417,7 @@ class Button:
         if self.rect.collidepoint(pos) and event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 if self.enabled else 0:
             if not self.silenced:
                 try:
-                    sfx = pygame.mixer.Sound(f"assets/sfx/{self.sfx}.mp3")
-                    sfx.set_volume(settings.load_settings()['volume-sfx'])
-                    sfx.play()
+                    sounds.play(self.sfx)
                 except Exception as e:
                     print(f"Error: {e}")
             return True
@@ -110,13 +428,20 @@ class Button:
 
 
 
-class Text():
+class Text(DirtyTracker):
     """Universal Text"""
+
+    # Render cache shared by all Text instances, keyed on (font, string, color, alpha, bg, padding)
+    _render_cache:"collections.OrderedDict[tuple, tuple]" = collections.OrderedDict()
+    cache_max_size = 256
+    cache_hits = 0
+    cache_misses = 0
+
     def __init__(self, 
                 text:str, 
                 x:int, 
                 y:int, 
-                font:pygame.font.Font=pygame.font.Font(None, 24), 
+                font:typing.Optional[pygame.font.Font]=None, 
                 color:tuple=(255,255,255), 
                 align:str="center", 
                 bg_color:typing.Optional[tuple]=None, 
@@ -131,7 +456,7 @@ class Text():
             text (str): text content
             x (int): X position
             y (int): Y position
-            font (pygame.font.Font, optional): font. Defaults to pygame.font.Font(None, 24).
+            font (pygame.font.Font, optional): font. Defaults to None (get_font(24)).
             color (tuple, optional): text color. Defaults to (255,255,255).
             align (str, optional): text align. Defaults to "center".
             bg_color (typing.Optional[tuple], optional): background color. Defaults to None.
@@ -147,7 +472,7 @@ class Text():
         self.suffix = suffix
         self.x = x
         self.y = y
-        self.font = font
+        self.font = font or get_font(24)
         self.color = color
         self.align = align
         self.bg_color = bg_color
@@ -155,69 +480,146 @@ class Text():
         self.alpha = alpha
         self.visible = visible
 
+        # Cached (text_surface, bg_surface) and rects, dropped by invalidate()
+        self._surfaces = None
+        self._rects = None
+
     def set_text(self, text:str):
         """Update the text content"""
-        self.text = text
+        if text != self.text:
+            self.text = text
+            self.invalidate()
 
     def set_position(self, x:int, y:int):
         """Update the position"""
-        self.x = x
-        self.y = y
+        if (x, y) != (self.x, self.y):
+            self.x = x
+            self.y = y
+            self._rects = None
 
     def set_color(self, color:tuple):
         """Update the text color"""
-        self.color = color
+        if color != self.color:
+            self.color = color
+            self.invalidate()
         
     def set_alpha(self, alpha:int):
         """Set transparency (0-255)"""
-        self.alpha = min(255, max(0, alpha))
+        alpha = min(255, max(0, alpha))
+        if alpha != self.alpha:
+            self.alpha = alpha
+            self.invalidate()
 
     def set_visibility(self, visible:bool):
         self.visible = visible
 
-    def draw(self, screen):
-        """Render the text to the screen"""
-        if not self.visible:
-            return
-            
-        # Render text
-        text_surface = self.font.render((self.prefix + self.text + self.suffix), True, self.color)
+    def invalidate(self):
+        """Drop the cached render, needed only after changing attributes directly instead of through the setters"""
+        self._surfaces = None
+        self._rects = None
+
+    @classmethod
+    def cache_stats(cls):
+        """Render cache statistics
+
+        Returns:
+            dict: hits, misses and the number of cached renders
+        """
+        return {"hits": cls.cache_hits, "misses": cls.cache_misses, "size": len(cls._render_cache)}
+
+    @classmethod
+    def clear_cache(cls):
+        """Empty the shared render cache and reset its counters"""
+        cls._render_cache.clear()
+        cls.cache_hits = 0
+        cls.cache_misses = 0
+
+    def _render(self):
+        """Get the (text_surface, bg_surface) pair from the shared cache, rendering it on a miss"""
+        string = self.prefix + self.text + self.suffix
+        key = (self.font, string, self.color, self.alpha, self.bg_color, self.padding)
+        cache = Text._render_cache
+        surfaces = cache.get(key)
+        if surfaces is not None:
+            cache.move_to_end(key)
+            Text.cache_hits += 1
+            return surfaces
+
+        Text.cache_misses += 1
+        text_surface = self.font.render(string, True, self.color)
         
         # Apply alpha
         if self.alpha < 255:
             text_surface.set_alpha(self.alpha)
-        
-        # Get rect based on alignment
-        if self.align == "center":
-            text_rect = text_surface.get_rect(center=(self.x, self.y))
-        elif self.align == "left":
-            text_rect = text_surface.get_rect(midleft=(self.x, self.y))
-        elif self.align == "right":
-            text_rect = text_surface.get_rect(midright=(self.x, self.y))
-        elif self.align == "topleft":
-            text_rect = text_surface.get_rect(topleft=(self.x, self.y))
-        elif self.align == "topright":
-            text_rect = text_surface.get_rect(topright=(self.x, self.y))
-        elif self.align == "bottomleft":
-            text_rect = text_surface.get_rect(bottomleft=(self.x, self.y))
-        elif self.align == "bottomright":
-            text_rect = text_surface.get_rect(bottomright=(self.x, self.y))
-        else:
-            text_rect = text_surface.get_rect(center=(self.x, self.y))
-        
-        # Draw background if specified
+
+        bg_surface = None
         if self.bg_color:
-            bg_rect = text_rect.inflate(self.padding * 2, self.padding * 2)
-            bg_surface = pygame.Surface(bg_rect.size)
+            bg_surface = pygame.Surface(text_surface.get_rect().inflate(self.padding * 2, self.padding * 2).size)
             bg_surface.fill(self.bg_color)
             if len(self.bg_color) > 3:
                 bg_surface.set_alpha(self.bg_color[3])
+
+        surfaces = (text_surface, bg_surface)
+        cache[key] = surfaces
+        if len(cache) > Text.cache_max_size:
+            cache.popitem(last=False)
+        return surfaces
+
+    def _get_rects(self):
+        """Get the cached (text_surface, bg_surface) and (text_rect, bg_rect), rendering them if needed"""
+        if self._surfaces is None:
+            self._surfaces = self._render()
+        text_surface = self._surfaces[0]
+
+        if self._rects is None:
+            # Get rect based on alignment
+            if self.align == "center":
+                text_rect = text_surface.get_rect(center=(self.x, self.y))
+            elif self.align == "left":
+                text_rect = text_surface.get_rect(midleft=(self.x, self.y))
+            elif self.align == "right":
+                text_rect = text_surface.get_rect(midright=(self.x, self.y))
+            elif self.align == "topleft":
+                text_rect = text_surface.get_rect(topleft=(self.x, self.y))
+            elif self.align == "topright":
+                text_rect = text_surface.get_rect(topright=(self.x, self.y))
+            elif self.align == "bottomleft":
+                text_rect = text_surface.get_rect(bottomleft=(self.x, self.y))
+            elif self.align == "bottomright":
+                text_rect = text_surface.get_rect(bottomright=(self.x, self.y))
+            else:
+                text_rect = text_surface.get_rect(center=(self.x, self.y))
+            bg_rect = text_rect.inflate(self.padding * 2, self.padding * 2)
+            self._rects = (text_rect, bg_rect)
+        return self._surfaces, self._rects
+
+    def _render_state(self):
+        return (self.visible, self.font, self.prefix + self.text + self.suffix, self.color, self.alpha,
+                self.bg_color, self.padding, self.align, self.x, self.y)
+
+    def get_bounds(self):
+        _, (text_rect, bg_rect) = self._get_rects()
+        return bg_rect.copy() if self.bg_color else text_rect.copy()
+
+    def draw(self, screen):
+        """Render the text to the screen"""
+        if not self.visible:
+            self._mark_drawn()
+            return
+
+        if self._surfaces is not None:
+            Text.cache_hits += 1
+        (text_surface, bg_surface), (text_rect, bg_rect) = self._get_rects()
+        
+        # Draw background if specified
+        if bg_surface is not None:
             screen.blit(bg_surface, bg_rect)
         
         # Draw text
         screen.blit(text_surface, text_rect)
         
-        return text_rect
+        self._mark_drawn()
+        return text_rect.copy()
     
 
 
@@ -229,7 +631,53 @@ class Text():
 
 
 
-class Slider:
+class Clock(typing.Protocol):
+    """Time source of the timers"""
+    def get_ticks(self) -> int:
+        """Get the current time in milliseconds"""
+        ...
+
+
+class PygameClock:
+    """Wall-clock time, milliseconds since pygame.init()"""
+    def get_ticks(self) -> int:
+        return pygame.time.get_ticks()
+
+
+class VirtualClock:
+    """Time that only moves when advanced, used to run timers without waiting (tests, simulations)"""
+    def __init__(self, start_ms:int=0):
+        """
+        Args:
+            start_ms (int, optional): initial time in milliseconds. Defaults to 0.
+        """
+        self.ticks = start_ms
+
+    def get_ticks(self) -> int:
+        return self.ticks
+
+    def advance(self, duration_ms:int) -> int:
+        """Move the time forward
+
+        Args:
+            duration_ms (int): milliseconds to move forward by
+
+        Raises:
+            ValueError: the duration is negative
+
+        Returns:
+            int: the new time
+        """
+        if duration_ms < 0:
+            raise ValueError("Cannot advance the clock by a negative duration")
+        self.ticks += duration_ms
+        return self.ticks
+
+
+default_clock = PygameClock()
+
+
+class Slider(DirtyTracker):
     """Universal Slider for numeric values"""
     def __init__(self, 
                 x: int, 
@@ -240,12 +688,16 @@ class Slider:
                 max_val: float = 100, 
                 initial_val: float = 50, 
                 label: str = "", 
-                font: pygame.font.Font = pygame.font.Font(None, 24), 
+                font: typing.Optional[pygame.font.Font] = None, 
                 color: tuple = (255, 255, 255), 
                 bg_color: tuple = (50, 50, 50), 
                 handle_color: tuple = (255, 255, 255), 
                 handle_hover_color: tuple = (200, 200, 200), 
-                suffix:str=""):
+                suffix:str="",
+                on_change:typing.Optional[typing.Callable[[float], None]]=None,
+                on_commit:typing.Optional[typing.Callable[[float], None]]=None,
+                commit_delay_ms:int=500,
+                clock:typing.Optional[Clock]=None):
         """Universal Slider for numeric values
 
         Args:
@@ -257,12 +709,16 @@ class Slider:
             max_val (float, optional): maximum value. Defaults to 100.
             initial_val (float, optional): starting value. Defaults to 50.
             label (str, optional): label content. Defaults to "".
-            font (pygame.font.Font, optional): font. Defaults to pygame.font.Font(None, 24).
+            font (pygame.font.Font, optional): font. Defaults to None (get_font(24)).
             color (tuple, optional): label color. Defaults to (255, 255, 255).
             bg_color (tuple, optional): background color. Defaults to (50, 50, 50).
             handle_color (tuple, optional): handle color. Defaults to (255, 255, 255).
             handle_hover_color (tuple, optional): hover handle color. Defaults to (200, 200, 200).
             suffix (str, optional): label suffix. Defaults to "".
+            on_change (typing.Optional[typing.Callable[[float], None]], optional): called with every new value, also while dragging - apply the value live here. Defaults to None.
+            on_commit (typing.Optional[typing.Callable[[float], None]], optional): called once the value settles - when the drag ends or after commit_delay_ms without movement - persist the value here. Defaults to None.
+            commit_delay_ms (int, optional): quiet period while dragging after which on_commit is called. Defaults to 500.
+            clock (typing.Optional[Clock], optional): time source of the commit delay. Defaults to pygame ticks.
         """
         
         self.rect = pygame.Rect(x, y, width, height)
@@ -270,7 +726,7 @@ class Slider:
         self.max_val = max_val
         self.value = initial_val
         self.label = label
-        self.font = font
+        self.font = font or get_font(24)
         self.suffix = suffix
         
         # Colors
@@ -282,6 +738,14 @@ class Slider:
         # State
         self.dragging = False
         self.is_hovered = False
+
+        # Callbacks
+        self.on_change = on_change
+        self.on_commit = on_commit
+        self.commit_delay_ms = commit_delay_ms
+        self.clock = clock or default_clock
+        self._commit_pending = False
+        self._last_change = 0
         
         # Handle dimensions
         self.handle_width = 20
@@ -306,13 +770,44 @@ class Slider:
                 self.dragging = True
             elif self.rect.collidepoint(mouse_pos):
                 # Click on track to jump to position
-                self.update_value_from_pos(mouse_pos[0])
+                self._change_value_from_pos(mouse_pos[0])
+                self.commit()
         
         elif event.type == pygame.MOUSEBUTTONUP:
+            if self.dragging:
+                self.commit()
             self.dragging = False
         
         elif event.type == pygame.MOUSEMOTION and self.dragging:
-            self.update_value_from_pos(mouse_pos[0])
+            self._change_value_from_pos(mouse_pos[0])
+
+    def _change_value_from_pos(self, mouse_x):
+        """Update the value from the mouse position and report it if it changed"""
+        old_value = self.value
+        self.update_value_from_pos(mouse_x)
+        if self.value != old_value:
+            self._commit_pending = True
+            self._last_change = self.clock.get_ticks()
+            if self.on_change:
+                self.on_change(self.value)
+
+    def commit(self):
+        """Report the settled value, if it changed since the last commit"""
+        if self._commit_pending:
+            self._commit_pending = False
+            if self.on_commit:
+                self.on_commit(self.value)
+
+    def update(self):
+        """Commit the value once the handle rests while dragging. Needs to be called in the game update loop."""
+        if self._commit_pending and self.clock.get_ticks() - self._last_change >= self.commit_delay_ms:
+            self.commit()
+
+    def next_due_ms(self) -> typing.Optional[int]:
+        """Get the time until a pending value is committed, None if nothing is pending"""
+        if not self._commit_pending:
+            return None
+        return max(0, self.commit_delay_ms - (self.clock.get_ticks() - self._last_change))
     
     def update_value_from_pos(self, mouse_x):
         """Update value based on mouse x position"""
@@ -333,6 +828,23 @@ class Slider:
         self.is_hovered = handle_rect.collidepoint(mouse_pos)
         return self.is_hovered
     
+    def _get_value_text(self):
+        if isinstance(self.value, float):
+            return f"{self.value:.1f}{self.suffix}"
+        return f"{int(self.value)}{self.suffix}"
+
+    def _render_state(self):
+        return (self.value, self.is_hovered or self.dragging, self.label, self.suffix, self.font, self.rect.copy(),
+                self.color, self.bg_color, self.handle_color, self.handle_hover_color)
+
+    def get_bounds(self):
+        bounds = self.rect.union(self.get_handle_rect())
+        if self.label:
+            bounds.union_ip(pygame.Rect((self.rect.x, self.rect.y - 30), self.font.size(self.label)))
+        value_width, value_height = self.font.size(self._get_value_text())
+        bounds.union_ip(pygame.Rect(self.rect.x + self.rect.width + 20, self.rect.centery - value_height // 2 - 1, value_width, value_height + 2))
+        return bounds
+
     def draw(self, screen):
         """Draw the slider"""
         # Draw track background
@@ -355,14 +867,11 @@ class Slider:
             screen.blit(label_text, (self.rect.x, self.rect.y - 30))
         
         # Draw value
-        if isinstance(self.value, float):
-            value_text = f"{self.value:.1f}{self.suffix}"
-        else:
-            value_text = f"{int(self.value)}{self.suffix}"
-        
-        value_surface = self.font.render(value_text, True, self.color)
+        value_surface = self.font.render(self._get_value_text(), True, self.color)
         value_rect = value_surface.get_rect(midleft=(self.rect.x + self.rect.width + 20, self.rect.centery))
         screen.blit(value_surface, value_rect)
+
+        self._mark_drawn()
     
     def get_value(self):
         """Get current slider value"""
@@ -380,7 +889,37 @@ class Slider:
 
 
 
-class LeaderboardTable:
+class TableDataSource(typing.Protocol):
+    """Where a LeaderboardTable pulls its rows from, one window at a time"""
+    def count(self) -> int:
+        """Total number of rows"""
+        ...
+
+    def fetch(self, offset:int, limit:int) -> list[dict]:
+        """Rows [offset, offset+limit), each dict with keys matching the column names"""
+        ...
+
+
+class ListDataSource:
+    """TableDataSource over an in-memory list of rows"""
+    def __init__(self, rows:list[dict]):
+        self.rows = rows
+
+    def count(self):
+        return len(self.rows)
+
+    def fetch(self, offset:int, limit:int):
+        return self.rows[offset:offset + limit]
+
+
+
+
+
+
+
+
+
+class LeaderboardTable(DirtyTracker):
     """Dynamic scrollable table for displaying leaderboard data"""
     def __init__(self, 
                 x: int, 
@@ -388,8 +927,8 @@ class LeaderboardTable:
                 width: int, 
                 height: int, 
                 columns: list[str], 
-                font: pygame.font.Font = pygame.font.Font(None, 24),
-                header_font: pygame.font.Font = pygame.font.Font(None, 28),
+                font: typing.Optional[pygame.font.Font] = None,
+                header_font: typing.Optional[pygame.font.Font] = None,
                 header_color: tuple = (255, 255, 255),
                 text_color: tuple = (200, 200, 200),
                 bg_color: tuple = (20, 20, 20),
@@ -403,7 +942,9 @@ class LeaderboardTable:
                 center_y: bool = False,
                 screen_width: int = settings.SCREEN_WIDTH,
                 screen_height: int = settings.SCREEN_HEIGHT,
-                visible:bool = True):
+                visible:bool = True,
+                row_cache_size:int = 128,
+                prefetch_rows:int = 100):
         """Initialize a scrollable leaderboard table UI component. Sets up geometry, appearance, scrolling behavior and visibility based on the given parameters.
 
         Args:
@@ -412,8 +953,8 @@ class LeaderboardTable:
             width (int): Width of the table area.
             height (int): Height of the table area.
             columns (list[str]): List of column names to display.
-            font (pygame.font.Font, optional): Font used for row text. Defaults to pygame.font.Font(None, 24).
-            header_font (pygame.font.Font, optional): Font used for header text. Defaults to pygame.font.Font(None, 28).
+            font (pygame.font.Font, optional): Font used for row text. Defaults to None (get_font(24)).
+            header_font (pygame.font.Font, optional): Font used for header text. Defaults to None (get_font(28)).
             header_color (tuple, optional): Color of the header text. Defaults to (255, 255, 255).
             text_color (tuple, optional): Color of the row text. Defaults to (200, 200, 200).
             bg_color (tuple, optional): Background color of the table. Defaults to (20, 20, 20).
@@ -428,6 +969,8 @@ class LeaderboardTable:
             screen_width (int, optional): Screen width used for centering calculations. Defaults to settings.SCREEN_WIDTH.
             screen_height (int, optional): Screen height used for centering calculations. Defaults to settings.SCREEN_HEIGHT.
             visible (bool, optional): Initial visibility state of the table. Defaults to True.
+            row_cache_size (int, optional): How many rendered rows to keep cached (least recently used are dropped). Defaults to 128.
+            prefetch_rows (int, optional): How many rows to fetch beyond each end of the visible range. Defaults to 100.
         """
 
 
@@ -439,11 +982,16 @@ class LeaderboardTable:
         
         self.rect = pygame.Rect(x, y, width, height)
         self.columns = columns
-        self.data = []  # List of dictionaries matching column names
+        # Rows are pulled from the source in windows around the visible range
+        self.source:TableDataSource = ListDataSource([])
+        self.prefetch_rows = prefetch_rows
+        self._row_count = 0
+        self._buffer_start = 0
+        self._buffer:list[dict] = []
         
         # Fonts
-        self.font = font
-        self.header_font = header_font
+        self.font = font or get_font(24)
+        self.header_font = header_font or get_font(28)
         
         # Colors
         self.header_color = header_color
@@ -475,19 +1023,73 @@ class LeaderboardTable:
         
         self.visible = visible
 
-    def set_data(self, data: list[dict]):
-        """Set the table data. Each dict should have keys matching column names"""
-        self.data = data
-        self.scroll_offset = max(0, min(self.scroll_offset, len(self.data) - self.max_visible_rows))
+        # Render caches
+        self.data_version = 0 # bumped whenever the data changes, part of the row cache key
+        self.row_cache_size = row_cache_size
+        self._row_cache:"collections.OrderedDict[tuple, pygame.Surface]" = collections.OrderedDict()
+        self._header_surface = None
+        self._header_key = None
+
+    def set_data(self, data: typing.Union[list[dict], TableDataSource]):
+        """Set the table data. Each row should have keys matching column names
+
+        Args:
+            data (typing.Union[list[dict], TableDataSource]): the rows, or a source to pull them from as the table scrolls
+        """
+        self.source = ListDataSource(data) if isinstance(data, list) else data
+        self._data_changed()
+        self.scroll_offset = max(0, min(self.scroll_offset, self._row_count - self.max_visible_rows))
     
     def add_row(self, row_data: dict):
-        """Add a single row to the table"""
-        self.data.append(row_data)
+        """Add a single row to the table (only for list data)"""
+        if not isinstance(self.source, ListDataSource):
+            raise TypeError("add_row needs list data, the table is pulling rows from a data source")
+        self.source.rows.append(row_data)
+        self._data_changed()
     
     def clear_data(self):
         """Clear all data from the table"""
-        self.data = []
+        self.source = ListDataSource([])
         self.scroll_offset = 0
+        self._data_changed()
+
+    def refresh(self):
+        """Re-read the row count and rows from the data source"""
+        self._data_changed()
+        self.scroll_offset = max(0, min(self.scroll_offset, self._row_count - self.max_visible_rows))
+
+    def _data_changed(self):
+        """Start a new data version, rows cached for the old one are never hit again"""
+        self.data_version += 1
+        self._row_cache.clear()
+        self._row_count = self.source.count()
+        self._buffer_start = 0
+        self._buffer = []
+
+    def row_count(self):
+        """Get the total number of rows"""
+        return self._row_count
+
+    def _ensure_buffered(self, start:int, end:int):
+        """Make sure rows [start, end) are in the buffer, fetching a window around them if not"""
+        buffer_end = self._buffer_start + len(self._buffer)
+        if self._buffer_start <= start and end <= buffer_end:
+            return
+        window_start = max(0, start - self.prefetch_rows)
+        window_end = min(self._row_count, end + self.prefetch_rows)
+        self._buffer = self.source.fetch(window_start, window_end - window_start)
+        self._buffer_start = window_start
+
+    def get_row(self, index:int) -> dict:
+        """Get a single row by index, an empty row if the source has fewer rows than it counted"""
+        self._ensure_buffered(index, index + 1)
+        position = index - self._buffer_start
+        return self._buffer[position] if position < len(self._buffer) else {}
+
+    def invalidate_cache(self):
+        """Drop all rendered rows and the header, needed only after changing fonts, colors or columns"""
+        self._row_cache.clear()
+        self._header_surface = None
     
     def get_column_widths(self):
         """Calculate column widths based on available space"""
@@ -505,11 +1107,11 @@ class LeaderboardTable:
     
     def get_scrollbar_handle_rect(self):
         """Get the scrollbar handle rectangle"""
-        if len(self.data) <= self.max_visible_rows:
+        if self._row_count <= self.max_visible_rows:
             return None
         
         track_rect = self.get_scrollbar_rect()
-        total_rows = len(self.data)
+        total_rows = self._row_count
         visible_ratio = self.max_visible_rows / total_rows
         handle_height = max(30, int(track_rect.height * visible_ratio))
         
@@ -550,7 +1152,7 @@ class LeaderboardTable:
         scroll_ratio = relative_y / (track_rect.height - handle_rect.height)
         scroll_ratio = max(0, min(1, scroll_ratio))
         
-        max_scroll = len(self.data) - self.max_visible_rows
+        max_scroll = self._row_count - self.max_visible_rows
         self.scroll_offset = int(scroll_ratio * max_scroll)
     
     def _update_scroll_from_drag(self, mouse_y):
@@ -564,12 +1166,12 @@ class LeaderboardTable:
         scroll_ratio = relative_y / (track_rect.height - handle_rect.height)
         scroll_ratio = max(0, min(1, scroll_ratio))
         
-        max_scroll = len(self.data) - self.max_visible_rows
+        max_scroll = self._row_count - self.max_visible_rows
         self.scroll_offset = int(scroll_ratio * max_scroll)
     
     def scroll(self, amount: int):
         """Scroll by a given amount"""
-        max_scroll = max(0, len(self.data) - self.max_visible_rows)
+        max_scroll = max(0, self._row_count - self.max_visible_rows)
         self.scroll_offset = max(0, min(self.scroll_offset + amount, max_scroll))
     
     def check_hover(self, mouse_pos):
@@ -591,16 +1193,24 @@ class LeaderboardTable:
             return
         
         row_index = int(relative_y // self.row_height) + self.scroll_offset
-        if row_index < len(self.data):
+        if row_index < self._row_count:
             self.hovered_row = row_index
         else:
             self.hovered_row = -1
     
+    def _render_state(self):
+        return (self.visible, self.data_version, self.scroll_offset, self.hovered_row,
+                self.scrollbar_hover, self.scrollbar_dragging, self.rect.copy())
+
+    def get_bounds(self):
+        return self.rect.union(self.get_scrollbar_rect())
+
     def draw(self, screen):
+        """Draw the table"""
+        self._mark_drawn()
         if not self.visible:
             return
 
-        """Draw the table"""
         # Draw background
         pygame.draw.rect(screen, self.bg_color, self.rect)
         pygame.draw.rect(screen, self.border_color, self.rect, 2)
@@ -612,42 +1222,78 @@ class LeaderboardTable:
         self._draw_rows(screen)
         
         # Draw scrollbar
-        if len(self.data) > self.max_visible_rows:
+        if self._row_count > self.max_visible_rows:
             self._draw_scrollbar(screen)
     
-    def _draw_header(self, screen):
-        """Draw table header"""
-        header_rect = pygame.Rect(self.rect.x, self.rect.y, self.rect.width, self.header_height)
-        pygame.draw.rect(screen, self.header_bg_color, header_rect)
-        
-        column_widths = self.get_column_widths()
-        x_offset = self.rect.x + self.padding
-        
-        for i, (col_name, col_width) in enumerate(zip(self.columns, column_widths)):
+    def _render_header(self):
+        """Bake the header background and column names into one surface"""
+        header_surface = pygame.Surface((self.rect.width, self.header_height))
+        header_surface.fill(self.header_bg_color)
+
+        x_offset = self.padding
+        for col_name, col_width in zip(self.columns, self.get_column_widths()):
             text_surface = self.header_font.render(col_name, True, self.header_color)
-            text_rect = text_surface.get_rect(midleft=(x_offset, self.rect.y + self.header_height // 2))
-            screen.blit(text_surface, text_rect)
+            text_rect = text_surface.get_rect(midleft=(x_offset, self.header_height // 2))
+            header_surface.blit(text_surface, text_rect)
             x_offset += col_width
+        return header_surface
+
+    def _draw_header(self, screen):
+        """Draw table header"""
+        key = (tuple(self.columns), self.rect.width, self.header_height, self.padding, self.header_font, self.header_color, self.header_bg_color)
+        if self._header_surface is None or key != self._header_key:
+            self._header_surface = self._render_header()
+            self._header_key = key
+        screen.blit(self._header_surface, self.rect.topleft)
         
         # Draw header bottom border
         pygame.draw.line(screen, self.border_color, 
                         (self.rect.x, self.rect.y + self.header_height),
                         (self.rect.x + self.rect.width, self.rect.y + self.header_height), 2)
+
+    def _get_row_surface(self, index:int):
+        """Get the rendered text of a row, from the cache if possible
+
+        Args:
+            index (int): row index in the data
+
+        Returns:
+            pygame.Surface: transparent surface with the row's cell values
+        """
+        key = (index, self.data_version)
+        row_surface = self._row_cache.get(key)
+        if row_surface is not None:
+            self._row_cache.move_to_end(key)
+            return row_surface
+
+        row_data = self.get_row(index)
+        row_surface = pygame.Surface((self.rect.width, self.row_height), pygame.SRCALPHA)
+        x_offset = self.padding
+        for col_name, col_width in zip(self.columns, self.get_column_widths()):
+            value = str(row_data.get(col_name, ""))
+            text_surface = self.font.render(value, True, self.text_color)
+            text_rect = text_surface.get_rect(midleft=(x_offset, self.row_height // 2))
+            row_surface.blit(text_surface, text_rect)
+            x_offset += col_width
+
+        self._row_cache[key] = row_surface
+        if len(self._row_cache) > self.row_cache_size:
+            self._row_cache.popitem(last=False)
+        return row_surface
     
     def _draw_rows(self, screen):
         """Draw data rows"""
-        column_widths = self.get_column_widths()
         visible_area = pygame.Rect(self.rect.x, self.rect.y + self.header_height, self.rect.width, self.rect.height - self.header_height)
         
         # Set clipping to prevent drawing outside table
         original_clip = screen.get_clip()
-        screen.set_clip(visible_area)
+        screen.set_clip(visible_area.clip(original_clip))
         
         start_index = self.scroll_offset
-        end_index = min(start_index + self.max_visible_rows + 1, len(self.data))
+        end_index = min(start_index + self.max_visible_rows + 1, self._row_count)
+        self._ensure_buffered(start_index, end_index)
         
         for i in range(start_index, end_index):
-            row_data = self.data[i]
             y_pos = self.rect.y + self.header_height + ((i - self.scroll_offset) * self.row_height)
             
             # Draw row background
@@ -663,13 +1309,7 @@ class LeaderboardTable:
             pygame.draw.rect(screen, bg_color, row_rect)
             
             # Draw row data
-            x_offset = self.rect.x + self.padding
-            for col_name, col_width in zip(self.columns, column_widths):
-                value = str(row_data.get(col_name, ""))
-                text_surface = self.font.render(value, True, self.text_color)
-                text_rect = text_surface.get_rect(midleft=(x_offset, y_pos + self.row_height // 2))
-                screen.blit(text_surface, text_rect)
-                x_offset += col_width
+            screen.blit(self._get_row_surface(i), row_rect)
         
         # Restore original clipping
         screen.set_clip(original_clip)
@@ -693,67 +1333,115 @@ class LeaderboardTable:
 
 import pygame
 
+
+def fast_forward(clock:VirtualClock, duration_ms:int, update:typing.Callable, next_due:typing.Callable[[], typing.Optional[int]]):
+    """Advance a virtual clock, stopping at every moment something is due to run the update in between
+
+    Args:
+        clock (VirtualClock): the clock the updated timers use
+        duration_ms (int): milliseconds to move forward by
+        update (typing.Callable): update function firing what is due, e.g. TimerManager.update_all
+        next_due (typing.Callable): returns the milliseconds until the next update is needed, None if nothing is pending
+    """
+    remaining = duration_ms
+    while True:
+        due = next_due()
+        if due is None or due > remaining:
+            break
+        clock.advance(due)
+        remaining -= due
+        update()
+    clock.advance(remaining)
+
+
 class Timer:
     """Universal timer for delayed events in Pygame"""
-    def __init__(self, duration_ms: int, callback=None, repeat: bool = False):
+    def __init__(self, duration_ms: int, callback=None, repeat: bool = False, clock:typing.Optional[Clock]=None):
         """
         Args:
             duration_ms: Duration in milliseconds
             callback: Function to call when timer completes
             repeat: Whether to restart after completing
+            clock: Time source, defaults to pygame ticks (a TimerManager's timers use the manager's clock)
         """
         self.duration = duration_ms
+        self.clock = clock or default_clock
         self.callback = callback
         self.repeat = repeat
         self.start_time = None
         self.is_active = False
         self.is_paused = False
         self.pause_time = 0
+
+        # Set by TimerManager, which then fires the timer from its schedule
+        self.manager:typing.Optional['TimerManager'] = None
+        self._generation = 0 # bumped on every (re)schedule/stop, outdated schedule entries are skipped
+        self._auto_name:typing.Optional[str] = None # one-shot timers created by delay() are removed once done
         
+    def _now(self):
+        return self.manager.now() if self.manager else self.clock.get_ticks()
+
+    def _schedule(self):
+        self._generation += 1
+        if self.manager:
+            self.manager._push(self)
         
     def start(self):
         """Start or restart the timer"""
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = self._now()
         self.is_active = True
         self.is_paused = False
+        self._schedule()
         
     def stop(self):
         """Stop the timer"""
         self.is_active = False
         self.start_time = None
+        self._generation += 1
         
     def pause(self):
         """Pause the timer"""
         if self.is_active and not self.is_paused:
-            self.pause_time = pygame.time.get_ticks()
+            self.pause_time = self._now()
             self.is_paused = True
+            self._generation += 1
             
     def resume(self):
         """Resume a paused timer"""
         if self.is_paused:
-            pause_duration = pygame.time.get_ticks() - self.pause_time
+            pause_duration = self._now() - self.pause_time
             if self.start_time:
                 self.start_time += pause_duration
             self.is_paused = False
+            self._schedule()
+
+    def get_deadline(self):
+        """Get the time the timer completes at, None if it is not running"""
+        if not self.is_active or self.is_paused or self.start_time is None:
+            return None
+        return self.start_time + self.duration
+
+    def _fire(self):
+        """Complete the timer: run the callback and restart or deactivate"""
+        if self.callback:
+            self.callback()
+        
+        if self.repeat:
+            self.start()  # Restart
+        else:
+            self.is_active = False
     
     def update(self):
-        """Update timer state. Needs to be called in the game update loop."""
+        """Update timer state. Needs to be called in the game update loop (timers added to a TimerManager are updated by it)."""
         if not self.is_active or self.is_paused:
             return False
             
-        if self.start_time:
-            elapsed = pygame.time.get_ticks() - self.start_time
+        if self.start_time is not None:
+            elapsed = self._now() - self.start_time
         
             if elapsed >= self.duration:
                 # Timer completed
-                if self.callback:
-                    self.callback()
-                
-                if self.repeat:
-                    self.start()  # Restart
-                else:
-                    self.is_active = False
-                    
+                self._fire()
                 return True  # Timer completed this frame
         
         return False
@@ -763,7 +1451,7 @@ class Timer:
         if not self.is_active or self.start_time is None:
             return 0.0
         
-        elapsed = pygame.time.get_ticks() - self.start_time
+        elapsed = self._now() - self.start_time
         return min(1.0, elapsed / self.duration)
     
     def get_remaining_ms(self):
@@ -771,18 +1459,108 @@ class Timer:
         if not self.is_active or self.start_time is None:
             return 0
         
-        elapsed = pygame.time.get_ticks() - self.start_time
+        elapsed = self._now() - self.start_time
         return max(0, self.duration - elapsed)
 
 
+class TimerBatch(Timer):
+    """A single timer running several delayed actions, each delay measured from when the batch starts"""
+    def __init__(self, steps:list[tuple[int, typing.Callable]], clock:typing.Optional[Clock]=None):
+        """
+        Args:
+            steps: (delay_ms, action) pairs, actions with the same delay run in the given order
+            clock: Time source, defaults to pygame ticks
+        """
+        self.steps = sorted(steps, key=lambda step: step[0])
+        self.current_step = 0
+        super().__init__(self.steps[0][0] if self.steps else 0, clock=clock)
+
+    def _fire(self):
+        """Run every action that is due, then wait for the next one"""
+        elapsed = self._now() - self.start_time
+        while self.is_active and self.current_step < len(self.steps) and self.steps[self.current_step][0] <= elapsed:
+            action = self.steps[self.current_step][1]
+            self.current_step += 1
+            action()
+
+        if not self.is_active:
+            return
+        if self.current_step < len(self.steps):
+            self.duration = self.steps[self.current_step][0]
+            self._schedule()
+        else:
+            self.is_active = False
+
+
+class TimerHandle:
+    """Returned by TimerManager.delay and delay_batch, used to cancel what was scheduled"""
+    __slots__ = ("manager", "name", "timer")
+
+    def __init__(self, manager:'TimerManager', name:str, timer:Timer):
+        self.manager = manager
+        self.name = name
+        self.timer = timer
+
+    @property
+    def is_active(self):
+        """Check if the callback(s) did not run (all) yet and were not cancelled"""
+        return self.timer.is_active and self.timer.manager is self.manager
+
+    def cancel(self):
+        """Cancel the scheduled callback(s) that did not run yet"""
+        if self.manager.timers.get(self.name) is self.timer:
+            self.manager.cancel(self.name)
+
+
 class TimerManager:
-    """Manages multiple timers"""
-    def __init__(self):
+    """Manages multiple timers. Running timers are kept in a min-heap on their deadline, so each update only touches the timers that are due."""
+    def __init__(self, clock:typing.Optional[Clock]=None):
+        """
+        Args:
+            clock (typing.Optional[Clock], optional): time source of all the timers, e.g. a VirtualClock for simulations. Defaults to pygame ticks.
+        """
+        self.clock = clock or default_clock
         self.timers = {}
+        self._heap:list[tuple] = [] # (deadline, sequence, generation, timer)
+        self._sequence = itertools.count()
+        self._handles = itertools.count(1)
+
+        # Pausing the manager freezes its clock
+        self.is_paused = False
+        self._paused_at = 0
+        self._paused_total = 0
+
+    def now(self):
+        """Get the manager's time in milliseconds (clock time minus the time spent paused)"""
+        if self.is_paused:
+            return self._paused_at - self._paused_total
+        return self.clock.get_ticks() - self._paused_total
+
+    def _push(self, timer:Timer):
+        """Schedule a started timer"""
+        heapq.heappush(self._heap, (timer.start_time + timer.duration, next(self._sequence), timer._generation, timer))
+
+    def _is_current(self, entry:tuple):
+        """Check if a schedule entry still belongs to a running timer of this manager"""
+        _, _, generation, timer = entry
+        return timer.manager is self and generation == timer._generation and timer.is_active and not timer.is_paused
+
+    def _attach(self, timer:Timer):
+        timer.manager = self
+        if timer.is_active and not timer.is_paused:
+            timer._schedule()
+
+    def _detach(self, timer:Timer):
+        timer.manager = None
+        timer._generation += 1
         
     def add_timer(self, name: str, duration_ms: int, callback=None, repeat: bool = False):
-        """Add a named timer"""
-        timer = Timer(duration_ms, callback, repeat)
+        """Add a named timer, replacing (and dropping) any timer with the same name"""
+        timer = Timer(duration_ms, callback, repeat, clock=self.clock)
+        old_timer = self.timers.get(name)
+        if old_timer is not None:
+            self._detach(old_timer)
+        self._attach(timer)
         self.timers[name] = timer
         return timer
     
@@ -799,37 +1577,120 @@ class TimerManager:
     def get_timer(self, name: str):
         """Get a timer by name"""
         return self.timers.get(name)
+
+    def cancel(self, name: str):
+        """Stop and remove a timer by name"""
+        timer = self.timers.pop(name, None)
+        if timer is not None:
+            timer.stop()
+            self._detach(timer)
     
     def update_all(self):
-        """Update all timers. Needs to be called in the game update loop."""
-        # Create a copy of the values to avoid dictionary modification during iteration
-        for timer in list(self.timers.values()):
-            timer.update()
+        """Fire all timers that are due. Needs to be called in the game update loop."""
+        if self.is_paused:
+            return
+        now = self.now()
+        heap = self._heap
+        # Timers (re)started by the callbacks below wait for the next update, like they used to
+        first_new = next(self._sequence)
+        postponed = []
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            if entry[1] > first_new:
+                postponed.append(entry)
+            elif self._is_current(entry):
+                timer = entry[3]
+                timer._fire()
+                if timer._auto_name is not None and not timer.is_active and self.timers.get(timer._auto_name) is timer:
+                    # Auto-remove after completion
+                    del self.timers[timer._auto_name]
+        for entry in postponed:
+            heapq.heappush(heap, entry)
+
+        # Drop outdated entries (stopped or restarted timers) once they pile up
+        if len(heap) > 64 and len(heap) > 2 * len(self.timers):
+            self._heap = [entry for entry in heap if self._is_current(entry)]
+            heapq.heapify(self._heap)
+
+    def pause(self):
+        """Pause all timers of the manager"""
+        if not self.is_paused:
+            self._paused_at = self.clock.get_ticks()
+            self.is_paused = True
+
+    def resume(self):
+        """Resume the manager, timers continue where they were paused"""
+        if self.is_paused:
+            self._paused_total += self.clock.get_ticks() - self._paused_at
+            self.is_paused = False
     
     def clear_all(self):
         """Remove all timers"""
+        for timer in self.timers.values():
+            self._detach(timer)
         self.timers.clear()
+        self._heap.clear()
+
+    def next_due_ms(self) -> typing.Optional[int]:
+        """Get the time until the next running timer completes
+
+        Returns:
+            typing.Optional[int]: milliseconds until the nearest timer is due, None if no timer is running
+        """
+        if self.is_paused:
+            return None
+        heap = self._heap
+        while heap and not self._is_current(heap[0]):
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return max(0, heap[0][0] - self.now())
     
-    def delay(self, duration_ms: int, callback):
-        """Create and start a one-time timer with auto-cleanup"""
-        import random
-        timer_name = f"_auto_{random.randint(10000, 99999)}"
-        
-        def wrapper():
-            callback()
-            # Auto-remove after completion
-            if timer_name in self.timers:
-                del self.timers[timer_name]
-        
-        timer = Timer(duration_ms, wrapper, repeat=False)
-        self.timers[timer_name] = timer
+    def _add_auto(self, timer:Timer):
+        """Register and start a one-shot timer under a new unique name"""
+        name = f"_auto_{next(self._handles)}"
+        timer._auto_name = name
+        self._attach(timer)
+        self.timers[name] = timer
         timer.start()
-        return timer
+        return TimerHandle(self, name, timer)
+    
+    def delay(self, duration_ms: int, callback):
+        """Create and start a one-time timer with auto-cleanup
+
+        Returns:
+            TimerHandle: handle to cancel the callback
+        """
+        return self._add_auto(Timer(duration_ms, callback, clock=self.clock))
+
+    def delay_batch(self, steps:list[tuple[int, typing.Callable]]):
+        """Schedule several delayed callbacks with a single timer, e.g. an announcement sequence
+
+        Args:
+            steps: (delay_ms, callback) pairs, callbacks with the same delay run in the given order
+
+        Returns:
+            TimerHandle: handle to cancel the callbacks that did not run yet
+        """
+        return self._add_auto(TimerBatch(steps, clock=self.clock))
+
+    def advance(self, duration_ms:int):
+        """Move a virtual clock forward, firing every timer at its own deadline on the way
+
+        Args:
+            duration_ms (int): milliseconds to move forward by
+        """
+        fast_forward(self.clock, duration_ms, self.update_all, self.next_due_ms)
 
 
 class TimerSequence:
     """Execute a sequence of timed actions"""
-    def __init__(self):
+    def __init__(self, clock:typing.Optional[Clock]=None):
+        """
+        Args:
+            clock (typing.Optional[Clock], optional): time source of the steps. Defaults to pygame ticks.
+        """
+        self.clock = clock or default_clock
         self.steps = []
         self.current_step = 0
         self.current_timer = None
@@ -870,13 +1731,19 @@ class TimerSequence:
             self.current_step += 1
             self._execute_current_step()
         
-        self.current_timer = Timer(delay, on_complete)
+        self.current_timer = Timer(delay, on_complete, clock=self.clock)
         self.current_timer.start()
     
     def update(self):
         """Update the sequence. Needs to be called in the game update loop."""
         if self.current_timer:
             self.current_timer.update()
+
+    def next_due_ms(self) -> typing.Optional[int]:
+        """Get the time until the next step runs, None if the sequence is not running"""
+        if not self.is_active or not self.current_timer or not self.current_timer.is_active:
+            return None
+        return self.current_timer.get_remaining_ms()
     
     def reset(self):
         """Reset the sequence to the beginning"""
@@ -887,11 +1754,11 @@ class TimerSequence:
 
 
 
-class InputField:
+class InputField(DirtyTracker):
     """Universal text input field"""
     def __init__(self, x: int, y: int, width: int, height: int = 40,
                 placeholder: str = "",
-                font: pygame.font.Font = pygame.font.Font(None, 24),
+                font: typing.Optional[pygame.font.Font] = None,
                 text_color: tuple = (255, 255, 255),
                 placeholder_color: tuple = (128, 128, 128),
                 bg_color: tuple = (30, 30, 30),
@@ -902,7 +1769,8 @@ class InputField:
                 border_radius: int = 5,
                 padding: int = 10,
                 max_length: int = 50,
-                password: bool = False):
+                password: bool = False,
+                clock: typing.Optional[Clock] = None):
         """
         Args:
             x, y: Position
@@ -920,10 +1788,11 @@ class InputField:
             padding: Internal padding
             max_length: Maximum character length
             password: If True, display asterisks instead of text
+            clock: Time source of the cursor blinking, defaults to pygame ticks
         """
         self.rect = pygame.Rect(x, y, width, height)
         self.placeholder = placeholder
-        self.font = font
+        self.font = font or get_font(24)
         
         # Colors
         self.text_color = text_color
@@ -948,7 +1817,8 @@ class InputField:
         self.cursor_visible = True
         self.cursor_timer = 0
         self.cursor_blink_speed = 500  # milliseconds
-        self.last_blink = pygame.time.get_ticks()
+        self.clock = clock or default_clock
+        self.last_blink = self.clock.get_ticks()
         
         # Text offset for scrolling long text
         self.text_offset = 0
@@ -960,7 +1830,7 @@ class InputField:
             self.active = self.rect.collidepoint(event.pos)
             if self.active:
                 self.cursor_visible = True
-                self.last_blink = pygame.time.get_ticks()
+                self.last_blink = self.clock.get_ticks()
         if self.active:
             if event.type == pygame.KEYDOWN or event.type == pygame.KEYUP:
                 if event.key == pygame.K_RETURN or event.key == pygame.K_KP_ENTER:
@@ -994,13 +1864,26 @@ class InputField:
     
     def update(self):
         """Update cursor blinking"""
-        current_time = pygame.time.get_ticks()
+        current_time = self.clock.get_ticks()
         if current_time - self.last_blink > self.cursor_blink_speed:
             self.cursor_visible = not self.cursor_visible
             self.last_blink = current_time
+
+    def next_due_ms(self) -> typing.Optional[int]:
+        """Get the time until the cursor blinks, None if the field is not active"""
+        if not self.active or not self.visible:
+            return None
+        return max(0, self.cursor_blink_speed + 1 - (self.clock.get_ticks() - self.last_blink))
     
+    def _render_state(self):
+        return (self.visible, self.active, self.cursor_visible, self.text, self.placeholder, self.text_offset, self.rect.copy())
+
+    def get_bounds(self):
+        return self.rect.copy()
+
     def draw(self, screen):
         """Draw the input field"""
+        self._mark_drawn()
         if not self.visible:
             return
 
@@ -1031,7 +1914,7 @@ class InputField:
         
         # Set clip and draw text
         original_clip = screen.get_clip()
-        screen.set_clip(text_area)
+        screen.set_clip(text_area.clip(original_clip))
         
         text_rect = text_surface.get_rect(
             midleft=(self.rect.x + self.padding - self.text_offset, self.rect.centery)
@@ -1077,7 +1960,7 @@ class InputField:
         self.active = active
         if active:
             self.cursor_visible = True
-            self.last_blink = pygame.time.get_ticks()
+            self.last_blink = self.clock.get_ticks()
 
     def set_visibility(self, visible:bool):
         self.visible = visible
\ No newline at end of file
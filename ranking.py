@@ -0,0 +1,246 @@
+import bisect
+import math
+import threading
+import typing
+
+from sqlalchemy import func
+
+import db_handling
+
+import logger
+log = logger.get_logger("ranking")
+
+BUCKET_LOAD = 512 # keys per bucket of a RankIndex, buckets are split at twice this
+
+
+
+class FenwickTree:
+    """Prefix sums of a list of counts with O(log n) updates"""
+    def __init__(self, counts:typing.Sequence[int]=()):
+        self.tree = [0] * (len(counts) + 1)
+        for i, count in enumerate(counts, start=1):
+            self.tree[i] += count
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index:int, delta:int):
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, end:int) -> int:
+        """Sum of the counts before end"""
+        total = 0
+        while end > 0:
+            total += self.tree[end]
+            end -= end & -end
+        return total
+
+
+
+class RankIndex:
+    """Sorted keys with O(log n) rank queries.
+
+    The keys are kept in sorted buckets of about BUCKET_LOAD keys. A Fenwick tree over the bucket sizes
+    counts the keys in the buckets before one, bisect finds the position inside it.
+    """
+    def __init__(self, keys:typing.Iterable=()):
+        """
+        Args:
+            keys (typing.Iterable, optional): initial keys. Defaults to none.
+        """
+        keys = sorted(keys)
+        self._buckets:list[list] = [keys[i:i + BUCKET_LOAD] for i in range(0, len(keys), BUCKET_LOAD)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._sizes = FenwickTree([len(bucket) for bucket in self._buckets])
+        self._len = len(keys)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket
+
+    def _rebuild_sizes(self):
+        self._sizes = FenwickTree([len(bucket) for bucket in self._buckets])
+
+    def add(self, key):
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._rebuild_sizes()
+            self._len = 1
+            return
+        i = min(bisect.bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[i]
+        bisect.insort(bucket, key)
+        self._maxes[i] = bucket[-1]
+        self._len += 1
+        if len(bucket) > 2 * BUCKET_LOAD:
+            self._buckets[i:i + 1] = [bucket[:BUCKET_LOAD], bucket[BUCKET_LOAD:]]
+            self._maxes[i:i + 1] = [bucket[BUCKET_LOAD - 1], bucket[-1]]
+            self._rebuild_sizes()
+        else:
+            self._sizes.add(i, 1)
+
+    def remove(self, key):
+        """
+        Raises:
+            KeyError: the key is not in the index
+        """
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            raise KeyError(key)
+        bucket = self._buckets[i]
+        j = bisect.bisect_left(bucket, key)
+        if bucket[j] != key:
+            raise KeyError(key)
+        del bucket[j]
+        self._len -= 1
+        if bucket:
+            self._maxes[i] = bucket[-1]
+            self._sizes.add(i, -1)
+        else:
+            del self._buckets[i]
+            del self._maxes[i]
+            self._rebuild_sizes()
+
+    def rank(self, key) -> int:
+        """Number of keys smaller than key"""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._buckets):
+            return self._len
+        return self._sizes.prefix_sum(i) + bisect.bisect_left(self._buckets[i], key)
+
+    def slice(self, start:int, stop:int) -> list:
+        """The keys from position start to stop, like sorted(keys)[start:stop]"""
+        keys = []
+        skipped = 0
+        for bucket in self._buckets:
+            if skipped + len(bucket) <= start:
+                skipped += len(bucket)
+                continue
+            keys.extend(bucket[max(0, start - skipped):stop - skipped])
+            skipped += len(bucket)
+            if skipped >= stop:
+                break
+        return keys
+
+
+
+def _ranking_key(session_id:int, level:int, score:int) -> tuple:
+    """Sorts like db_handling.RANKING: level and score descending, then id"""
+    return (-level, -score, session_id)
+
+
+class Leaderboard:
+    """The ranking of the valid game sessions held in memory, for the rank of a game without scanning the table.
+
+    Built once from the ranking index, then kept up to date incrementally from the leaderboard_changes table
+    (filled by triggers, so it sees the writes of every process). The table only keeps the newest
+    db_handling.LEADERBOARD_CHANGES_KEPT changes, a leaderboard that missed compacted ones is loaded again.
+    """
+    def __init__(self, session_factory:typing.Callable=db_handling.Session):
+        """
+        Args:
+            session_factory (typing.Callable, optional): makes database sessions. Defaults to db_handling.Session.
+        """
+        self.session_factory = session_factory
+        self._index:typing.Optional[RankIndex] = None
+        self._keys:dict[int, tuple] = {} # session id: key in the index
+        self._seq = 0 # last change applied
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._index) if self._index is not None else 0
+
+    def _load(self, session):
+        """Read the whole ranking from the ranking index"""
+        Change = db_handling.LeaderboardChangeModel
+        GameSession = db_handling.GameSessionModel
+        # Changes made while loading are applied again afterwards, applying one twice changes nothing
+        self._seq = session.query(func.max(Change.seq)).scalar() or 0
+        rows = session.query(GameSession.id, GameSession.level_reached, GameSession.score)\
+            .filter(GameSession.invalid == 0)\
+            .order_by(*db_handling.RANKING)\
+            .all()
+        self._keys = {session_id: _ranking_key(session_id, level, score) for session_id, level, score in rows}
+        self._index = RankIndex(self._keys.values())
+        log.info(f"LOADED LEADERBOARD OF {len(rows)} GAME SESSIONS")
+
+    def _changes(self, session) -> list:
+        Change = db_handling.LeaderboardChangeModel
+        return session.query(Change.seq, Change.session_id, Change.level_reached, Change.score, Change.listed)\
+            .filter(Change.seq > self._seq)\
+            .order_by(Change.seq)\
+            .all()
+
+    def refresh(self):
+        """Apply the changes made since the last refresh, the first one loads the whole ranking"""
+        with self._lock, self.session_factory() as session:
+            changes = self._changes(session) if self._index is not None else None
+            # seq counts up without gaps, so a gap before the first change means the ones in between were compacted away.
+            # The newest change is never compacted, no changes at all means none were missed.
+            if changes and changes[0][0] > self._seq + 1:
+                log.info(f"LEADERBOARD MISSED COMPACTED CHANGES {self._seq + 1}-{changes[0][0] - 1}, RELOADING")
+                changes = None
+            if changes is None:
+                self._load(session)
+                changes = self._changes(session)
+            for seq, session_id, level, score, listed in changes:
+                old = self._keys.pop(session_id, None)
+                if old is not None:
+                    self._index.remove(old)
+                if listed:
+                    key = _ranking_key(session_id, level, score)
+                    self._keys[session_id] = key
+                    self._index.add(key)
+                self._seq = seq
+
+    def rank(self, session_id:int) -> typing.Optional[int]:
+        """Place of a game session on the leaderboard, 1 is the best
+
+        Returns:
+            typing.Optional[int]: the rank, None if the session is not on the leaderboard
+        """
+        self.refresh()
+        with self._lock:
+            key = self._keys.get(session_id)
+            if key is None:
+                return None
+            return self._index.rank(key) + 1
+
+    def rank_of(self, level:int, score:int) -> int:
+        """Place a new game with this result takes, after the earlier games with the same result"""
+        self.refresh()
+        with self._lock:
+            return self._index.rank((-level, -score, math.inf)) + 1
+
+    def ids(self, start:int, stop:int) -> list[int]:
+        """Ids of the game sessions from rank start + 1 to stop, e.g. ids(0, 10) are the top 10"""
+        self.refresh()
+        with self._lock:
+            return [session_id for _, _, session_id in self._index.slice(start, stop)]
+
+    def rank_of_async(self, level:int, score:int, on_rank:typing.Callable[[int, int], None]):
+        """rank_of() on a background thread, the database may be slow
+
+        Args:
+            level (int): level of the game
+            score (int): score of the game
+            on_rank (typing.Callable[[int, int], None]): called with the rank and the number of ranked games, from the background thread
+        """
+        def lookup():
+            try:
+                rank = self.rank_of(level, score)
+            except Exception as e:
+                log.warning(f"RANK LOOKUP FAILED: {e}")
+                return
+            on_rank(rank, len(self) + 1)
+        threading.Thread(target=lookup, name="rank", daemon=True).start()
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,350 @@
+import contextlib
+import mmap
+import os
+import struct
+import threading
+import typing
+from enum import IntEnum
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+import rules
+
+MAGIC = b"DITR"
+VERSION = 2
+_HEADER = struct.Struct("<4sBQI") # magic, version, seed, action count
+# Each action is a varint of (milliseconds since the previous action << ACTION_BITS | action),
+# most take 2 bytes
+ACTION_BITS = 4
+_MAX_VARINT_BYTES = 9 # 63 bits
+
+ARCHIVE_DIR = os.path.join("instance", "replays")
+SEGMENT_SIZE = 64 * 1024 * 1024 # bytes, a new segment file is started once a replay would not fit
+_INDEX = struct.Struct("<QIQI") # session id, segment, offset, length
+
+
+
+class Action(IntEnum):
+    """Everything a player does that the rules engine sees"""
+    ROLL = 0
+    GUESS_GREATER = 1
+    GUESS_LOWER = 2
+    TRANSFER_STEP = 3
+    TRANSFER_ALL = 4
+    PAY_STEP = 5
+    PAY_ALL = 6
+    LEVEL_UP = 7
+    TICK = 8
+
+
+# How each action is applied to the engine, indexed by Action
+PERFORM:tuple[typing.Callable[[rules.GameEngine], typing.Any], ...] = (
+    rules.GameEngine.generate_numbers,
+    rules.GameEngine.guess_greater,
+    rules.GameEngine.guess_lower,
+    rules.GameEngine.transfer_step,
+    rules.GameEngine.transfer_all,
+    rules.GameEngine.pay_step,
+    rules.GameEngine.pay_all,
+    rules.GameEngine.advance_level,
+    rules.GameEngine.tick,
+)
+
+
+class ReplayError(ValueError):
+    """The replay data is damaged or of an unknown format"""
+
+
+@contextlib.contextmanager
+def _exclusive(file:typing.BinaryIO):
+    """Hold an exclusive lock on an open file, other processes wait for it"""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1) # retries for 10s, then raises OSError
+        try:
+            yield
+        finally:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _encode_varints(values:typing.Iterable[int]) -> bytes:
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append(value & 0x7F | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+def _decode_varints(data) -> np.ndarray:
+    """Decode all varints of a buffer at once
+
+    Returns:
+        np.ndarray: the values (uint64)
+    """
+    raw = np.frombuffer(data, np.uint8)
+    if not len(raw):
+        return np.empty(0, np.uint64)
+    if raw[-1] & 0x80:
+        raise ReplayError("Replay ends in the middle of an action")
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    if lengths.max() > _MAX_VARINT_BYTES:
+        raise ReplayError("Replay action is too long")
+    # Shift every 7 bit group to its place in its value and sum the groups of each value
+    shifts = np.arange(len(raw), dtype=np.uint64)
+    shifts -= np.repeat(starts, lengths).astype(np.uint64)
+    shifts *= np.uint64(7)
+    return np.add.reduceat((raw & 0x7F).astype(np.uint64) << shifts, starts)
+
+
+
+class Replay:
+    """A recorded game: the seed of its random numbers and the actions with their timing"""
+    def __init__(self, seed:int, actions:typing.Optional[list[tuple[int, int]]]=None):
+        """
+        Args:
+            seed (int): seed of the game's rules engine
+            actions (typing.Optional[list[tuple[int, int]]], optional): (Action, milliseconds since the previous action) pairs. Defaults to none yet.
+        """
+        self.seed = seed
+        self.actions:list[tuple[int, int]] = actions if actions is not None else []
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __eq__(self, other):
+        return isinstance(other, Replay) and self.seed == other.seed and self.actions == other.actions
+
+    @property
+    def duration_ms(self) -> int:
+        return sum(delay for _, delay in self.actions)
+
+    def pack(self) -> bytes:
+        """Serialize to bytes, about 2 bytes per action"""
+        body = _encode_varints(delay << ACTION_BITS | action for action, delay in self.actions)
+        return _HEADER.pack(MAGIC, VERSION, self.seed, len(self.actions)) + body
+
+    @classmethod
+    def unpack(cls, data:typing.Union[bytes, memoryview]) -> 'Replay':
+        """Deserialize bytes made by pack(), the data is not copied
+
+        Args:
+            data (typing.Union[bytes, memoryview]): the packed replay, e.g. a ReplayArchive.get() view
+
+        Raises:
+            ReplayError: the data is not a replay or is damaged
+        """
+        try:
+            magic, version, seed, count = _HEADER.unpack_from(data)
+        except struct.error as e:
+            raise ReplayError("Replay header is damaged") from e
+        if magic != MAGIC or version != VERSION:
+            raise ReplayError(f"Unknown replay format {magic!r} v{version}")
+        values = _decode_varints(memoryview(data)[_HEADER.size:])
+        if len(values) != count:
+            raise ReplayError(f"Replay should have {count} actions, it has {len(values)}")
+        actions = (values & np.uint64((1 << ACTION_BITS) - 1)).tolist()
+        delays = (values >> np.uint64(ACTION_BITS)).tolist()
+        return cls(seed, list(zip(actions, delays)))
+
+
+
+class ReplayRecorder:
+    """Applies actions to a rules engine and records them"""
+    def __init__(self, engine:rules.GameEngine, now:typing.Callable[[], int]):
+        """
+        Args:
+            engine (rules.GameEngine): the engine of the recorded game, its seed is recorded
+            now (typing.Callable[[], int]): current game time in milliseconds, e.g. TimerManager.now
+        """
+        self.engine = engine
+        self.now = now
+        self.replay = Replay(engine.seed)
+        self._last_time = now()
+
+    def perform(self, action:Action):
+        """Apply an action to the engine and record it
+
+        Returns:
+            Any: what the engine method returns
+        """
+        time = self.now()
+        self.replay.actions.append((action, max(0, time - self._last_time)))
+        self._last_time = time
+        return PERFORM[action](self.engine)
+
+
+
+class ReplayArchive:
+    """Append-only store of packed replays keyed by game session id, outside of the database.
+
+    Replays are appended to segment files, an index file holds where each one is.
+    Reads are memory-mapped and return views into the mapping, nothing is copied.
+    Any number of processes can append, an appending process holds a file lock (archive.lock) while it writes.
+    """
+    def __init__(self, directory:str=ARCHIVE_DIR, segment_size:int=SEGMENT_SIZE):
+        """
+        Args:
+            directory (str, optional): where the segments and the index are. Defaults to ARCHIVE_DIR.
+            segment_size (int, optional): size in bytes a segment grows to before a new one is started. Defaults to SEGMENT_SIZE.
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self._index_path = os.path.join(directory, "index.bin")
+        self._lock_path = os.path.join(directory, "archive.lock")
+        self._locations:dict[int, tuple[int, int, int]] = {} # session id: (segment, offset, length)
+        self._order:list[int] = [] # session ids in the order they were appended
+        self._index_read = 0 # bytes of the index file that were loaded
+        self._maps:dict[int, mmap.mmap] = {}
+        self._lock = threading.Lock()
+        self._segment = 0 # the last segment, appended to
+        self._segment_file:typing.Optional[typing.BinaryIO] = None
+        self._segment_file_number = -1 # the segment _segment_file is open on
+        self._index_file:typing.Optional[typing.BinaryIO] = None
+        self._lock_file:typing.Optional[typing.BinaryIO] = None
+        self.refresh()
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, session_id:int):
+        return session_id in self._locations
+
+    def _segment_path(self, segment:int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:05d}.bin")
+
+    def refresh(self):
+        """Load the replays other processes appended since the last refresh"""
+        with self._lock:
+            self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self._index_path, "rb") as index:
+                index.seek(self._index_read)
+                data = index.read()
+        except FileNotFoundError:
+            return
+        # A record that is still being written is picked up by the next refresh
+        complete = len(data) - len(data) % _INDEX.size
+        for session_id, segment, offset, length in _INDEX.iter_unpack(memoryview(data)[:complete]):
+            self._add_location(session_id, segment, offset, length)
+        self._index_read += complete
+
+    def _add_location(self, session_id:int, segment:int, offset:int, length:int):
+        if session_id not in self._locations:
+            self._order.append(session_id)
+        self._locations[session_id] = (segment, offset, length)
+        self._segment = max(self._segment, segment)
+
+    def append(self, session_id:int, data:bytes):
+        """Store the packed replay of a game session
+
+        Args:
+            session_id (int): id of the GameSessionModel
+            data (bytes): Replay.pack() of the game
+        """
+        with self._lock:
+            if self._lock_file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._lock_file = open(self._lock_path, "a+b")
+                self._index_file = open(self._index_path, "ab")
+            with _exclusive(self._lock_file):
+                # Other processes may have appended and started new segments, the ends of the files are only read under the lock
+                self._read_index()
+                index_size = self._index_file.seek(0, os.SEEK_END)
+                if index_size % _INDEX.size:
+                    # Drop a record left half-written by a crash
+                    self._index_file.truncate(index_size - index_size % _INDEX.size)
+                    self._index_read = index_size - index_size % _INDEX.size
+                if self._segment_file_number != self._segment:
+                    self._open_segment(self._segment)
+                offset = self._segment_file.seek(0, os.SEEK_END)
+                if offset and offset + len(data) > self.segment_size:
+                    self._open_segment(self._segment + 1)
+                    offset = self._segment_file.seek(0, os.SEEK_END)
+                # The replay has to be on disk before the index points to it
+                self._segment_file.write(data)
+                self._segment_file.flush()
+                self._index_file.write(_INDEX.pack(session_id, self._segment, offset, len(data)))
+                self._index_file.flush()
+                self._index_read += _INDEX.size
+            self._add_location(session_id, self._segment, offset, len(data))
+
+    def _open_segment(self, segment:int):
+        if self._segment_file is not None:
+            self._segment_file.close()
+        self._segment_file = open(self._segment_path(segment), "ab")
+        self._segment_file_number = self._segment = segment
+
+    def _view(self, segment:int, offset:int, length:int) -> memoryview:
+        mapped = self._maps.get(segment)
+        if mapped is None or offset + length > len(mapped):
+            # The segment grew since it was mapped, views of the old mapping stay valid
+            with open(self._segment_path(segment), "rb") as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return memoryview(mapped)[offset:offset + length]
+
+    def get(self, session_id:int) -> typing.Optional[memoryview]:
+        """The packed replay of a game session
+
+        Args:
+            session_id (int): id of the GameSessionModel
+
+        Returns:
+            typing.Optional[memoryview]: a read-only view of the replay, None if there is none
+        """
+        location = self._locations.get(session_id)
+        if location is None:
+            return None
+        return self._view(*location)
+
+    def ids(self, start:int=0, stop:typing.Optional[int]=None) -> list[int]:
+        """Session ids in the order their replays were appended
+
+        Args:
+            start (int, optional): position to start at. Defaults to 0.
+            stop (typing.Optional[int], optional): position to stop before. Defaults to the end.
+        """
+        return self._order[start:stop]
+
+    def __iter__(self) -> typing.Iterator[tuple[int, memoryview]]:
+        """Stream (session id, replay view) pairs in storage order, the segments are paged in as they are read"""
+        for session_id in list(self._order):
+            yield session_id, self._view(*self._locations[session_id])
+
+    def close(self):
+        with self._lock:
+            for file in (self._segment_file, self._index_file, self._lock_file):
+                if file is not None:
+                    file.close()
+            self._segment_file = self._index_file = self._lock_file = None
+            self._segment_file_number = -1
+            for mapped in self._maps.values():
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass # still viewed, it is unmapped once the views are gone
+            self._maps.clear()
+
+
+
+archive = ReplayArchive()
@@ -0,0 +1,232 @@
+import dataclasses
+import fractions
+import random
+import secrets
+import typing
+from enum import Enum
+
+# Game balance
+STRIKE_LIMIT = 5
+MIN_NUMBER = 1
+MAX_NUMBER = 20
+INITIAL_DEBT = 10
+DEBT_GROWTH = fractions.Fraction(3, 2) # exact, the debt outgrows floats in long games
+INITIAL_TIME = 200 #s
+LEVEL_TIME_BONUS = 100 #s
+
+TOO_MANY_STRIKES = "TOO MANY STRIKES"
+TIME_RAN_OUT = "TIME RAN OUT"
+
+SKILLS = {
+    "insta_pay": {
+        "name": "Insta Pay",
+        "description": "Instantly pays the debt, no waiting.",
+    },
+    "insta_transfer": {
+        "name": "Insta Transfer",
+        "description": "Instantly transfers the points, no waiting.",
+    },
+    "another_chance": {
+        "name": "I Don't Think So",
+        "description": "A small chance to turn a loss into a win.",
+    },
+    "no_locks": {
+        "name": "I'm Free!",
+        "description": "Allows to do transfer while rolling.",
+    },
+}
+
+
+
+class Outcome(Enum):
+    WIN = 0
+    SALVAGED = 1 # a loss turned into a win by the 'I Don't Think So' skill
+    LOSS = 2
+
+
+def new_effectors() -> dict[str, dict]:
+    """Skills of a new game, all at level 0"""
+    return {key: {**skill, "level": 0} for key, skill in SKILLS.items()}
+
+
+@dataclasses.dataclass(slots=True)
+class EngineState:
+    """Everything that describes a running game"""
+    clue: typing.Optional[int] = None
+    actual: typing.Optional[int] = None # None when there is no number to guess
+    last_debt: int = INITIAL_DEBT
+    current_debt: int = INITIAL_DEBT
+    temporary_storage: int = 0
+    permanent_storage: int = 0
+    level: int = 1
+    score: int = 0
+    strikes: int = 0
+    time_remaining: int = INITIAL_TIME
+    effectors: dict[str, dict] = dataclasses.field(default_factory=new_effectors)
+    game_over_reason: typing.Optional[str] = None
+
+
+
+class GameEngine:
+    """The rules of the game without any UI. PlayScreen drives one, simulations can run many of them without pygame."""
+    def __init__(self, seed:typing.Optional[int]=None, state:typing.Optional[EngineState]=None):
+        """
+        Args:
+            seed (typing.Optional[int], optional): seed of the random numbers, the same seed and actions replay the same game. Defaults to None (random).
+            state (typing.Optional[EngineState], optional): state to continue from. Defaults to a new game.
+        """
+        self.seed = seed if seed is not None else secrets.randbits(63)
+        self.rng = random.Random(self.seed)
+        self.state = state if state is not None else EngineState()
+
+    @property
+    def is_over(self) -> bool:
+        return self.state.game_over_reason is not None
+
+    def skill_level(self, skill:str) -> int:
+        return self.state.effectors[skill].get('level', 0)
+
+    def multiplier(self) -> int:
+        """Points for a correct guess, grows with the permanent account"""
+        return (self.state.permanent_storage // 5) + 1
+
+    def salvage_chance(self) -> float:
+        """Chance of the 'I Don't Think So' skill turning a loss into a win"""
+        level = self.skill_level('another_chance')
+        return level/(level+5)
+
+    def generate_numbers(self) -> int:
+        """Roll the hidden number and a different clue
+
+        Returns:
+            int: the clue
+        """
+        state = self.state
+        state.actual = self.rng.randint(MIN_NUMBER, MAX_NUMBER)
+        state.clue = self.rng.randint(MIN_NUMBER, MAX_NUMBER)
+        while state.actual == state.clue:
+            state.clue = self.rng.randint(MIN_NUMBER, MAX_NUMBER)
+        return state.clue
+
+    def guess(self, greater:bool) -> typing.Optional[Outcome]:
+        """Guess whether the hidden number is greater or lower than the clue
+
+        Args:
+            greater (bool): True to guess greater, False to guess lower
+
+        Returns:
+            typing.Optional[Outcome]: result of the guess, None if there is no number to guess
+        """
+        state = self.state
+        if state.clue is None or state.actual is None:
+            return None
+        if (state.clue < state.actual) if greater else (state.clue > state.actual):
+            return self.win()
+        return self.lose()
+
+    def guess_greater(self) -> typing.Optional[Outcome]:
+        return self.guess(True)
+
+    def guess_lower(self) -> typing.Optional[Outcome]:
+        return self.guess(False)
+
+    def win(self, chance_override:bool=False) -> Outcome:
+        """Win a round, add temporary points, lower strikes
+
+        Args:
+            chance_override (bool, optional): the win is a salvaged loss. Defaults to False.
+        """
+        state = self.state
+        points = self.multiplier()
+        state.temporary_storage += points
+        state.score += points
+        state.actual = None
+        state.strikes = max(0, state.strikes-1)
+        return Outcome.SALVAGED if chance_override else Outcome.WIN
+
+    def lose(self) -> Outcome:
+        """Lose a round, remove all temporary points, increase strikes and end the game on too many. The 'I Don't Think So' skill may turn the loss into a win."""
+        state = self.state
+        if self.skill_level('another_chance') > 0 and self.rng.random() < self.salvage_chance():
+            return self.win(True)
+        state.temporary_storage = 0
+        state.actual = None
+        state.strikes += 1
+        if state.strikes == STRIKE_LIMIT:
+            self.end(TOO_MANY_STRIKES)
+        return Outcome.LOSS
+
+    def transfer_step(self) -> bool:
+        """Move one point from the temporary to the permanent account
+
+        Returns:
+            bool: False if there was nothing to move
+        """
+        state = self.state
+        if state.temporary_storage <= 0:
+            return False
+        state.permanent_storage += 1
+        state.temporary_storage -= 1
+        return True
+
+    def transfer_all(self):
+        """Move all temporary points to the permanent account"""
+        state = self.state
+        if state.temporary_storage > 0:
+            state.permanent_storage += state.temporary_storage
+            state.temporary_storage = 0
+
+    def pay_step(self) -> bool:
+        """Pay one point of the debt from the permanent account
+
+        Returns:
+            bool: False if the debt is paid or there is nothing to pay with
+        """
+        state = self.state
+        if state.current_debt == 0 or state.permanent_storage == 0:
+            return False
+        state.current_debt -= 1
+        state.permanent_storage -= 1
+        return True
+
+    def pay_all(self):
+        """Pay as much of the debt as the permanent account allows"""
+        state = self.state
+        paid = max(0, min(state.current_debt, state.permanent_storage))
+        state.current_debt -= paid
+        state.permanent_storage -= paid
+
+    def advance_level(self) -> dict:
+        """Advance the level, raise the debt and give a random skill
+
+        Returns:
+            dict: the upgraded skill
+        """
+        state = self.state
+        state.current_debt = int(state.last_debt * DEBT_GROWTH)
+        state.last_debt = state.current_debt
+        state.time_remaining += LEVEL_TIME_BONUS
+        state.level += 1
+
+        effectors = state.effectors
+        picked_skill = effectors[list(effectors.keys())[self.rng.randrange(0, len(effectors))]]
+        picked_skill['level'] += 1
+        return picked_skill
+
+    def tick(self) -> bool:
+        """One second of game time passes, ends the game when the time already ran out
+
+        Returns:
+            bool: False if the game ended
+        """
+        state = self.state
+        if state.time_remaining <= 0:
+            self.end(TIME_RAN_OUT)
+            return False
+        state.time_remaining -= 1
+        return True
+
+    def end(self, reason:str):
+        """End the game, the first reason is kept"""
+        if self.state.game_over_reason is None:
+            self.state.game_over_reason = reason
@@ -1,10 +1,25 @@
 import json
+import os
+import tempfile
+import threading
+import atexit
+import typing
 
 SCREEN_WIDTH = 1200 #px
 SCREEN_HEIGHT = 800 #px
 
 FPS = 60
 
+# Repaint only changed areas instead of flipping the whole screen every frame (also: python game.py --dirty-rects)
+DIRTY_RECTS = False
+
+# Block on pygame.event.wait instead of ticking at full FPS while nothing is animating
+IDLE_THROTTLE = True
+IDLE_MAX_WAIT_MS = 1000
+
+# Show the optimal play (strategy.py tables) under the clue
+SHOW_HINTS = False
+
 GAME_TITLE = "DEEP IN THE RED"
 
 
@@ -19,27 +34,112 @@ DARK_BLUE = (50, 100, 200)
 
 
 
+SETTINGS_FILE = "user_settings.json"
+SETTINGS_FLUSH_DELAY = 1.0 #s
+
+
+
+class SettingsStore:
+    """User settings loaded from disk once and served from memory. Changes are written back after a quiet period (write-behind)."""
+    def __init__(self, path:str=SETTINGS_FILE, flush_delay:float=SETTINGS_FLUSH_DELAY):
+        """
+        Args:
+            path (str, optional): the settings file. Defaults to SETTINGS_FILE.
+            flush_delay (float, optional): seconds without changes before they are written to disk. Defaults to SETTINGS_FLUSH_DELAY.
+        """
+        self.path = path
+        self.flush_delay = flush_delay
+        self._data:typing.Optional[dict] = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._timer:typing.Optional[threading.Timer] = None
+
+    def _loaded(self) -> dict:
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    with open(self.path, "r") as f:
+                        self._data = json.load(f)
+        return self._data
+
+    def all(self) -> dict:
+        """Get a copy of all settings"""
+        with self._lock:
+            return dict(self._loaded())
+
+    def get(self, key:str, default:typing.Any=None) -> typing.Any:
+        """Get a single setting"""
+        return self._loaded().get(key, default)
+
+    def set(self, key:str, value:typing.Any):
+        """Change a single setting, it is written to disk later"""
+        self.update({key: value})
+
+    def update(self, values:dict):
+        """Change several settings at once, they are written to disk later"""
+        with self._lock:
+            self._loaded().update(values)
+            self._dirty = True
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """(Re)start the debounce timer, every change postpones the write"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.flush_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Write pending changes to disk now. The file is replaced atomically (temp file + rename)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".settings-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self._data, f, indent=4)
+                os.replace(temp_path, self.path)
+            except Exception:
+                os.remove(temp_path)
+                raise
+            self._dirty = False
+
+    def reload(self):
+        """Drop unsaved changes and read the file again on next access"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._data = None
+            self._dirty = False
+
+
+store = SettingsStore()
+atexit.register(store.flush)
+
+
+
 def load_settings():
-    """Load persisted user settings from disk. Returns the deserialized configuration as a dictionary.
+    """Get the user settings. They are read from disk only once, later calls are served from memory.
 
     Returns:
         dict: A mapping of user setting keys to their stored values loaded from 'user_settings.json'.
     """
-    with open("user_settings.json", "r") as f:
-        return json.load(f)
+    return store.all()
 
 def save_setting(key, value):
-    """Update a single user setting and persist it to disk. This function modifies the stored configuration without affecting other settings.
+    """Update a single user setting. The change is visible immediately and persisted to disk in the background (see SettingsStore.flush).
 
     Args:
         key: The setting name to update.
         value: The new value to store for the given setting key.
     """
-    with open("user_settings.json", "r") as f:
-        settings = json.load(f)
-    settings[key] = value
-    with open("user_settings.json", "w") as f:
-        json.dump(settings, f, indent=4)
+    store.set(key, value)
 
 
 
@@ -0,0 +1,234 @@
+import dataclasses
+import sys
+import typing
+
+import numpy as np
+
+import rules
+
+# Skill columns of the simulated games
+SKILL_KEYS = list(rules.SKILLS.keys())
+INSTA_PAY, INSTA_TRANSFER, ANOTHER_CHANCE, NO_LOCKS = (SKILL_KEYS.index(key) for key in ("insta_pay", "insta_transfer", "another_chance", "no_locks"))
+
+# Why a simulated game ended
+STRUCK_OUT = 0
+TIMED_OUT = 1
+ROUND_LIMIT = 2
+
+
+
+@dataclasses.dataclass(frozen=True)
+class Strategy:
+    """How the simulated players play. Subclass and override the methods for other strategies, they get and return arrays of all running games."""
+    greater_up_to: int = 10 # guess greater for clues up to this number, lower above it
+    bank_at: int = 5 # transfer the temporary points once there are at least this many
+    round_seconds: float = 3.0 # game time a guess takes (2s result flash + reaction time)
+    point_seconds: float = 1.0 # game time a transferred/paid point takes without the skills
+    bank_overhead: float = 0.0 # game time every transfer takes on top of the points
+
+    def guess_greater(self, clue:np.ndarray, temporary_storage:np.ndarray, strikes:np.ndarray) -> np.ndarray:
+        return clue <= self.greater_up_to
+
+    def should_bank(self, temporary_storage:np.ndarray, permanent_storage:np.ndarray, strikes:np.ndarray, time_left:np.ndarray, transfer_cost:np.ndarray) -> np.ndarray:
+        """Which games transfer their temporary points after a won round
+
+        Args:
+            time_left (np.ndarray): seconds of game time left
+            transfer_cost (np.ndarray): seconds a transferred point takes, 0 when a skill removes the wait
+        """
+        return temporary_storage >= self.bank_at
+
+
+@dataclasses.dataclass
+class SimulationResult:
+    """Per game results of a simulation, indexed by game"""
+    level: np.ndarray
+    score: np.ndarray # float, the scores outgrow 64-bit integers once the instant skills remove the time pressure
+    rounds: np.ndarray # guesses made
+    seconds: np.ndarray # game time played
+    ended_by: np.ndarray # STRUCK_OUT, TIMED_OUT or ROUND_LIMIT
+
+    def __len__(self):
+        return len(self.level)
+
+    def level_distribution(self) -> np.ndarray:
+        """Share of the games reaching each level, indexed by level"""
+        return np.bincount(self.level) / len(self)
+
+    def percentiles(self, name:str, q:typing.Sequence[float]=(50, 90, 99, 99.9, 99.99)) -> dict[float, float]:
+        """Percentiles of one of the result columns, e.g. the score a legitimate game almost never exceeds
+
+        Args:
+            name (str): column name (level, score, rounds, seconds)
+            q (typing.Sequence[float], optional): percentiles to compute. Defaults to (50, 90, 99, 99.9, 99.99).
+        """
+        return dict(zip(q, np.percentile(getattr(self, name), q).tolist()))
+
+    def summary(self) -> dict[str, typing.Any]:
+        """Means and percentiles of all columns"""
+        return {
+            "games": len(self),
+            "ended_by": {reason: float((self.ended_by == value).mean()) for reason, value in (("strikes", STRUCK_OUT), ("time", TIMED_OUT), ("round_limit", ROUND_LIMIT))},
+            **{name: {"mean": float(getattr(self, name).mean()), "max": getattr(self, name).max().item(), **self.percentiles(name)} for name in ("level", "score", "rounds", "seconds")}
+        }
+
+    @classmethod
+    def concatenate(cls, results:typing.Sequence['SimulationResult']) -> 'SimulationResult':
+        return cls(*(np.concatenate([getattr(result, field.name) for result in results]) for field in dataclasses.fields(cls)))
+
+
+
+def _simulate_chunk(n_games:int, strategy:Strategy, rng:np.random.Generator, max_rounds:int) -> SimulationResult:
+    """Play n_games in lockstep, one round of every running game per step"""
+    result = SimulationResult(
+        level=np.empty(n_games, np.int32),
+        score=np.empty(n_games, np.float64),
+        rounds=np.empty(n_games, np.int32),
+        seconds=np.empty(n_games, np.float64),
+        ended_by=np.empty(n_games, np.int8),
+    )
+
+    # State of the games, one entry per game. Points are floats (exact up to 2**53),
+    # they grow exponentially in long games.
+    game_id = np.arange(n_games)
+    running = np.ones(n_games, bool)
+    temporary = np.zeros(n_games)
+    permanent = np.zeros(n_games)
+    debt = np.full(n_games, float(rules.INITIAL_DEBT))
+    last_debt = debt.copy()
+    level = np.ones(n_games, np.int32)
+    score = np.zeros(n_games)
+    strikes = np.zeros(n_games, np.int8)
+    time_left = np.full(n_games, float(rules.INITIAL_TIME))
+    seconds = np.zeros(n_games)
+    skills = np.zeros((len(SKILL_KEYS), n_games), np.int16)
+    # Seconds per transferred/paid point, changes only with the skills
+    transfer_cost = np.full(n_games, strategy.point_seconds)
+    pay_cost = transfer_cost.copy()
+
+    def record(ended:np.ndarray, reason:np.ndarray, rounds:int):
+        finished = game_id[ended]
+        result.level[finished] = level[ended]
+        result.score[finished] = score[ended]
+        result.rounds[finished] = rounds
+        result.seconds[finished] = seconds[ended]
+        result.ended_by[finished] = reason
+
+    rounds = 0
+    n = n_games
+    while n:
+        rounds += 1
+
+        # Roll: the clue is uniform over the numbers other than the actual one, like the rerolls in the engine
+        actual = rng.integers(rules.MIN_NUMBER, rules.MAX_NUMBER + 1, n, dtype=np.int8)
+        clue = rng.integers(rules.MIN_NUMBER, rules.MAX_NUMBER, n, dtype=np.int8)
+        clue += clue >= actual
+
+        greater = strategy.guess_greater(clue, temporary, strikes)
+        won = np.where(greater, clue < actual, clue > actual)
+
+        # 'I Don't Think So' may turn a loss into a win
+        salvage_level = skills[ANOTHER_CHANCE]
+        salvageable = np.flatnonzero(~won & (salvage_level > 0))
+        if len(salvageable):
+            salvage_level = salvage_level[salvageable]
+            won[salvageable] = rng.random(len(salvageable)) < salvage_level / (salvage_level + 5)
+
+        points = permanent / 5
+        np.floor(points, out=points)
+        points += 1
+        points *= won
+        temporary += points
+        temporary *= won # a loss loses the temporary points
+        score += points
+        strikes += 1 - 2 * won.view(np.int8)
+        np.maximum(strikes, 0, out=strikes)
+
+        # Transfers and payments take a second per point unless a skill makes them instant or lets the player keep rolling
+        moved = temporary * (won & strategy.should_bank(temporary, permanent, strikes, time_left - strategy.round_seconds, transfer_cost))
+        permanent += moved
+        temporary -= moved
+        spent = moved * transfer_cost
+        spent += strategy.round_seconds
+        if strategy.bank_overhead:
+            spent += (moved > 0) * strategy.bank_overhead
+
+        # Level up: the debt is paid and grows by DEBT_GROWTH, more time and a random skill
+        paid = np.flatnonzero((moved > 0) & (permanent >= debt))
+        if len(paid):
+            paid_debt = debt[paid]
+            permanent[paid] -= paid_debt
+            spent[paid] += paid_debt * pay_cost[paid]
+            new_debt = np.floor(last_debt[paid] * float(rules.DEBT_GROWTH))
+            last_debt[paid] = new_debt
+            debt[paid] = new_debt
+            level[paid] += 1
+            time_left[paid] += rules.LEVEL_TIME_BONUS
+            skills[rng.integers(0, len(SKILL_KEYS), len(paid)), paid] += 1
+            instant = skills[NO_LOCKS, paid] == 1
+            transfer_cost[paid] = np.where(instant | (skills[INSTA_TRANSFER, paid] >= 1), 0.0, strategy.point_seconds)
+            pay_cost[paid] = np.where(instant | (skills[INSTA_PAY, paid] >= 1), 0.0, strategy.point_seconds)
+
+        time_left -= spent
+        seconds += spent
+
+        struck_out = strikes >= rules.STRIKE_LIMIT
+        ended = (struck_out | (time_left <= 0)) & running
+        if rounds >= max_rounds:
+            record(running & ~ended, ROUND_LIMIT, rounds)
+        if ended.any():
+            record(ended, np.where(struck_out[ended], STRUCK_OUT, TIMED_OUT), rounds)
+            running &= ~ended
+        if rounds >= max_rounds:
+            break
+
+        # Finished games keep being stepped (and ignored) until enough of them pile up to be worth dropping
+        alive = np.count_nonzero(running)
+        if alive < n * 0.75:
+            keep = running
+            game_id, running, temporary, permanent, debt, last_debt = game_id[keep], running[keep], temporary[keep], permanent[keep], debt[keep], last_debt[keep]
+            level, score, strikes, time_left, seconds = level[keep], score[keep], strikes[keep], time_left[keep], seconds[keep]
+            skills, transfer_cost, pay_cost = skills[:, keep], transfer_cost[keep], pay_cost[keep]
+            n = alive
+
+    return result
+
+
+def simulate(n_games:int, strategy:typing.Optional[Strategy]=None, seed:typing.Optional[int]=None, chunk_size:int=1_000_000, max_rounds:int=1_000) -> SimulationResult:
+    """Monte Carlo simulation of many independent games for balancing the economy and setting score plausibility limits
+
+    The rules are the ones of rules.GameEngine with game time modelled by the strategy: a guess costs
+    strategy.round_seconds and every transferred or paid point strategy.point_seconds unless a skill removes the wait.
+    The player pays the whole debt once the permanent account covers it (partial payments only lower the multiplier).
+    Once Insta Pay or I'm Free! remove the waiting, the multiplier outgrows the debt and such games only end by strikes,
+    which can take tens of thousands of rounds - max_rounds cuts them off.
+
+    Args:
+        n_games (int): number of games to play
+        strategy (typing.Optional[Strategy], optional): how the games are played. Defaults to Strategy().
+        seed (typing.Optional[int], optional): seed for reproducible results. Defaults to None (random).
+        chunk_size (int, optional): games played at once, bounds the memory use (about 100 B per game). Defaults to 1_000_000.
+        max_rounds (int, optional): games still running after this many guesses are stopped (ended_by ROUND_LIMIT). Defaults to 1_000.
+
+    Returns:
+        SimulationResult: results of every game
+    """
+    strategy = strategy or Strategy()
+    chunks = [chunk_size] * (n_games // chunk_size)
+    if n_games % chunk_size:
+        chunks.append(n_games % chunk_size)
+    # Independent random streams per chunk, the results do not depend on anything but the seed and chunk size
+    streams = np.random.SeedSequence(seed).spawn(len(chunks))
+    results = [_simulate_chunk(size, strategy, np.random.default_rng(stream), max_rounds) for size, stream in zip(chunks, streams)]
+    if not results:
+        return _simulate_chunk(0, strategy, np.random.default_rng(seed), max_rounds)
+    return SimulationResult.concatenate(results)
+
+
+
+if __name__ == '__main__':
+    # python simulation.py [GAMES] [SEED]
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    for name, value in simulate(n_games, seed=seed).summary().items():
+        print(f"{name}: {value}")
@@ -0,0 +1,298 @@
+import dataclasses
+import os
+import threading
+import typing
+
+import numpy as np
+
+import rules
+import simulation
+
+CACHE_DIR = os.path.join("instance", "strategy")
+TABLE_VERSION = 1 # bump when the tables change meaning, old cache files are then ignored
+
+HORIZON = 600 #s, game time the tables look ahead
+MAX_STREAK = 32 # longest streak of wins in the tables, longer streaks are banked
+MAX_BANK_SECONDS = 64 # slowest transfer of a win's points in the tables, slower ones use this table
+ROUND_SECONDS = 3 # game time of a round (2s result flash + reaction time)
+POINT_SECONDS = 1 # game time of transferring a point without the skills
+BANK_OVERHEAD = 1 # game time of deciding to transfer and clicking, what makes collecting a streak worth the risk
+
+
+
+def guess_chances(clue:int, salvage_level:int=0) -> tuple[float, float]:
+    """Chances of winning the round by guessing greater and lower
+
+    Args:
+        clue (int): the shown clue
+        salvage_level (int, optional): level of the 'I Don't Think So' skill. Defaults to 0.
+
+    Returns:
+        tuple[float, float]: (greater, lower)
+    """
+    others = rules.MAX_NUMBER - rules.MIN_NUMBER # the actual number is any of the other numbers
+    greater = (rules.MAX_NUMBER - clue) / others
+    lower = (clue - rules.MIN_NUMBER) / others
+    salvage = salvage_level / (salvage_level + 5)
+    return greater + (1 - greater) * salvage, lower + (1 - lower) * salvage
+
+
+def best_guess(clue:int, salvage_level:int=0) -> tuple[bool, float]:
+    """The optimal guess for a clue
+
+    Returns:
+        tuple[bool, float]: (guess greater, chance of winning with it)
+    """
+    greater, lower = guess_chances(clue, salvage_level)
+    return greater >= lower, max(greater, lower)
+
+
+def win_chance(salvage_level:int=0) -> float:
+    """Chance of winning a round with the optimal guess, before the clue is known"""
+    clues = range(rules.MIN_NUMBER, rules.MAX_NUMBER + 1)
+    return sum(best_guess(clue, salvage_level)[1] for clue in clues) / len(clues)
+
+
+def bank_seconds(state:rules.EngineState, point_seconds:int=POINT_SECONDS) -> int:
+    """Game time transferring one win's points takes, 0 when a skill makes the transfer instant or lets the player keep rolling"""
+    effectors = state.effectors
+    if effectors['insta_transfer'].get('level', 0) >= 1 or effectors['no_locks'].get('level', 0) == 1:
+        return 0
+    return ((state.permanent_storage // 5) + 1) * point_seconds
+
+
+
+@dataclasses.dataclass
+class StrategyTables:
+    """Expected outcome of banking and of continuing, indexed [seconds left, streak of wins, strikes]
+
+    Banking is the trade-off of the game: a loss wipes the temporary account, while every transfer costs game time
+    (BANK_OVERHEAD plus the time per point unless a skill removes it). A streak of k wins holds k times the multiplier in the temporary account. Values are in multiplier units:
+    the expected points banked before the time runs out (the growth of the multiplier after banking is ignored).
+    """
+    salvage_level: int
+    bank_seconds: int # game time a transfer of one win's points takes
+    bank_value: np.ndarray
+    bank_bust: np.ndarray # chance of striking out before the time runs out
+    continue_value: np.ndarray
+    continue_bust: np.ndarray
+
+    @classmethod
+    def compute(cls, salvage_level:int=0, bank_seconds:int=POINT_SECONDS, horizon:int=HORIZON, max_streak:int=MAX_STREAK, round_seconds:int=ROUND_SECONDS, bank_overhead:int=BANK_OVERHEAD) -> 'StrategyTables':
+        """Solve the banking problem by dynamic programming over the seconds left, each second only depends on earlier ones"""
+        p = win_chance(salvage_level)
+        q = 1 - p
+        strikes = np.arange(rules.STRIKE_LIMIT)
+        streak = np.arange(max_streak + 1)
+        after_win = np.maximum(strikes - 1, 0)
+        after_loss = np.minimum(strikes + 1, rules.STRIKE_LIMIT - 1)
+        struck_out = strikes + 1 >= rules.STRIKE_LIMIT
+        next_streak = np.minimum(streak + 1, max_streak)
+        transfer_time = streak * bank_seconds + bank_overhead
+
+        shape = (horizon + 1, max_streak + 1, rules.STRIKE_LIMIT)
+        bank_value, bank_bust = np.zeros(shape), np.zeros(shape)
+        continue_value, continue_bust = np.zeros(shape), np.zeros(shape)
+        # Value and bust chance of the better option
+        value, bust = np.zeros(shape), np.zeros(shape)
+
+        for seconds in range(horizon + 1):
+            # Not enough time for a round: the game ends with the temporary points unbanked
+            if seconds >= round_seconds:
+                before = seconds - round_seconds
+                # A loss wipes the streak and strikes out on the last strike
+                lose_value = np.where(struck_out, 0, value[before, 0, after_loss])
+                lose_bust = np.where(struck_out, 1, bust[before, 0, after_loss])
+                continue_value[seconds] = p * value[before][next_streak][:, after_win] + q * lose_value
+                continue_bust[seconds] = p * bust[before][next_streak][:, after_win] + q * lose_bust
+
+            # Banking continues from an empty streak once transferred, the time running out stops the transfer
+            left = seconds - transfer_time
+            done = left >= 0
+            left = np.maximum(left, 0)
+            if bank_seconds:
+                transferred = np.where(done, streak, np.maximum(seconds - bank_overhead, 0) / bank_seconds)
+            else:
+                transferred = np.where(done, streak, 0).astype(float)
+                # Instant transfer: the empty streak at this second may be needed first
+                value[seconds, 0], bust[seconds, 0] = continue_value[seconds, 0], continue_bust[seconds, 0]
+            bank_value[seconds] = transferred[:, None] + np.where(done[:, None], value[left, 0], 0)
+            bank_bust[seconds] = np.where(done[:, None], bust[left, 0], 0)
+            bank_value[seconds, 0] = continue_value[seconds, 0] # banking nothing is continuing
+            bank_bust[seconds, 0] = continue_bust[seconds, 0]
+
+            banking = bank_value[seconds] > continue_value[seconds]
+            banking[max_streak] = True # the longest streak has to be banked
+            value[seconds] = np.where(banking, bank_value[seconds], continue_value[seconds])
+            bust[seconds] = np.where(banking, bank_bust[seconds], continue_bust[seconds])
+
+        return cls(salvage_level, bank_seconds, *(table.astype(np.float32) for table in (bank_value, bank_bust, continue_value, continue_bust)))
+
+    @property
+    def bank(self) -> np.ndarray:
+        """True where banking is the better option"""
+        banking = self.bank_value > self.continue_value
+        banking[:, -1] = True
+        return banking
+
+    def _index(self, seconds_left:int, streak:int, strikes:int):
+        return min(max(int(seconds_left), 0), self.bank_value.shape[0] - 1), min(max(streak, 0), self.bank_value.shape[1] - 1), min(max(strikes, 0), rules.STRIKE_LIMIT - 1)
+
+    def compare(self, seconds_left:int, streak:int, strikes:int) -> dict[str, dict[str, float]]:
+        """Expected value and bust chance of banking versus continuing
+
+        Args:
+            seconds_left (int): remaining game time
+            streak (int): wins in the temporary account (temporary storage / multiplier)
+            strikes (int): current strikes
+
+        Returns:
+            dict[str, dict[str, float]]: {"bank": {"value", "bust"}, "continue": {"value", "bust"}}, values in multiplier units
+        """
+        index = self._index(seconds_left, streak, strikes)
+        return {
+            "bank": {"value": float(self.bank_value[index]), "bust": float(self.bank_bust[index])},
+            "continue": {"value": float(self.continue_value[index]), "bust": float(self.continue_bust[index])},
+        }
+
+    def should_bank(self, seconds_left:int, streak:int, strikes:int) -> bool:
+        index = self._index(seconds_left, streak, strikes)
+        return index[1] == self.bank_value.shape[1] - 1 or bool(self.bank_value[index] > self.continue_value[index])
+
+
+
+class TableStore:
+    """Strategy tables, each computed once, cached on disk and loaded on first use"""
+    def __init__(self, directory:str=CACHE_DIR, horizon:int=HORIZON, max_streak:int=MAX_STREAK, round_seconds:int=ROUND_SECONDS, bank_overhead:int=BANK_OVERHEAD):
+        """
+        Args:
+            directory (str, optional): where the tables are cached. Defaults to CACHE_DIR.
+            horizon (int, optional): seconds the tables look ahead. Defaults to HORIZON.
+            max_streak (int, optional): longest streak in the tables. Defaults to MAX_STREAK.
+            round_seconds (int, optional): game time of a round. Defaults to ROUND_SECONDS.
+            bank_overhead (int, optional): game time every transfer costs. Defaults to BANK_OVERHEAD.
+        """
+        self.directory = directory
+        self.horizon = horizon
+        self.max_streak = max_streak
+        self.round_seconds = round_seconds
+        self.bank_overhead = bank_overhead
+        self._tables:dict[tuple[int, int], StrategyTables] = {}
+        self._bank_masks:dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, salvage_level:int, bank_seconds:int) -> str:
+        name = f"v{TABLE_VERSION}-t{self.horizon}-k{self.max_streak}-r{self.round_seconds}-o{self.bank_overhead}-s{rules.STRIKE_LIMIT}-salvage{salvage_level}-bank{bank_seconds}.npz"
+        return os.path.join(self.directory, name)
+
+    def get(self, salvage_level:int=0, bank_seconds:int=POINT_SECONDS) -> StrategyTables:
+        """Get the tables, loading or computing them if needed
+
+        Args:
+            salvage_level (int, optional): level of the 'I Don't Think So' skill. Defaults to 0.
+            bank_seconds (int, optional): game time a transfer of one win's points takes, see bank_seconds(). Defaults to POINT_SECONDS.
+        """
+        key = (salvage_level, min(bank_seconds, MAX_BANK_SECONDS))
+        tables = self._tables.get(key)
+        if tables is None:
+            with self._lock:
+                tables = self._tables.get(key)
+                if tables is None:
+                    tables = self._load(*key)
+                    self._tables[key] = tables
+        return tables
+
+    def _load(self, salvage_level:int, bank_seconds:int) -> StrategyTables:
+        path = self._path(salvage_level, bank_seconds)
+        fields = ("bank_value", "bank_bust", "continue_value", "continue_bust")
+        try:
+            with np.load(path) as data:
+                return StrategyTables(salvage_level, bank_seconds, *(data[field] for field in fields))
+        except (OSError, KeyError, ValueError):
+            pass
+        tables = StrategyTables.compute(salvage_level, bank_seconds, self.horizon, self.max_streak, self.round_seconds, self.bank_overhead)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Written next to the target and renamed, a crash never leaves half a file behind
+            temporary_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez_compressed(temporary_path, **{field: getattr(tables, field) for field in fields})
+            os.replace(temporary_path, path)
+        except OSError:
+            pass # the cache is optional
+        return tables
+
+    def bank_mask(self, salvage_level:int=0) -> np.ndarray:
+        """Banking decisions of every transfer speed, indexed [bank seconds, seconds left, streak, strikes]"""
+        mask = self._bank_masks.get(salvage_level)
+        if mask is None:
+            with self._lock:
+                mask = self._bank_masks.get(salvage_level)
+                if mask is None:
+                    # Only the decisions are kept in memory, not all the tables behind them
+                    mask = np.stack([(self._tables.get((salvage_level, seconds)) or self._load(salvage_level, seconds)).bank for seconds in range(MAX_BANK_SECONDS + 1)])
+                    self._bank_masks[salvage_level] = mask
+        return mask
+
+    def clear(self):
+        """Forget the loaded tables (the disk cache stays)"""
+        with self._lock:
+            self._tables.clear()
+            self._bank_masks.clear()
+
+
+tables = TableStore()
+
+
+
+@dataclasses.dataclass(frozen=True)
+class Hint:
+    guess_greater: typing.Optional[bool] # None when there is no clue to guess
+    win_chance: typing.Optional[float]
+    bank: bool
+    bank_value: float # expected points banked from now on when banking now
+    continue_value: float # expected points banked from now on when continuing
+    bust_chance: float # chance of striking out with optimal play
+
+
+def hint(state:rules.EngineState, store:typing.Optional[TableStore]=None) -> Hint:
+    """Optimal play for a game state, e.g. for the in-game hint overlay
+
+    Args:
+        state (rules.EngineState): the game state
+        store (typing.Optional[TableStore], optional): where the strategy tables come from. Defaults to tables.
+
+    Returns:
+        Hint: the best guess for the shown clue and whether to bank the temporary points, values in points
+    """
+    salvage_level = state.effectors['another_chance'].get('level', 0)
+    multiplier = (state.permanent_storage // 5) + 1
+    streak = round(state.temporary_storage / multiplier)
+    table = (store if store is not None else tables).get(salvage_level, bank_seconds(state))
+    comparison = table.compare(state.time_remaining, streak, state.strikes)
+    bank = streak > 0 and table.should_bank(state.time_remaining, streak, state.strikes)
+
+    guess_greater, chance = best_guess(state.clue, salvage_level) if state.clue is not None and state.actual is not None else (None, None)
+    return Hint(
+        guess_greater=guess_greater,
+        win_chance=chance,
+        bank=bank,
+        bank_value=comparison["bank"]["value"] * multiplier,
+        continue_value=comparison["continue"]["value"] * multiplier,
+        bust_chance=comparison["bank" if bank else "continue"]["bust"],
+    )
+
+
+
+@dataclasses.dataclass(frozen=True)
+class OptimalStrategy(simulation.Strategy):
+    """Banks by the strategy tables, for simulating the best legitimate play (e.g. to set leaderboard plausibility limits).
+    The salvage skill is not taken into account for banking."""
+    bank_overhead: float = BANK_OVERHEAD
+
+    def should_bank(self, temporary_storage:np.ndarray, permanent_storage:np.ndarray, strikes:np.ndarray, time_left:np.ndarray, transfer_cost:np.ndarray) -> np.ndarray:
+        mask = tables.bank_mask()
+        multiplier = np.floor(permanent_storage / 5) + 1
+        seconds = np.minimum(transfer_cost * multiplier, MAX_BANK_SECONDS).astype(np.int64)
+        left = np.clip(time_left, 0, mask.shape[1] - 1).astype(np.int64)
+        streak = np.minimum(np.rint(temporary_storage / multiplier), mask.shape[2] - 1).astype(np.int64)
+        return mask[seconds, left, streak, np.minimum(strikes, rules.STRIKE_LIMIT - 1)]
@@ -0,0 +1,366 @@
+import atexit
+import base64
+import dataclasses
+import datetime
+import json
+import os
+import queue
+import tempfile
+import threading
+import typing
+import uuid
+from enum import Enum
+
+from sqlalchemy import insert, select
+
+import db_handling
+import replay
+
+import logger
+log = logger.get_logger("submission")
+
+JOURNAL_FILE = os.path.join("instance", "session_journal.jsonl")
+BATCH_SIZE = 500 # games synced per round-trip, their ids go into one SQL IN (...)
+RETRY_DELAY = 0.5 # seconds before the first retry of a failed sync, doubled after every failure
+MAX_RETRY_DELAY = 60 # seconds
+
+
+
+class SubmissionStatus(Enum):
+    PENDING = "pending" # in the journal, not synced yet
+    SAVED = "saved"
+    REJECTED = "rejected" # can never be saved, e.g. the user does not exist
+
+
+@dataclasses.dataclass(eq=False)
+class Submission:
+    """A finished game waiting to be saved as a GameSessionModel"""
+    username: str
+    started_at: datetime.datetime
+    score: int
+    level: int
+    replay: bytes = b"" # replay.Replay.pack() of the game
+    client_id: str = dataclasses.field(default_factory=lambda: uuid.uuid4().hex) # the same game is saved only once
+
+    def to_json(self) -> dict:
+        return {
+            "client_id": self.client_id,
+            "username": self.username,
+            "started_at": self.started_at.isoformat(),
+            "score": self.score,
+            "level": self.level,
+            "replay": base64.b64encode(self.replay).decode("ascii"),
+        }
+
+    @classmethod
+    def from_json(cls, data:dict) -> 'Submission':
+        return cls(
+            client_id=data["client_id"],
+            username=data["username"],
+            started_at=datetime.datetime.fromisoformat(data["started_at"]),
+            score=data["score"],
+            level=data["level"],
+            replay=base64.b64decode(data["replay"]),
+        )
+
+
+
+class SessionJournal:
+    """Append-only file of finished games, a JSON line each. A high-water mark file holds how much of it is synced.
+    Once everything is synced the journal is emptied."""
+    def __init__(self, path:str=JOURNAL_FILE):
+        """
+        Args:
+            path (str, optional): the journal file, the mark is next to it. Defaults to JOURNAL_FILE.
+        """
+        self.path = path
+        self._mark_path = path + ".synced"
+        self._file:typing.Optional[typing.BinaryIO] = None
+
+    @property
+    def size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def synced(self) -> int:
+        """Bytes of the journal that are synced"""
+        try:
+            with open(self._mark_path, "r") as f:
+                mark = int(f.read())
+        except (FileNotFoundError, ValueError):
+            return 0
+        # A mark past the end does not belong to this journal, e.g. the file was replaced
+        return mark if mark <= self.size else 0
+
+    @property
+    def unsynced(self) -> bool:
+        return self.synced < self.size
+
+    def append(self, submissions:list[Submission]):
+        """Write games to the journal and to the disk"""
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "ab")
+            # Finish a line a crash cut short, it is skipped as damaged
+            if self._file.tell():
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._file.write(b"\n")
+        self._file.write(b"".join(json.dumps(submission.to_json()).encode() + b"\n" for submission in submissions))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def read(self, offset:int, limit:int) -> tuple[list[Submission], int]:
+        """Read games from the journal
+
+        Args:
+            offset (int): byte to start at, e.g. synced
+            limit (int): most games to read
+
+        Returns:
+            tuple[list[Submission], int]: the games and the byte after the last one
+        """
+        games = []
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return games, offset
+        with f:
+            f.seek(offset)
+            for _ in range(limit):
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break # still being written
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    games.append(Submission.from_json(json.loads(line)))
+                except (ValueError, KeyError, TypeError) as e:
+                    log.warning(f"SKIPPED DAMAGED JOURNAL LINE AT BYTE {offset - len(line)}: {e}")
+        return games, offset
+
+    def mark_synced(self, offset:int) -> int:
+        """Move the high-water mark, the journal is emptied when everything is synced
+
+        Returns:
+            int: the new mark
+        """
+        if offset < self.size:
+            self._write_mark(offset)
+            return offset
+        # The mark is reset before the journal is emptied. A crash in between only syncs the journal again, and
+        # save_batch skips the saved games. The other way round a stale mark could skip games journaled later.
+        self._write_mark(0)
+        if self._file is not None:
+            self._file.truncate(0)
+        else:
+            with open(self.path, "r+b") as f:
+                f.truncate(0)
+        return 0
+
+    def _write_mark(self, offset:int):
+        """Replace the mark file atomically (temp file + rename)"""
+        directory = os.path.dirname(os.path.abspath(self._mark_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".journal-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(str(offset))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self._mark_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+
+def save_batch(submissions:list[Submission], session_factory:typing.Callable=db_handling.Session, archive:typing.Optional[replay.ReplayArchive]=None) -> dict[str, SubmissionStatus]:
+    """Save games to the database in one bulk insert and their replays to the archive.
+    Games that are already saved (by client_id) are skipped, so a batch can be synced again after a crash.
+    Their replays are archived if they are still missing, e.g. the crash came between the insert and the archive.
+
+    Args:
+        submissions (list[Submission]): the games
+        session_factory (typing.Callable, optional): makes database sessions. Defaults to db_handling.Session.
+        archive (typing.Optional[replay.ReplayArchive], optional): where the replays go. Defaults to replay.archive.
+
+    Raises:
+        sqlalchemy.exc.SQLAlchemyError: the database could not be written, e.g. it is locked
+        OSError: a replay could not be archived, syncing the batch again archives it
+
+    Returns:
+        dict[str, SubmissionStatus]: the outcome of each game by client_id
+    """
+    archive = archive if archive is not None else replay.archive
+    GameSession = db_handling.GameSessionModel
+    User = db_handling.UserModel
+    games = {game.client_id: game for game in submissions}
+    statuses = {}
+    new = {}
+    with session_factory() as session:
+        users = dict(session.execute(
+            select(User.username, User.id).where(User.username.in_({game.username for game in submissions}))
+        ).all())
+        # session id by client_id
+        saved = dict(session.execute(
+            select(GameSession.client_id, GameSession.id).where(GameSession.client_id.in_(list(games)))
+        ).all())
+        for game in submissions:
+            if game.client_id in saved:
+                statuses[game.client_id] = SubmissionStatus.SAVED
+            elif game.username not in users:
+                log.warning(f"GAME SESSION REJECTED: unknown user {game.username!r}")
+                statuses[game.client_id] = SubmissionStatus.REJECTED
+            else:
+                new[game.client_id] = game
+        if new:
+            rows = session.execute(insert(GameSession).returning(GameSession.id, GameSession.client_id), [{
+                "user_id": users[game.username],
+                "started_at": game.started_at,
+                "score": game.score,
+                "level_reached": game.level,
+                "client_id": game.client_id,
+            } for game in new.values()]).all()
+            session.commit()
+            saved.update((client_id, session_id) for session_id, client_id in rows)
+
+    # Without its replay a saved game is invalidated (verification.Verifier.invalidate_missing). An OSError leaves the
+    # batch unsynced, the next sync skips the saved games and archives the replays that are still missing.
+    archive.refresh()
+    for client_id, session_id in saved.items():
+        if games[client_id].replay and session_id not in archive:
+            archive.append(session_id, games[client_id].replay)
+    for client_id in new:
+        statuses[client_id] = SubmissionStatus.SAVED
+    return statuses
+
+
+
+class SubmissionQueue:
+    """Saves finished games without making the game wait for the database (offline-first).
+    Games go to the journal on a background thread, which then syncs the journal in batches.
+    A failed sync is retried with a growing delay, also after a restart."""
+    def __init__(self, journal_path:str=JOURNAL_FILE, write_batch:typing.Callable[[list[Submission]], dict[str, SubmissionStatus]]=save_batch, batch_size:int=BATCH_SIZE, retry_delay:float=RETRY_DELAY, max_retry_delay:float=MAX_RETRY_DELAY):
+        """
+        Args:
+            journal_path (str, optional): the journal of finished games. Defaults to JOURNAL_FILE.
+            write_batch (typing.Callable[[list[Submission]], dict[str, SubmissionStatus]], optional): saves games, see save_batch. Defaults to save_batch.
+            batch_size (int, optional): games saved at once. Defaults to BATCH_SIZE.
+            retry_delay (float, optional): seconds before the first retry of a failed sync. Defaults to RETRY_DELAY.
+            max_retry_delay (float, optional): longest wait between retries. Defaults to MAX_RETRY_DELAY.
+        """
+        self.journal = SessionJournal(journal_path)
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue:queue.Queue[typing.Optional[tuple[Submission, typing.Optional[typing.Callable[[SubmissionStatus], None]]]]] = queue.Queue()
+        self._callbacks:dict[str, typing.Callable[[SubmissionStatus], None]] = {}
+        self._lock = threading.Lock()
+        self._thread:typing.Optional[threading.Thread] = None
+
+    def submit(self, submission:Submission, on_status:typing.Optional[typing.Callable[[SubmissionStatus], None]]=None):
+        """Queue a finished game to be saved
+
+        Args:
+            submission (Submission): the game
+            on_status (typing.Optional[typing.Callable[[SubmissionStatus], None]], optional): called with PENDING now and with the outcome later, from the writer thread. Defaults to None.
+        """
+        self.start()
+        if on_status is not None:
+            on_status(SubmissionStatus.PENDING)
+        self._queue.put((submission, on_status))
+
+    def start(self):
+        """Start the writer, it syncs what is left in the journal first"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="submission", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout:float=5.0):
+        """Stop the writer, queued games are journaled and synced on the next start
+
+        Args:
+            timeout (float, optional): seconds to wait for a sync in progress. Defaults to 5.0.
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        self.journal.close()
+
+    def sync(self) -> int:
+        """Save the journaled games that are not synced yet
+
+        Raises:
+            sqlalchemy.exc.SQLAlchemyError: the database could not be written, what was synced so far stays synced
+
+        Returns:
+            int: games synced
+        """
+        synced = 0
+        offset = self.journal.synced
+        while True:
+            games, end = self.journal.read(offset, self.batch_size)
+            if end == offset:
+                return synced
+            statuses = self.write_batch(games) if games else {}
+            offset = self.journal.mark_synced(end)
+            synced += len(games)
+            log.info(f"SYNCED {len(games)} GAME SESSIONS")
+            for client_id, status in statuses.items():
+                on_status = self._callbacks.pop(client_id, None)
+                if on_status is not None:
+                    on_status(status)
+
+    def _run(self):
+        delay = self.retry_delay
+        wait = 0 if self.journal.unsynced else None
+        while True:
+            items = []
+            try:
+                items.append(self._queue.get(timeout=wait))
+                while True:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            closing = None in items
+            games = [item for item in items if item is not None]
+            if games:
+                self.journal.append([game for game, _ in games])
+                for game, on_status in games:
+                    if on_status is not None:
+                        self._callbacks[game.client_id] = on_status
+            if closing:
+                return
+            try:
+                self.sync()
+                delay, wait = self.retry_delay, None
+            except Exception as e:
+                log.warning(f"SYNCING GAME SESSIONS FAILED, RETRYING IN {delay}s: {e}")
+                wait, delay = delay, min(delay * 2, self.max_retry_delay)
+
+
+submissions = SubmissionQueue()
+atexit.register(submissions.close)
+
+
+
+if __name__ == '__main__':
+    # python submission.py - sync the games journaled on this machine
+    print(f"Synced {submissions.sync()} game sessions")
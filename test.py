@@ -1,7 +1,26 @@
 import unittest
+import datetime
+import threading
+import json
+import os
+import tempfile
+import random
+import bisect
+import multiprocessing
+from sqlalchemy import create_engine, event, inspect, text, tuple_
+from sqlalchemy.orm import sessionmaker
 
+import db_handling
 import game
 import objects
+import ranking
+import replay
+import rules
+import settings
+import simulation
+import strategy
+import submission
+import verification
 
 
 
@@ -96,6 +115,1075 @@ class TestTimerManager(unittest.TestCase):
         tm.delay(0, lambda: None)
         self.assertTrue(len(tm.timers) > 0)
 
+    def test_due_timers_fire_in_deadline_order(self):
+        tm = objects.TimerManager()
+        fired = []
+        tm.delay(0, lambda: fired.append("b"))
+        tm.add_timer("a", -10, lambda: fired.append("a"))
+        tm.start_timer("a")
+        tm.update_all()
+        self.assertEqual(fired, ["a", "b"])
+
+    def test_pending_timers_not_touched(self):
+        tm = objects.TimerManager()
+        for _ in range(5000):
+            tm.delay(10**9, lambda: None)
+        tm.update_all()
+        self.assertEqual(len(tm._heap), 5000)
+
+    def test_stopped_timer_does_not_fire(self):
+        tm = objects.TimerManager()
+        fired = []
+        tm.add_timer("t", 0, lambda: fired.append(True))
+        tm.start_timer("t")
+        tm.stop_timer("t")
+        tm.update_all()
+        self.assertEqual(fired, [])
+
+    def test_replaced_timer_does_not_fire(self):
+        tm = objects.TimerManager()
+        fired = []
+        tm.add_timer("t", 0, lambda: fired.append("old")).start()
+        tm.add_timer("t", 0, lambda: fired.append("new")).start()
+        tm.update_all()
+        self.assertEqual(fired, ["new"])
+
+    def test_paused_manager_does_not_fire(self):
+        tm = objects.TimerManager()
+        fired = []
+        tm.delay(0, lambda: fired.append(True))
+        tm.pause()
+        tm.update_all()
+        self.assertEqual(fired, [])
+        self.assertIsNone(tm.next_due_ms())
+        tm.resume()
+        tm.update_all()
+        self.assertEqual(fired, [True])
+
+    def test_next_due_without_timers(self):
+        tm = objects.TimerManager()
+        tm.add_timer("idle", 1000)
+        self.assertIsNone(tm.next_due_ms())
+
+    def test_delay_names_are_unique(self):
+        tm = objects.TimerManager()
+        handles = [tm.delay(10**9, lambda: None) for _ in range(3)]
+        first = handles.pop(0)
+        first.cancel()
+        handles.append(tm.delay(10**9, lambda: None))
+        self.assertEqual(len({handle.name for handle in handles}), 3)
+        self.assertNotIn(first.name, tm.timers)
+
+    def test_delay_handle_cancel(self):
+        tm = objects.TimerManager()
+        fired = []
+        handle = tm.delay(0, lambda: fired.append(True))
+        self.assertTrue(handle.is_active)
+        handle.cancel()
+        tm.update_all()
+        self.assertEqual(fired, [])
+        self.assertFalse(handle.is_active)
+        self.assertEqual(tm.timers, {})
+
+    def test_delay_batch_runs_steps_in_order(self):
+        tm = objects.TimerManager()
+        fired = []
+        tm.delay_batch([(0, lambda: fired.append("b")), (0, lambda: fired.append("c")), (10**9, lambda: fired.append("d"))])
+        self.assertEqual(len(tm.timers), 1)
+        tm.update_all()
+        self.assertEqual(fired, ["b", "c"])
+        self.assertEqual(len(tm.timers), 1)
+
+    def test_next_due_with_pending_timer(self):
+        tm = objects.TimerManager()
+        tm.delay(1000, lambda: None)
+        self.assertTrue(0 < tm.next_due_ms() <= 1000)
+
+
+class TestText(unittest.TestCase):
+
+    def test_steady_state_uses_cache(self):
+        objects.Text.clear_cache()
+        surface = objects.pygame.Surface((200, 100))
+        text = objects.Text("cached", 50, 50)
+        text.draw(surface)
+        text.draw(surface)
+        text.draw(surface)
+        self.assertEqual(objects.Text.cache_stats()['misses'], 1)
+        self.assertEqual(objects.Text.cache_stats()['hits'], 2)
+
+    def test_set_text_invalidates_cache(self):
+        objects.Text.clear_cache()
+        surface = objects.pygame.Surface((200, 100))
+        text = objects.Text("before", 50, 50)
+        text.draw(surface)
+        text.set_text("after")
+        text.draw(surface)
+        self.assertEqual(objects.Text.cache_stats()['misses'], 2)
+
+    def test_unchanged_alpha_keeps_cache(self):
+        objects.Text.clear_cache()
+        surface = objects.pygame.Surface((200, 100))
+        text = objects.Text("fade", 50, 50, alpha=255)
+        text.draw(surface)
+        text.set_alpha(300)
+        text.draw(surface)
+        self.assertEqual(objects.Text.cache_stats()['misses'], 1)
+
+
+class TestButton(unittest.TestCase):
+
+    def test_sprites_baked_once(self):
+        surface = objects.pygame.Surface((200, 100))
+        button = objects.Button(10, 10, 100, 40, "OK")
+        button.draw(surface)
+        sprites = button._sprites
+        button.check_hover((20, 20))
+        button.draw(surface)
+        self.assertIs(button._sprites, sprites)
+
+    def test_sprites_rebuilt_on_text_change(self):
+        surface = objects.pygame.Surface((200, 100))
+        button = objects.Button(10, 10, 100, 40, "OK")
+        button.draw(surface)
+        sprites = button._sprites
+        button.set_text("CANCEL")
+        button.draw(surface)
+        self.assertIsNot(button._sprites, sprites)
+
+    def test_hover_appearance(self):
+        surface = objects.pygame.Surface((200, 100))
+        button = objects.Button(10, 10, 100, 40, "", bg_hover_color=(255, 255, 255))
+        button.check_hover((20, 20))
+        button.draw(surface)
+        self.assertEqual(tuple(surface.get_at((60, 30)))[:3], (255, 255, 255))
+        button.set_enabled(False)
+        button.draw(surface)
+        self.assertEqual(tuple(surface.get_at((60, 30)))[:3], (0, 0, 0))
+
+
+class TestDirtyRects(unittest.TestCase):
+
+    def test_unchanged_frame_repaints_nothing(self):
+        surface = objects.pygame.Surface((300, 200))
+        widgets = [objects.Text("static", 100, 50), objects.Button(10, 100, 100, 40, "OK")]
+        for widget in widgets:
+            widget.draw(surface)
+        self.assertEqual(objects.redraw_dirty(surface, widgets), [])
+
+    def test_dirty_frame_matches_full_redraw(self):
+        surface = objects.pygame.Surface((300, 200))
+        text = objects.Text("before", 100, 50)
+        button = objects.Button(10, 100, 100, 40, "OK")
+        for widget in [text, button]:
+            widget.draw(surface)
+        text.set_text("after, and longer")
+        button.check_hover((20, 110))
+        rects = objects.redraw_dirty(surface, [text, button])
+        self.assertTrue(rects)
+
+        reference = objects.pygame.Surface((300, 200))
+        text.draw(reference)
+        button.draw(reference)
+        self.assertEqual(objects.pygame.image.tostring(surface, "RGB"), objects.pygame.image.tostring(reference, "RGB"))
+
+
+class TestLeaderboardTable(unittest.TestCase):
+
+    def _table(self, rows:int, cache_size:int=128):
+        table = objects.LeaderboardTable(0, 0, 400, 250, ["Rank", "User"], row_cache_size=cache_size)
+        table.set_data([{"Rank": i, "User": f"user{i}"} for i in range(rows)])
+        return table
+
+    def test_rows_rendered_once(self):
+        surface = objects.pygame.Surface((500, 300))
+        table = self._table(20)
+        table.draw(surface)
+        cached = dict(table._row_cache)
+        table.draw(surface)
+        self.assertEqual(cached, dict(table._row_cache))
+
+    def test_row_cache_is_bounded(self):
+        surface = objects.pygame.Surface((500, 300))
+        table = self._table(1000, cache_size=10)
+        for _ in range(50):
+            table.scroll(5)
+            table.draw(surface)
+        self.assertLessEqual(len(table._row_cache), 10)
+
+    def test_data_source_is_fetched_in_windows(self):
+        class Source:
+            fetched = 0
+            def count(self):
+                return 100000
+            def fetch(self, offset, limit):
+                Source.fetched += limit
+                return [{"Rank": i + 1, "User": f"user{i}"} for i in range(offset, offset + limit)]
+
+        surface = objects.pygame.Surface((500, 300))
+        table = objects.LeaderboardTable(0, 0, 400, 250, ["Rank", "User"], prefetch_rows=50)
+        table.set_data(Source())
+        table.draw(surface)
+        table.scroll(50000)
+        table.draw(surface)
+        self.assertEqual(table.get_row(table.scroll_offset)["Rank"], table.scroll_offset + 1)
+        self.assertLess(Source.fetched, 300)
+
+    def test_set_data_drops_rows(self):
+        surface = objects.pygame.Surface((500, 300))
+        table = self._table(20)
+        table.draw(surface)
+        version = table.data_version
+        table.set_data([{"Rank": 1, "User": "new"}])
+        self.assertEqual(table.data_version, version + 1)
+        self.assertEqual(len(table._row_cache), 0)
+
+
+class TestFontRegistry(unittest.TestCase):
+
+    def test_font_loaded_once(self):
+        registry = objects.FontRegistry()
+        first = registry.get(30)
+        second = registry.get(30)
+        self.assertIs(first, second)
+        self.assertEqual(registry.stats()['misses'], 1)
+        self.assertEqual(registry.stats()['hits'], 1)
+
+    def test_widgets_share_default_font(self):
+        self.assertIs(objects.Text("a", 0, 0).font, objects.Button(0, 0, 10, 10, "b").font)
+
+
+class TestSoundBank(unittest.TestCase):
+
+    def test_sound_decoded_once(self):
+        bank = objects.SoundBank()
+        bank.play("click-sfx")
+        sound = bank.sounds["click-sfx"]
+        bank.play("click-sfx")
+        self.assertIs(bank.sounds["click-sfx"], sound)
+
+    def test_preload_all(self):
+        bank = objects.SoundBank()
+        bank.preload()
+        self.assertIn("success-sfx", bank.sounds)
+        self.assertIn("failure-sfx", bank.sounds)
+
+    def test_missing_sound(self):
+        bank = objects.SoundBank()
+        with self.assertRaises(FileNotFoundError):
+            bank.play("null")
+
+    def test_volume_kept_in_memory(self):
+        bank = objects.SoundBank()
+        bank.set_volume(0.25)
+        channel = bank.play("click-sfx")
+        self.assertAlmostEqual(channel.get_volume(), 0.25, places=2)
+
+    def test_busy_channels_cut_the_oldest_sound(self):
+        class Channel:
+            def __init__(self, name, busy):
+                self.name, self.busy = name, busy
+            def get_busy(self):
+                return self.busy
+        bank = objects.SoundBank(channels=3)
+        bank._channels = [Channel("a", True), Channel("b", False), Channel("c", True)]
+        self.assertEqual(bank._get_channel().name, "b")
+        bank._channels[-1].busy = True
+        self.assertEqual([bank._get_channel().name for _ in range(4)], ["a", "c", "b", "a"])
+
+
+class TestSettingsStore(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"volume-sfx": 0.5}, f)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _read_file(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_reads_served_from_memory(self):
+        store = settings.SettingsStore(self.path)
+        self.assertEqual(store.get("volume-sfx"), 0.5)
+        with open(self.path, "w") as f:
+            json.dump({"volume-sfx": 0.9}, f)
+        self.assertEqual(store.get("volume-sfx"), 0.5)
+
+    def test_writes_are_deferred(self):
+        store = settings.SettingsStore(self.path, flush_delay=60)
+        store.set("volume-sfx", 0.1)
+        store.set("volume-sfx", 0.2)
+        self.assertEqual(store.get("volume-sfx"), 0.2)
+        self.assertEqual(self._read_file()["volume-sfx"], 0.5)
+        store.flush()
+        self.assertEqual(self._read_file()["volume-sfx"], 0.2)
+
+    def test_debounced_flush(self):
+        store = settings.SettingsStore(self.path, flush_delay=0.01)
+        store.set("volume-sfx", 0.3)
+        store._timer.join()
+        self.assertEqual(self._read_file()["volume-sfx"], 0.3)
+
+
+class TestSlider(unittest.TestCase):
+
+    def _event(self, event_type, **kwargs):
+        return objects.pygame.event.Event(event_type, **kwargs)
+
+    def test_drag_commits_once(self):
+        changes, commits = [], []
+        slider = objects.Slider(0, 0, 100, 10, initial_val=0, on_change=changes.append, on_commit=commits.append)
+        handle = slider.get_handle_rect().center
+        slider.handle_event(self._event(objects.pygame.MOUSEBUTTONDOWN, button=1, pos=handle), handle)
+        for x in range(10, 60, 10):
+            slider.handle_event(self._event(objects.pygame.MOUSEMOTION, pos=(x, 5)), (x, 5))
+        slider.handle_event(self._event(objects.pygame.MOUSEBUTTONUP, button=1, pos=(50, 5)), (50, 5))
+        self.assertEqual(len(changes), 5)
+        self.assertEqual(commits, [50])
+
+    def test_commit_after_quiet_period(self):
+        commits = []
+        slider = objects.Slider(0, 0, 100, 10, initial_val=0, on_commit=commits.append, commit_delay_ms=0)
+        handle = slider.get_handle_rect().center
+        slider.handle_event(self._event(objects.pygame.MOUSEBUTTONDOWN, button=1, pos=handle), handle)
+        slider.handle_event(self._event(objects.pygame.MOUSEMOTION, pos=(30, 5)), (30, 5))
+        slider.update()
+        self.assertEqual(commits, [30])
+        slider.handle_event(self._event(objects.pygame.MOUSEBUTTONUP, button=1, pos=(30, 5)), (30, 5))
+        self.assertEqual(commits, [30])
+
+    def test_commit_delay_on_virtual_clock(self):
+        commits = []
+        clock = objects.VirtualClock()
+        slider = objects.Slider(0, 0, 100, 10, initial_val=0, on_commit=commits.append, commit_delay_ms=500, clock=clock)
+        handle = slider.get_handle_rect().center
+        slider.handle_event(self._event(objects.pygame.MOUSEBUTTONDOWN, button=1, pos=handle), handle)
+        slider.handle_event(self._event(objects.pygame.MOUSEMOTION, pos=(30, 5)), (30, 5))
+        clock.advance(499)
+        slider.update()
+        self.assertEqual(commits, [])
+        self.assertEqual(slider.next_due_ms(), 1)
+        clock.advance(1)
+        slider.update()
+        self.assertEqual(commits, [30])
+
+
+class TestInputField(unittest.TestCase):
+
+    def test_cursor_blinks_on_virtual_clock(self):
+        clock = objects.VirtualClock()
+        field = objects.InputField(0, 0, 100, clock=clock)
+        field.set_active(True)
+        self.assertEqual(field.next_due_ms(), 501)
+        clock.advance(500)
+        field.update()
+        self.assertTrue(field.cursor_visible)
+        clock.advance(1)
+        field.update()
+        self.assertFalse(field.cursor_visible)
+        self.assertEqual(field.next_due_ms(), 501)
+
+
+class TestVirtualClock(unittest.TestCase):
+
+    def test_timer_on_virtual_clock(self):
+        clock = objects.VirtualClock()
+        timer = objects.Timer(1000, clock=clock)
+        timer.start()
+        clock.advance(999)
+        self.assertFalse(timer.update())
+        clock.advance(1)
+        self.assertTrue(timer.update())
+
+    def test_negative_advance(self):
+        with self.assertRaises(ValueError):
+            objects.VirtualClock().advance(-1)
+
+    def test_manager_advance_fires_in_order(self):
+        clock = objects.VirtualClock()
+        tm = objects.TimerManager(clock)
+        fired = []
+        tm.delay(3000, lambda: fired.append(("late", clock.get_ticks())))
+        tm.delay(1000, lambda: fired.append(("early", clock.get_ticks())))
+        tm.delay(10**6, lambda: fired.append(("never", clock.get_ticks())))
+        tm.advance(5000)
+        self.assertEqual(fired, [("early", 1000), ("late", 3000)])
+        self.assertEqual(clock.get_ticks(), 5000)
+
+    def test_repeating_timer_fast_forward(self):
+        clock = objects.VirtualClock()
+        tm = objects.TimerManager(clock)
+        ticks = []
+        tm.add_timer("tick", 1000, lambda: ticks.append(clock.get_ticks()), repeat=True).start()
+        tm.advance(60 * 60 * 1000)
+        self.assertEqual(len(ticks), 3600)
+
+    def test_play_screen_runs_out_of_time(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        saved = []
+        submissions = submission.SubmissionQueue(os.path.join(directory.name, "journal.jsonl"), write_batch=lambda games: saved.extend(games) or {})
+        self.addCleanup(submissions.close)
+        ranked = []
+
+        class Leaderboard:
+            def rank_of_async(self, level, score, on_rank):
+                ranked.append((level, score))
+                on_rank(1, 1)
+
+        states = []
+        play_obj = game.PlayScreen(states.append, clock=objects.VirtualClock(), submissions=submissions, leaderboard=Leaderboard())
+        play_obj.fast_forward(200 * 1000)
+        self.assertEqual(play_obj.time_remaining, 0)
+        self.assertEqual(states, [])
+        play_obj.fast_forward(20 * 1000)
+        self.assertEqual(states, [game.GameState.MAIN_MENU])
+        self.assertEqual(ranked, [(1, 0)])
+        submissions.close()
+        submissions.sync() # in case the writer was closed before it synced
+        self.assertEqual([(game.level, game.score) for game in saved], [(1, 0)])
+
+
+
+
+class TestGameEngine(unittest.TestCase):
+
+    def test_numbers_differ(self):
+        engine = rules.GameEngine(seed=1)
+        for _ in range(100):
+            clue = engine.generate_numbers()
+            self.assertNotEqual(clue, engine.state.actual)
+            self.assertTrue(rules.MIN_NUMBER <= clue <= rules.MAX_NUMBER)
+
+    def test_same_seed_same_game(self):
+        def play(seed):
+            engine = rules.GameEngine(seed)
+            outcomes = []
+            while not engine.is_over:
+                engine.generate_numbers()
+                outcomes.append(engine.guess(engine.state.clue <= 10))
+            return outcomes, engine.state
+        self.assertEqual(play(42), play(42))
+
+    def test_win_adds_points(self):
+        engine = rules.GameEngine()
+        engine.state.permanent_storage = 5
+        engine.state.strikes = 2
+        self.assertEqual(engine.win(), rules.Outcome.WIN)
+        self.assertEqual((engine.state.temporary_storage, engine.state.score, engine.state.strikes), (2, 2, 1))
+
+    def test_strike_limit_ends_game(self):
+        engine = rules.GameEngine()
+        engine.state.temporary_storage = 3
+        for _ in range(rules.STRIKE_LIMIT):
+            self.assertEqual(engine.lose(), rules.Outcome.LOSS)
+        self.assertEqual(engine.state.temporary_storage, 0)
+        self.assertEqual(engine.state.game_over_reason, rules.TOO_MANY_STRIKES)
+
+    def test_guess_without_numbers(self):
+        self.assertIsNone(rules.GameEngine().guess_greater())
+
+    def test_pay_and_advance_level(self):
+        engine = rules.GameEngine(seed=3)
+        engine.state.temporary_storage = 12
+        engine.transfer_all()
+        engine.pay_all()
+        self.assertEqual((engine.state.current_debt, engine.state.permanent_storage), (0, 2))
+        self.assertFalse(engine.pay_step())
+        skill = engine.advance_level()
+        self.assertEqual(skill['level'], 1)
+        self.assertEqual((engine.state.current_debt, engine.state.level, engine.state.time_remaining), (15, 2, 300))
+
+    def test_play_screen_uses_engine_state(self):
+        play_obj = game.PlayScreen(lambda state: None, seed=7)
+        play_obj._generate_numbers()
+        self.assertEqual(play_obj.clue, play_obj.engine.state.clue)
+        play_obj.permanent_storage = 10
+        self.assertEqual(play_obj.engine.multiplier(), 3)
+
+
+
+
+class TestSimulation(unittest.TestCase):
+
+    def test_seed_reproduces(self):
+        first = simulation.simulate(2000, seed=5, chunk_size=700, max_rounds=200)
+        second = simulation.simulate(2000, seed=5, chunk_size=700, max_rounds=200)
+        self.assertEqual(len(first), 2000)
+        for name in ("level", "score", "rounds", "seconds", "ended_by"):
+            self.assertTrue((getattr(first, name) == getattr(second, name)).all())
+
+    def test_out_of_time_after_first_round(self):
+        result = simulation.simulate(1000, simulation.Strategy(round_seconds=rules.INITIAL_TIME), seed=1)
+        self.assertTrue((result.rounds == 1).all())
+        self.assertTrue((result.level == 1).all())
+        self.assertTrue((result.ended_by == simulation.TIMED_OUT).all())
+
+    def test_never_paying_stays_on_first_level(self):
+        result = simulation.simulate(1000, simulation.Strategy(bank_at=10**9), seed=1)
+        self.assertTrue((result.level == 1).all())
+        self.assertTrue((result.ended_by != simulation.ROUND_LIMIT).all())
+        self.assertEqual(result.level_distribution()[1], 1.0)
+
+
+
+
+class TestStrategy(unittest.TestCase):
+
+    def test_best_guess(self):
+        self.assertEqual(strategy.best_guess(1), (True, 1.0))
+        self.assertEqual(strategy.best_guess(20), (False, 1.0))
+        self.assertTrue(strategy.best_guess(10)[0])
+        self.assertFalse(strategy.best_guess(11)[0])
+        self.assertAlmostEqual(strategy.win_chance(), 145/190)
+
+    def test_no_time_for_a_round(self):
+        tables = strategy.StrategyTables.compute(bank_seconds=0, horizon=50, max_streak=8, bank_overhead=0)
+        comparison = tables.compare(strategy.ROUND_SECONDS - 1, 3, 0)
+        self.assertEqual(comparison["bank"]["value"], 3)
+        self.assertEqual(comparison["continue"]["value"], 0)
+
+    def test_last_strike_risk(self):
+        tables = strategy.StrategyTables.compute(horizon=100, max_streak=8)
+        comparison = tables.compare(100, 2, rules.STRIKE_LIMIT - 1)
+        self.assertGreaterEqual(comparison["continue"]["bust"], 1 - strategy.win_chance())
+        self.assertTrue(tables.should_bank(100, 2, rules.STRIKE_LIMIT - 1))
+
+    def test_tables_cached_on_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = strategy.TableStore(directory, horizon=60, max_streak=8)
+            computed = store.get(1, 2)
+            self.assertIs(store.get(1, 2), computed)
+            self.assertEqual(len(os.listdir(directory)), 1)
+            loaded = strategy.TableStore(directory, horizon=60, max_streak=8).get(1, 2)
+            self.assertTrue((loaded.bank_value == computed.bank_value).all())
+
+    def test_hint(self):
+        state = rules.EngineState(clue=15, actual=3, temporary_storage=2)
+        with tempfile.TemporaryDirectory() as directory:
+            hint = strategy.hint(state, strategy.TableStore(directory, horizon=60, max_streak=8))
+        self.assertFalse(hint.guess_greater)
+        self.assertAlmostEqual(hint.win_chance, 14/19)
+        self.assertGreater(hint.bank_value, 0)
+
+
+
+class TestVerification(unittest.TestCase):
+
+    def _play(self, seed:int=5) -> tuple[replay.Replay, rules.EngineState]:
+        """Play a game guessing by the clue at the game's pace: a guess half a second after the roll,
+        the next roll once the result was shown for 2s, a clock tick every second"""
+        clock = objects.VirtualClock()
+        engine = rules.GameEngine(seed)
+        recorder = replay.ReplayRecorder(engine, clock.get_ticks)
+        next_tick = 1000
+        while not engine.is_over:
+            for action, delay in ((replay.Action.ROLL, 0), (None, 500), (None, 2000)):
+                due = clock.get_ticks() + delay
+                while next_tick <= due and not engine.is_over:
+                    clock.advance(next_tick - clock.get_ticks())
+                    recorder.perform(replay.Action.TICK)
+                    next_tick += 1000
+                if engine.is_over:
+                    break
+                clock.advance(due - clock.get_ticks())
+                if action is not None:
+                    recorder.perform(action)
+                elif engine.state.actual is not None:
+                    recorder.perform(replay.Action.GUESS_GREATER if engine.state.clue <= 10 else replay.Action.GUESS_LOWER)
+        return recorder.replay, engine.state
+
+    def test_pack_round_trip(self):
+        recorded, _ = self._play()
+        self.assertEqual(replay.Replay.unpack(recorded.pack()), recorded)
+        self.assertLess(len(recorded.pack()), 3 * len(recorded) + 20)
+        with self.assertRaises(replay.ReplayError):
+            replay.Replay.unpack(recorded.pack()[:-1])
+        long_pauses = replay.Replay(2**63 - 1, [(replay.Action.TICK, 0), (replay.Action.ROLL, 2**40), (replay.Action.PAY_ALL, 127)])
+        self.assertEqual(replay.Replay.unpack(long_pauses.pack()), long_pauses)
+
+    def test_honest_game_is_valid(self):
+        recorded, state = self._play()
+        self.assertIsNone(verification.verify(recorded.pack(), state.score, state.level))
+
+    def test_tampered_games_are_invalid(self):
+        recorded, state = self._play()
+        self.assertIsNotNone(verification.verify(recorded.pack(), state.score + 1, state.level))
+        self.assertIsNotNone(verification.verify(b"not a replay", state.score, state.level))
+        # Transferring everything at once needs a skill
+        cheated = replay.Replay(recorded.seed, [(replay.Action.TRANSFER_ALL, 0)] + recorded.actions)
+        self.assertIsNotNone(verification.verify(cheated.pack(), state.score, state.level))
+        # The clock has to keep ticking
+        stalled = replay.Replay(recorded.seed, [action for action in recorded.actions if action[0] != replay.Action.TICK])
+        stalled.actions[-1] = (stalled.actions[-1][0], 60000)
+        self.assertIsNotNone(verification.verify(stalled.pack(), state.score, state.level))
+
+    def test_games_faster_than_the_game_allows_are_invalid(self):
+        recorded, state = self._play()
+        # Every action at once, with and without the clock ticks
+        instant = replay.Replay(recorded.seed, [(action, 0) for action, _ in recorded.actions])
+        self.assertIn("ms apart", verification.verify(instant.pack(), state.score, state.level))
+        untimed = replay.Replay(recorded.seed, [(action, 0) for action, _ in recorded.actions if action != replay.Action.TICK])
+        self.assertIn("after a guess", verification.verify(untimed.pack(), state.score, state.level))
+        # Each pause only a little shorter, adding up to more clock ticks than seconds played
+        hurried = replay.Replay(recorded.seed, [(action, delay * 98 // 100) for action, delay in recorded.actions])
+        self.assertIn("clock ticks in", verification.verify(hurried.pack(), state.score, state.level))
+        # The steps of a transfer are a second apart
+        rushed = replay.Replay(recorded.seed, [(replay.Action.ROLL, 0), (replay.Action.GUESS_GREATER, 0), (replay.Action.GUESS_LOWER, 0),
+                                               (replay.Action.TRANSFER_STEP, 10), (replay.Action.TRANSFER_STEP, 10)])
+        self.assertIn("transfer steps", verification.verify(rushed.pack(), 0, 1))
+
+    def test_verify_many(self):
+        recorded, state = self._play()
+        items = [(recorded.pack(), state.score + i % 2, state.level) for i in range(4)]
+        verdicts = verification.Verifier(workers=1).verify_many(items)
+        self.assertEqual([verdict is None for verdict in verdicts], [True, False, True, False])
+
+
+class TestReplayArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_append_get_and_iterate(self):
+        archive = replay.ReplayArchive(self.directory.name, segment_size=64)
+        self.addCleanup(archive.close)
+        blobs = {session_id: bytes([session_id]) * 40 for session_id in (3, 1, 2)}
+        for session_id, data in blobs.items():
+            archive.append(session_id, data)
+        self.assertEqual(archive.get(1), blobs[1])
+        self.assertIsNone(archive.get(4))
+        # Every replay overflows the 64 byte segments
+        self.assertEqual(len([name for name in os.listdir(self.directory.name) if name.startswith("segment-")]), 3)
+        self.assertEqual([(session_id, bytes(data)) for session_id, data in archive], list(blobs.items()))
+
+    def test_other_process_appends(self):
+        writer = replay.ReplayArchive(self.directory.name)
+        reader = replay.ReplayArchive(self.directory.name)
+        self.addCleanup(writer.close)
+        self.addCleanup(reader.close)
+        writer.append(1, b"first")
+        self.assertEqual(len(reader), 0)
+        reader.refresh()
+        writer.append(2, b"second")
+        # Half a record is left for the next refresh
+        with open(os.path.join(self.directory.name, "index.bin"), "ab") as index:
+            index.write(b"\x00" * 5)
+        reader.refresh()
+        self.assertEqual(reader.ids(), [1, 2])
+        self.assertEqual(reader.get(2), b"second")
+
+    def test_processes_append_concurrently(self):
+        def append(first_id):
+            archive = replay.ReplayArchive(self.directory.name, segment_size=4096)
+            for session_id in range(first_id, first_id + 200):
+                archive.append(session_id, str(session_id).encode() * 20)
+            archive.close()
+        processes = [multiprocessing.get_context("fork").Process(target=append, args=(first_id,)) for first_id in (1000, 2000, 3000)]
+        for process in processes:
+            process.start()
+        append(4000)
+        for process in processes:
+            process.join()
+        archive = replay.ReplayArchive(self.directory.name)
+        self.addCleanup(archive.close)
+        self.assertEqual(len(archive), 800)
+        for session_id, data in archive:
+            self.assertEqual(bytes(data), str(session_id).encode() * 20)
+
+    def test_verify_archived_replay(self):
+        archive = replay.ReplayArchive(self.directory.name)
+        self.addCleanup(archive.close)
+        recorded, state = TestVerification()._play()
+        archive.append(7, recorded.pack())
+        self.assertIsNone(verification.verify(archive.get(7), state.score, state.level))
+
+    def test_sessions_without_a_replay_are_invalidated(self):
+        archive = replay.ReplayArchive(self.directory.name)
+        self.addCleanup(archive.close)
+        engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as session:
+            session.add_all(db_handling.GameSessionModel(user_id=1, client_id=str(i)) for i in range(3))
+            # Written by a script, not submitted by the client
+            session.add(db_handling.GameSessionModel(user_id=1))
+            session.commit()
+        archive.append(1, b"replay")
+        verifier = verification.Verifier(workers=1, archive=archive, session_factory=Session)
+        # The replays of sessions 2 and 3 may still be on their way
+        self.assertEqual(verifier.invalidate_missing(), (0, 2))
+        self.assertEqual(verifier.invalidate_missing(grace=0), (2, 0))
+        with Session() as session:
+            rows = session.query(db_handling.GameSessionModel.id, db_handling.GameSessionModel.verified, db_handling.GameSessionModel.invalid).order_by(db_handling.GameSessionModel.id).all()
+        self.assertEqual([tuple(row) for row in rows], [(1, 0, 0), (2, 1, 1), (3, 1, 1), (4, 0, 0)])
+
+    def test_sessions_from_before_replays_count_as_verified(self):
+        engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_game_sessions_awaiting_replay"))
+            connection.execute(text("ALTER TABLE game_sessions DROP COLUMN verified"))
+            connection.execute(text("INSERT INTO game_sessions (user_id, score, level_reached) VALUES (1, 10, 2), (1, 20, 3)"))
+        db_handling.add_missing_columns(engine)
+        db_handling.create_missing_indexes(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as session:
+            session.add(db_handling.GameSessionModel(user_id=1, client_id="new"))
+            session.commit()
+            self.assertEqual([verified for verified, in session.query(db_handling.GameSessionModel.verified).order_by(db_handling.GameSessionModel.id)], [1, 1, 0])
+
+
+class TestSubmissionQueue(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.journal = os.path.join(directory.name, "journal.jsonl")
+
+    def _queue(self, write_batch) -> submission.SubmissionQueue:
+        queue = submission.SubmissionQueue(self.journal, write_batch=write_batch, retry_delay=0.01)
+        self.addCleanup(queue.close)
+        return queue
+
+    def _game(self, username:str="player") -> submission.Submission:
+        return submission.Submission(username, datetime.datetime(2024, 1, 1), 10, 2, b"replay")
+
+    def _submit(self, queue:submission.SubmissionQueue) -> list:
+        """Submit a game and wait for its outcome"""
+        statuses = []
+        done = threading.Event()
+        def on_status(status):
+            statuses.append(status)
+            if status is not submission.SubmissionStatus.PENDING:
+                done.set()
+        queue.submit(self._game(), on_status)
+        self.assertTrue(done.wait(5))
+        return statuses
+
+    def test_saved(self):
+        saved = []
+        def write_batch(games):
+            saved.extend(games)
+            return {game.client_id: submission.SubmissionStatus.SAVED for game in games}
+        statuses = self._submit(self._queue(write_batch))
+        self.assertEqual(statuses, [submission.SubmissionStatus.PENDING, submission.SubmissionStatus.SAVED])
+        self.assertEqual((saved[0].score, saved[0].replay), (10, b"replay"))
+        # Everything is synced, the journal is emptied
+        self.assertEqual(os.path.getsize(self.journal), 0)
+
+    def test_failed_sync_is_retried(self):
+        attempts = []
+        def locked_once(games):
+            attempts.append(games)
+            if len(attempts) == 1:
+                raise OSError("database is locked")
+            return {game.client_id: submission.SubmissionStatus.SAVED for game in games}
+        statuses = self._submit(self._queue(locked_once))
+        self.assertEqual(statuses[-1], submission.SubmissionStatus.SAVED)
+        self.assertEqual(len(attempts), 2)
+
+    def test_journal_is_synced_after_restart(self):
+        def offline(games):
+            raise OSError("unable to open database file")
+        queue = self._queue(offline)
+        queue.submit(self._game())
+        queue.submit(self._game())
+        queue.close()
+        self.assertTrue(queue.journal.unsynced)
+
+        synced = []
+        queue = self._queue(lambda games: synced.extend(games) or {})
+        self.assertEqual(queue.sync(), 2)
+        self.assertEqual(len({game.client_id for game in synced}), 2)
+        self.assertFalse(queue.journal.unsynced)
+
+    def test_interrupted_emptying_leaves_no_stale_mark(self):
+        journal = submission.SessionJournal(self.journal)
+        self.addCleanup(journal.close)
+        journal.append([self._game(), self._game()])
+        games, end = journal.read(journal.synced, 10)
+
+        class CrashingFile:
+            def truncate(self, size):
+                raise OSError("crashed before emptying the journal")
+            def close(self):
+                pass
+        real_file, journal._file = journal._file, CrashingFile()
+        with self.assertRaises(OSError):
+            journal.mark_synced(end)
+        journal._file = real_file
+        # The synced games come again, later games are not skipped
+        journal.append([self._game(), self._game(), self._game()])
+        self.assertEqual(journal.synced, 0)
+        self.assertEqual(len(journal.read(journal.synced, 10)[0]), 5)
+
+    def test_save_batch_is_idempotent(self):
+        engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as session:
+            session.add(db_handling.UserModel(username="player", email="", password_hash=""))
+            session.commit()
+        archive = replay.ReplayArchive(os.path.join(self.directory, "replays"))
+        self.addCleanup(archive.close)
+        games = [self._game() for _ in range(600)] + [self._game("nobody")]
+
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        statuses = submission.save_batch(games, Session, archive)
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(list(statuses.values()).count(submission.SubmissionStatus.REJECTED), 1)
+        self.assertEqual(len(archive), 600)
+        # Syncing the same games again after a crash saves nothing twice
+        statuses = submission.save_batch(games, Session, archive)
+        self.assertEqual(list(statuses.values()).count(submission.SubmissionStatus.SAVED), 600)
+        with Session() as session:
+            self.assertEqual(session.query(db_handling.GameSessionModel).count(), 600)
+
+    def test_replays_are_archived_when_the_batch_syncs_again(self):
+        engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as session:
+            session.add(db_handling.UserModel(username="player", email="", password_hash=""))
+            session.commit()
+        archive = replay.ReplayArchive(os.path.join(self.directory, "replays"))
+        self.addCleanup(archive.close)
+        games = [self._game() for _ in range(3)]
+
+        def disk_full(session_id, data):
+            raise OSError("No space left on device")
+        archive.append = disk_full
+        # The games are saved but the batch is not synced
+        with self.assertRaises(OSError):
+            submission.save_batch(games, Session, archive)
+        del archive.append
+        self.assertEqual(len(archive), 0)
+        statuses = submission.save_batch(games, Session, archive)
+        self.assertEqual(set(statuses.values()), {submission.SubmissionStatus.SAVED})
+        with Session() as session:
+            ids = [session_id for session_id, in session.query(db_handling.GameSessionModel.id)]
+        self.assertEqual(sorted(archive.ids()), sorted(ids))
+        # Archived replays are not appended twice
+        submission.save_batch(games, Session, archive)
+        self.assertEqual(len(archive), 3)
+
+
+class TestRankingIndexes(unittest.TestCase):
+
+    def _plan(self, query) -> str:
+        sql = str(query.statement.compile(compile_kwargs={"literal_binds": True}))
+        return " ".join(row[3] for row in query.session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+
+    def test_ranking_reads_indexes_in_order(self):
+        engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(engine)
+        GameSession = db_handling.GameSessionModel
+        with sessionmaker(bind=engine)() as session:
+            leaderboard = self._plan(session.query(GameSession).filter_by(invalid=0).order_by(*db_handling.RANKING).limit(10))
+            self.assertIn("ix_game_sessions_ranking", leaderboard)
+            self.assertNotIn("TEMP B-TREE", leaderboard)
+            profile = self._plan(session.query(GameSession).filter_by(user_id=1).order_by(*db_handling.RANKING))
+            self.assertIn("ix_game_sessions_user_ranking", profile)
+            self.assertNotIn("TEMP B-TREE", profile)
+            # Both halves of a keyset page seek
+            query = db_handling.ranked_sessions(session, include_invalid=True)
+            ties = self._plan(query.filter(GameSession.level_reached == 3, GameSession.score == 10, GameSession.id > 5).limit(50))
+            worse = self._plan(query.filter(tuple_(GameSession.level_reached, GameSession.score) < (3, 10)).limit(50))
+            self.assertIn("ix_game_sessions_ranking_all (level_reached=? AND score=? AND rowid>?)", ties)
+            self.assertIn("ix_game_sessions_ranking_all ((level_reached,score)<(?,?))", worse)
+            self.assertNotIn("TEMP B-TREE", ties + worse)
+
+    def test_indexes_are_added_to_existing_databases(self):
+        engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_game_sessions_ranking"))
+        db_handling.create_missing_indexes(engine)
+        db_handling.create_missing_indexes(engine)
+        self.assertIn("ix_game_sessions_ranking", [index["name"] for index in inspect(engine).get_indexes("game_sessions")])
+
+
+class TestLeaderboardQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.Session() as session:
+            users = [db_handling.UserModel(username=f"player{i}", email=f"player{i}@example.com", password_hash="") for i in range(20)]
+            session.add_all(users)
+            session.flush()
+            session.add_all(db_handling.GameSessionModel(user_id=users[i % 20].id, score=i, level_reached=i % 7, invalid=int(i % 10 == 0)) for i in range(200))
+            session.commit()
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", lambda *args: self.statements.append(args[2]))
+
+    def test_ranked_sessions_load_users_in_one_query(self):
+        with self.Session() as session:
+            games = db_handling.ranked_sessions(session).all()
+            names = [game.user.username for game in games]
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual(len(names), 180)
+        self.assertEqual([(game.level_reached, game.score) for game in games[:2]], [(6, 195), (6, 188)])
+
+    def test_keyset_pages_match_the_ranking(self):
+        with self.Session() as session:
+            # Plenty of ties across page boundaries
+            session.query(db_handling.GameSessionModel).update({"score": db_handling.GameSessionModel.id % 3})
+            session.commit()
+            for include_invalid in (False, True):
+                query = db_handling.ranked_sessions(session, include_invalid=include_invalid)
+                pages, after = [], None
+                while True:
+                    page = db_handling.ranked_page(query, after, 7)
+                    if not page:
+                        break
+                    pages += page
+                    after = (page[-1].level_reached, page[-1].score, page[-1].id)
+                self.assertEqual([game.id for game in pages], [game.id for game in query.all()])
+            users = db_handling.users_page(session, None, 8) + db_handling.users_page(session, 8, 100)
+            self.assertEqual([user.id for user in users], list(range(1, 21)))
+
+    def test_leaderboard_rows(self):
+        with self.Session() as session:
+            rows = db_handling.leaderboard_rows(session, offset=10, limit=50)
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual(len(rows), 50)
+        self.assertTrue(all(row.username.startswith("player") for row in rows))
+
+
+class TestRanking(unittest.TestCase):
+
+    def test_rank_index_matches_a_sorted_list(self):
+        rng = random.Random(7)
+        original = ranking.BUCKET_LOAD
+        ranking.BUCKET_LOAD = 4 # many bucket splits and empty buckets
+        try:
+            index = ranking.RankIndex(rng.sample(range(1000), 30))
+            expected = sorted(index)
+            for _ in range(2000):
+                if expected and rng.random() < 0.45:
+                    key = rng.choice(expected)
+                    index.remove(key)
+                    expected.remove(key)
+                else:
+                    key = rng.randrange(1000) + rng.random()
+                    index.add(key)
+                    bisect.insort(expected, key)
+                probe = rng.randrange(1000)
+                self.assertEqual(index.rank(probe), bisect.bisect_left(expected, probe))
+            self.assertEqual(list(index), expected)
+            self.assertEqual(len(index), len(expected))
+            self.assertEqual(index.slice(5, 17), expected[5:17])
+            with self.assertRaises(KeyError):
+                index.remove(-1)
+        finally:
+            ranking.BUCKET_LOAD = original
+
+    def test_leaderboard_follows_the_changes(self):
+        engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        GameSession = db_handling.GameSessionModel
+        with Session() as session:
+            session.add_all(GameSession(user_id=1, score=score, level_reached=level) for level, score in [(1, 10), (3, 5), (3, 50), (2, 0)])
+            session.commit()
+        leaderboard = ranking.Leaderboard(Session)
+        self.assertEqual(leaderboard.ids(0, 10), [3, 2, 4, 1])
+        self.assertEqual(leaderboard.rank(4), 3)
+        self.assertEqual(leaderboard.rank_of(3, 5), 3) # after the earlier game with the same result
+
+        with Session() as session:
+            session.add(GameSession(user_id=1, score=99, level_reached=9))
+            session.query(GameSession).filter_by(id=3).update({"invalid": 1})
+            session.query(GameSession).filter_by(id=1).update({"score": 1000})
+            session.query(GameSession).filter_by(id=4).delete()
+            session.commit()
+        self.assertEqual(leaderboard.ids(0, 10), [5, 2, 1])
+        self.assertIsNone(leaderboard.rank(3))
+        self.assertEqual(len(leaderboard), 3)
+        # A new follower ends up with the same ranking
+        self.assertEqual(ranking.Leaderboard(Session).ids(0, 10), [5, 2, 1])
+
+    def test_leaderboard_reloads_after_missing_compacted_changes(self):
+        engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        GameSession = db_handling.GameSessionModel
+        leaderboard = ranking.Leaderboard(Session)
+        self.assertEqual(len(leaderboard.ids(0, 10)), 0)
+
+        games = db_handling.LEADERBOARD_CHANGES_KEPT + 5
+        with engine.begin() as connection:
+            connection.execute(GameSession.__table__.insert(), [{"user_id": 1, "score": i, "level_reached": 1} for i in range(games)])
+        with Session() as session:
+            self.assertEqual(session.query(db_handling.LeaderboardChangeModel).count(), db_handling.LEADERBOARD_CHANGES_KEPT)
+            session.query(GameSession).filter_by(id=1).update({"score": 10 ** 6})
+            session.commit()
+        self.assertEqual(len(leaderboard), 0) # not refreshed yet
+        self.assertEqual(leaderboard.ids(0, 2), [1, games])
+        self.assertEqual(len(leaderboard), games)
+        # Following the change log again afterwards
+        with Session() as session:
+            session.query(GameSession).filter_by(id=1).update({"invalid": 1})
+            session.commit()
+        self.assertEqual(leaderboard.ids(0, 1), [games])
+
+    def test_leaderboard_source_windows(self):
+        engine = create_engine("sqlite://")
+        db_handling.Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as session:
+            session.add(db_handling.UserModel(username="player", email="player@example.com", password_hash=""))
+            session.add_all(db_handling.GameSessionModel(user_id=1, score=score, level_reached=1) for score in range(10))
+            session.commit()
+            rows = db_handling.leaderboard_rows(session, ids=[3, 5, 7], limit=2)
+        self.assertEqual([row.id for row in rows], [7, 5])
+
+        class StaleLeaderboard:
+            """Still ranks session 99, deleted since its last refresh"""
+            def ids(self, start, stop):
+                return [10, 99, 9, 8][start:stop]
+
+        original_session, original_leaderboard = db_handling.Session, ranking.leaderboard
+        db_handling.Session, ranking.leaderboard = Session, StaleLeaderboard()
+        try:
+            window = game.LeaderboardSource().fetch(0, 4)
+        finally:
+            db_handling.Session, ranking.leaderboard = original_session, original_leaderboard
+        self.assertEqual([(row["Rank"], row["Score"]) for row in window], [(1, 9), (2, 8), (3, 7)])
+        self.assertTrue(all(row["User"] == "player" for row in window))
+
+        table = objects.LeaderboardTable(x=0, y=0, width=400, height=300, columns=["Rank", "User", "Level", "Score", "Date"])
+        table.set_data(objects.ListDataSource(window))
+        table._row_count = 4 # counted before the session was deleted
+        self.assertEqual(table.get_row(3), {})
+
+
+class TestSqliteProfile(unittest.TestCase):
+
+    def test_profile_is_applied_to_new_connections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f"sqlite:///{os.path.join(directory, 'profile.db')}")
+            db_handling.configure_sqlite(engine)
+            with engine.connect() as connection:
+                pragma = lambda name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                self.assertEqual(pragma("journal_mode"), "wal")
+                self.assertEqual(pragma("synchronous"), 1) # NORMAL
+                self.assertEqual(pragma("busy_timeout"), 5000)
+                self.assertEqual(pragma("cache_size"), -32768)
+                self.assertEqual(pragma("temp_store"), 2) # MEMORY
+            engine.dispose()
+
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,320 @@
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+import typing
+
+from sqlalchemy import literal_column
+
+import db_handling
+import replay
+import rules
+from replay import Action
+
+import logger
+log = logger.get_logger("verification")
+
+TICK_MS = 1000 # PlayScreen._timer ticks every second
+LEVEL_UP_PAUSE_MS = 9500 # the game clock stops for the level up announcement (PlayScreen._advance_level)
+TICK_TOLERANCE = 3 # missing ticks forgiven (timer jitter, the second the game started/ended in)
+RESULT_FLASH_MS = 2000 # the result of a guess is shown this long before the next roll (PlayScreen win_flash/lose_flash)
+STEP_MS = 1000 # between two steps of a transfer or a payment (PlayScreen transfer_timer/pay_timer)
+PACING_TOLERANCE_MS = 50 # the game's timers only fire late, this covers rounding of the recorded times
+INLINE_BATCH = 64 # smaller batches are verified without the worker pool
+BATCH_SIZE = 500 # replays verified at once, their session ids go into one SQL IN (...)
+MISSING_REPLAY_GRACE = 60 # seconds an unverified session may wait for its replay, submission.save_batch archives it right after the insert
+
+# Plain ints, comparing the unpacked actions to IntEnum members is several times slower
+_TICK, _LEVEL_UP, _TRANSFER_ALL, _PAY_ALL = int(Action.TICK), int(Action.LEVEL_UP), int(Action.TRANSFER_ALL), int(Action.PAY_ALL)
+_ROLL, _GUESS_GREATER, _GUESS_LOWER = int(Action.ROLL), int(Action.GUESS_GREATER), int(Action.GUESS_LOWER)
+_TRANSFER_STEP, _PAY_STEP = int(Action.TRANSFER_STEP), int(Action.PAY_STEP)
+_NEVER = -(1 << 62)
+
+
+
+def verify(data:typing.Union[bytes, memoryview], score:int, level:int) -> typing.Optional[str]:
+    """Re-simulate a replay and check it against the submitted result
+
+    Args:
+        data (typing.Union[bytes, memoryview]): replay.Replay.pack() of the game
+        score (int): submitted score
+        level (int): submitted level
+
+    Returns:
+        typing.Optional[str]: why the session is invalid, None if it is valid
+    """
+    try:
+        recorded = replay.Replay.unpack(data)
+    except replay.ReplayError as e:
+        return str(e)
+
+    engine = rules.GameEngine(recorded.seed)
+    state = engine.state
+    effectors = state.effectors
+    perform = replay.PERFORM
+    elapsed = ticks = levels = 0
+    # The game paces the player with its timers, the replay has to keep the same pace
+    last_tick = last_guess = last_transfer = last_pay = _NEVER
+    paused_at = None # the first level up since the last clock tick, the clock stands still during its announcement
+
+    for action, delay in recorded.actions:
+        if state.game_over_reason is not None:
+            return "actions after the game ended"
+        elapsed += delay
+        if action == _TICK:
+            if elapsed - last_tick < TICK_MS - PACING_TOLERANCE_MS:
+                return f"clock ticks {elapsed - last_tick}ms apart"
+            if paused_at is not None:
+                if elapsed - paused_at < LEVEL_UP_PAUSE_MS - PACING_TOLERANCE_MS:
+                    return f"clock ticked {elapsed - paused_at}ms into a level up announcement"
+                paused_at = None
+            last_tick = elapsed
+            ticks += 1
+        elif action == _ROLL:
+            if state.actual is not None:
+                return "rolled again before guessing"
+            if elapsed - last_guess < RESULT_FLASH_MS - PACING_TOLERANCE_MS:
+                return f"rolled {elapsed - last_guess}ms after a guess"
+        elif action == _GUESS_GREATER or action == _GUESS_LOWER:
+            if state.actual is not None:
+                last_guess = elapsed
+        elif action == _TRANSFER_STEP:
+            if elapsed - last_transfer < STEP_MS - PACING_TOLERANCE_MS:
+                return f"transfer steps {elapsed - last_transfer}ms apart"
+            last_transfer = elapsed
+        elif action == _PAY_STEP:
+            if elapsed - last_pay < STEP_MS - PACING_TOLERANCE_MS:
+                return f"payment steps {elapsed - last_pay}ms apart"
+            last_pay = elapsed
+        elif action == _LEVEL_UP:
+            if state.current_debt:
+                return "level up with unpaid debt"
+            if paused_at is None:
+                paused_at = elapsed
+            levels += 1
+        elif action == _TRANSFER_ALL:
+            if effectors['insta_transfer']['level'] < 1:
+                return "instant transfer without the skill"
+        elif action == _PAY_ALL:
+            if effectors['insta_pay']['level'] < 1:
+                return "instant payment without the skill"
+        elif action > _TICK:
+            return f"unknown action {action}"
+        perform[action](engine)
+
+    if state.game_over_reason is None:
+        return "the game did not end"
+    # The game clock ticks every second except during the level up announcements
+    if ticks < (elapsed - levels * LEVEL_UP_PAUSE_MS) // TICK_MS - TICK_TOLERANCE or ticks > elapsed // TICK_MS + TICK_TOLERANCE:
+        return f"{ticks} clock ticks in {elapsed / 1000:.0f}s"
+    if state.score != score or state.level != level:
+        return f"replay ends with score {state.score} on level {state.level}, submitted {score} on level {level}"
+    return None
+
+
+def _verify_item(item:tuple[bytes, int, int]) -> typing.Optional[str]:
+    return verify(*item)
+
+
+class Verifier:
+    """Verifies archived replays in a pool of worker processes"""
+    def __init__(self, workers:typing.Optional[int]=None, archive:typing.Optional[replay.ReplayArchive]=None, session_factory:typing.Callable=db_handling.Session):
+        """
+        Args:
+            workers (typing.Optional[int], optional): worker processes. Defaults to the CPU count.
+            archive (typing.Optional[replay.ReplayArchive], optional): where the replays are. Defaults to replay.archive.
+            session_factory (typing.Callable, optional): makes database sessions. Defaults to db_handling.Session.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.archive = archive if archive is not None else replay.archive
+        self.session_factory = session_factory
+        self._pool:typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._position = 0 # replays of the archive looked at by verify_pending
+        self._missing_since:dict[int, float] = {} # unverified session id: when it was first seen without a replay
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Archived replays verify_pending did not look at yet"""
+        return len(self.archive) - self._position
+
+    def verify_many(self, items:list[tuple[typing.Union[bytes, memoryview], int, int]]) -> list[typing.Optional[str]]:
+        """Verify (replay, score, level) items, see verify()
+
+        Returns:
+            list[typing.Optional[str]]: the verdict of each item
+        """
+        if len(items) < INLINE_BATCH or self.workers == 1:
+            return [verify(*item) for item in items]
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        # Views into the archive can't be sent to other processes
+        items = [(bytes(data), score, level) for data, score, level in items]
+        # Big chunks keep the inter-process traffic down, a few per worker keep them evenly busy
+        chunksize = max(1, len(items) // (self.workers * 4))
+        return list(self._pool.map(_verify_item, items, chunksize=chunksize))
+
+    def _judge(self, session, replays:dict[int, memoryview], only_pending:bool) -> tuple[int, int]:
+        """Verify the replays of game sessions and mark the sessions
+
+        Returns:
+            tuple[int, int]: (verified sessions, invalidated sessions)
+        """
+        GameSession = db_handling.GameSessionModel
+        query = session.query(GameSession.id, GameSession.score, GameSession.level_reached)\
+            .filter(GameSession.id.in_(list(replays)))
+        if only_pending:
+            query = query.filter(GameSession.verified == 0)
+        games = query.all()
+        if not games:
+            return 0, 0
+        verdicts = self.verify_many([(replays[game.id], game.score, game.level_reached) for game in games])
+
+        invalid_ids = []
+        for game, verdict in zip(games, verdicts):
+            if verdict is not None:
+                invalid_ids.append(game.id)
+                log.warning(f"INVALIDATED GAME SESSION.ID {game.id}: {verdict}")
+        session.query(GameSession).filter(GameSession.id.in_([game.id for game in games])).update({"verified": 1}, synchronize_session=False)
+        if invalid_ids:
+            session.query(GameSession).filter(GameSession.id.in_(invalid_ids)).update({"invalid": 1}, synchronize_session=False)
+        session.commit()
+        log.info(f"VERIFIED {len(games)} GAME SESSIONS, {len(invalid_ids)} INVALID")
+        return len(games), len(invalid_ids)
+
+    def verify_pending(self, limit:int=BATCH_SIZE) -> tuple[int, int]:
+        """Verify newly archived replays of game sessions that were not verified yet, invalid ones are marked invalid
+
+        Args:
+            limit (int, optional): most replays to look at. Defaults to BATCH_SIZE.
+
+        Returns:
+            tuple[int, int]: (verified sessions, invalidated sessions)
+        """
+        with self._lock:
+            self.archive.refresh()
+            ids = self.archive.ids(self._position, self._position + limit)
+            if not ids:
+                return 0, 0
+            with self.session_factory() as session:
+                result = self._judge(session, {session_id: self.archive.get(session_id) for session_id in ids}, only_pending=True)
+            self._position += len(ids)
+            return result
+
+    def verify_archive(self, batch_size:int=BATCH_SIZE) -> tuple[int, int]:
+        """Re-verify every archived replay, e.g. after a rules fix. The archive is streamed, not loaded.
+
+        Args:
+            batch_size (int, optional): replays verified at once. Defaults to BATCH_SIZE.
+
+        Returns:
+            tuple[int, int]: (verified sessions, invalidated sessions)
+        """
+        self.archive.refresh()
+        total = invalid = 0
+        with self.session_factory() as session:
+            replays = {}
+            for session_id, data in self.archive:
+                replays[session_id] = data
+                if len(replays) == batch_size:
+                    verified, invalidated = self._judge(session, replays, only_pending=False)
+                    total, invalid = total + verified, invalid + invalidated
+                    replays = {}
+            if replays:
+                verified, invalidated = self._judge(session, replays, only_pending=False)
+                total, invalid = total + verified, invalid + invalidated
+        return total, invalid
+
+    def invalidate_missing(self, grace:float=MISSING_REPLAY_GRACE) -> tuple[int, int]:
+        """Invalidate the unverified game sessions whose replay never arrived, e.g. archiving it failed or the row was
+        written without one. They could never be verified and would stay on the leaderboard.
+        Only games submitted by the client (with a client_id) are expected to have a replay, rows from scripts like
+        misc/generate_mockup_data.py never get one and are left alone.
+
+        Args:
+            grace (float, optional): seconds a session may wait for its replay after it is first seen without one. Defaults to MISSING_REPLAY_GRACE.
+
+        Returns:
+            tuple[int, int]: (invalidated sessions, sessions still waiting for their replay)
+        """
+        GameSession = db_handling.GameSessionModel
+        with self._lock:
+            self.archive.refresh()
+            now = time.monotonic()
+            with self.session_factory() as session:
+                # A literal 0, SQLite only uses the partial index for the same WHERE as in the index. Without statistics
+                # it prefers ix_game_sessions_client_id, which reads every submitted game, so the index is named.
+                unverified = (
+                    session.query(GameSession.id)
+                    .with_hint(GameSession, "INDEXED BY ix_game_sessions_awaiting_replay", "sqlite")
+                    .filter(GameSession.verified == literal_column("0"), GameSession.client_id.is_not(None))
+                )
+                missing = {session_id: self._missing_since.get(session_id, now) for session_id, in unverified if session_id not in self.archive}
+                self._missing_since = missing
+                overdue = [session_id for session_id, since in missing.items() if now - since >= grace]
+                if overdue:
+                    session.query(GameSession).filter(GameSession.id.in_(overdue)).update({"verified": 1, "invalid": 1}, synchronize_session=False)
+                    session.commit()
+                    for session_id in overdue:
+                        del missing[session_id]
+                    log.warning(f"INVALIDATED {len(overdue)} GAME SESSIONS WITHOUT A REPLAY, E.G. GAME SESSION.ID {overdue[0]}")
+            return len(overdue), len(missing)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+
+class VerificationWorker(threading.Thread):
+    """Verifies new submissions in the background, e.g. next to the website"""
+    def __init__(self, verifier:typing.Optional[Verifier]=None, interval:float=2.0):
+        """
+        Args:
+            verifier (typing.Optional[Verifier], optional): the verifier to use. Defaults to a new one.
+            interval (float, optional): seconds between checks for new submissions. Defaults to 2.0.
+        """
+        super().__init__(name="verification", daemon=True)
+        self.verifier = verifier or Verifier()
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.verifier.verify_pending()
+                self.verifier.invalidate_missing()
+                waiting = self.verifier.pending
+            except Exception as e:
+                log.warning(f"VERIFICATION FAILED: {e}")
+                waiting = 0
+            if not waiting:
+                self._stop_event.wait(self.interval)
+        self.verifier.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+
+if __name__ == '__main__':
+    # python verification.py [WORKERS] [--all] [--missing] - verify the pending sessions once, or re-verify all of them,
+    # --missing also invalidates the unverified sessions without a replay right away
+    args = [arg for arg in sys.argv[1:] if arg not in ("--all", "--missing")]
+    verifier = Verifier(int(args[0]) if args else None)
+    if "--all" in sys.argv:
+        total, invalid = verifier.verify_archive()
+    else:
+        total = invalid = 0
+        while True:
+            verified, invalidated = verifier.verify_pending()
+            total, invalid = total + verified, invalid + invalidated
+            if not verifier.pending:
+                break
+    missing_invalidated, missing = verifier.invalidate_missing(0 if "--missing" in sys.argv else MISSING_REPLAY_GRACE)
+    verifier.close()
+    print(f"Verified {total} game sessions, {invalid} invalid")
+    if missing_invalidated or missing:
+        print(f"{missing_invalidated} game sessions without a replay invalidated, {missing} still without one")
@@ -5,7 +5,9 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from db_handling import UserModel as User
 import db_handling
+import verification
 import uuid
+import os
 import datetime
 import logger
 log = logger.get_logger("web")
@@ -20,6 +22,11 @@ app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 
 db = SQLAlchemy(app)
+with app.app_context():
+	db_handling.configure_sqlite(db.engine) # the same database file as db_handling.engine
+verifier = verification.Verifier()
+
+PAGE_SIZE = 50 # rows per page of the infinitely scrolled lists
 
 
 login_manager = LoginManager(app)
@@ -90,30 +97,81 @@ def logout():
 @app.route('/profile')
 @login_required
 def profile():
-	unsorted_sessions = db.session.query(db_handling.GameSessionModel).filter_by(user_id=current_user.id).all()
-	sorted_sessions = sorted(unsorted_sessions, key=lambda x: (-x.level_reached, -x.score))
-	return render_template('profile.html', user=current_user, sessions=sorted_sessions)
+	sessions = db_handling.ranked_sessions(db.session, user_id=current_user.id, include_invalid=True).all()
+	return render_template('profile.html', user=current_user, sessions=sessions)
+
 
 
 
+def _session_cursor():
+	"""Read the cursor of a ranked game session page from the query parameters.
+
+	Returns:
+		tuple[int, int, int] | None: The (level_reached, score, id) of the last game of the previous page from ?after=level,score,id, or None for the first page.
+	"""
+	after = request.args.get("after")
+	if not after:
+		return None
+	try:
+		level, score, id = (int(part) for part in after.split(","))
+	except ValueError:
+		flask.abort(400)
+	return level, score, id
+
+def _user_cursor():
+	"""Read the cursor of a user page from the query parameters.
+
+	Returns:
+		int | None: The id of the last user of the previous page from ?after=id, or None for the first page.
+	"""
+	after = request.args.get("after")
+	if not after:
+		return None
+	try:
+		return int(after)
+	except ValueError:
+		flask.abort(400)
+
+def _ranked_page(include_invalid:bool):
+	"""Fetch the ranked game sessions page requested by the query parameters. One extra game is fetched to tell whether another page follows.
+
+	Args:
+		include_invalid (bool): Whether invalidated games are listed.
+
+	Returns:
+		tuple[list[db_handling.GameSessionModel], str | None]: The games of the page and the cursor of the next page, or None on the last page.
+	"""
+	query = db_handling.ranked_sessions(db.session, include_invalid=include_invalid)
+	games = db_handling.ranked_page(query, _session_cursor(), PAGE_SIZE + 1)
+	if len(games) <= PAGE_SIZE:
+		return games, None
+	games = games[:PAGE_SIZE]
+	last = games[-1]
+	return games, f"{last.level_reached},{last.score},{last.id}"
 
 @app.route('/leaderboard')
 def leaderboard():
-	if current_user.role == "admin":
-		unsorted_sessions = db.session.query(db_handling.GameSessionModel).all()
-	else:
-		unsorted_sessions = db.session.query(db_handling.GameSessionModel).filter_by(invalid=0).all()
-	sorted_sessions = sorted(unsorted_sessions, key=lambda x: (-x.level_reached, -x.score))
-	return render_template('leaderboard.html', sessions=sorted_sessions, user=current_user)
+	sessions, next_after = _ranked_page(include_invalid=getattr(current_user, "role", None) == "admin")
+	return render_template('leaderboard.html', sessions=sessions, next_after=next_after, rank=1, user=current_user)
+
+@app.route('/api/leaderboard')
+def api_leaderboard():
+	"""Render the next page of leaderboard rows for infinite scrolling. The page starts after the game given by the ?after=level,score,id cursor.
+
+	Returns:
+		str: The rendered rows, the last one loads the page after it once revealed.
+	"""
+	sessions, next_after = _ranked_page(include_invalid=getattr(current_user, "role", None) == "admin")
+	rank = request.args.get("rank", 1, type=int)
+	return render_template('frags/leaderboard_frag.html', sessions=sessions, next_after=next_after, rank=rank, user=current_user)
 
 
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
-	unsorted_sessions = db.session.query(db_handling.GameSessionModel).filter_by(user_id=current_user.id).all()
-	sorted_sessions = sorted(unsorted_sessions, key=lambda x: (-x.level_reached, -x.score))
-	return render_template('dashboard.html', sessions=sorted_sessions, user=current_user)
+	sessions = db_handling.ranked_sessions(db.session, user_id=current_user.id, include_invalid=True).all()
+	return render_template('dashboard.html', sessions=sessions, user=current_user)
 
 
 @app.route('/about')
@@ -148,8 +206,10 @@ def db_editor():
 @login_required
 def api_users():
 	if current_user.role == "admin":
-		users = db.session.query(db_handling.UserModel).all()
-		return render_template('frags/user_frag.html', users=users)
+		after = _user_cursor()
+		users = db_handling.users_page(db.session, after, PAGE_SIZE + 1)
+		next_after = users[PAGE_SIZE - 1].id if len(users) > PAGE_SIZE else None
+		return render_template('frags/user_frag.html', users=users[:PAGE_SIZE], next_after=next_after, first_page=after is None)
 	else:
 		return flask.redirect("/")
 	
@@ -157,8 +217,8 @@ def api_users():
 @login_required
 def api_game_sessions():
 	if current_user.role == "admin":
-		games = db.session.query(db_handling.GameSessionModel).all()
-		return render_template('frags/game_session_frag.html', games=games)
+		games, next_after = _ranked_page(include_invalid=True)
+		return render_template('frags/game_session_frag.html', games=games, next_after=next_after, first_page=_session_cursor() is None)
 	else:
 		return flask.redirect("/")
 
@@ -183,6 +243,29 @@ def api_invalidate(id:int):
 			db.session.commit()
 	return {}, 200
 
+
+@app.route('/api/verify', methods=['POST'])
+@login_required
+def api_verify():
+	"""Verify the replays of the game sessions that were not verified yet. Sessions whose replay does not reproduce the submitted result are marked invalid. This endpoint is restricted to admin users.
+
+	Returns:
+		tuple[dict, int]: The numbers of verified, invalidated and replay-less sessions with HTTP 200, or an empty JSON response with HTTP 403 for non-admin users.
+	"""
+	if current_user.role != "admin":
+		return {}, 403
+	verified = invalidated = 0
+	while True:
+		checked, failed = verifier.verify_pending()
+		verified, invalidated = verified + checked, invalidated + failed
+		if not verifier.pending:
+			break
+	# Sessions whose replay never arrived can't be verified, they are invalidated once the grace time is over
+	missing_invalidated, missing = verifier.invalidate_missing()
+	invalidated += missing_invalidated
+	log.debug(f"VERIFIED {verified} GAME SESSIONS, {invalidated} INVALID, {missing} WAITING FOR A REPLAY, BY {current_user.username}")
+	return {"verified": verified, "invalidated": invalidated, "waiting_for_replay": missing}, 200
+
 @app.route('/api/delete/user/<int:id>', methods=['GET', 'POST'])
 def api_delete_user(id):
 	"""Delete a user and all of their game sessions by identifier. This endpoint is restricted to admin users and removes both the user record and any associated sessions when called via POST.
@@ -284,5 +367,8 @@ def log_request_info():
 		log.info(f"{current_user} - {log_name}")
 
 if __name__ == '__main__':
+	# The debug reloader runs this module twice, only the reloaded child serves requests
+	if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+		verification.VerificationWorker(verifier).start()
 	app.run(debug=True, host='0.0.0.0', port=5000)
 